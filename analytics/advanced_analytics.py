@@ -8,6 +8,8 @@ The script includes the following key functionalities:
 
 2. Bollinger Bands Computation: 
     Applies Bollinger Bands to the daily profit data to identify periods of high and low volatility.
+    The bands of every store and product, for several window sizes, are computed at once over a dates×series matrix
+    (see bollinger.py) into one long table.
 
 3. Product Profit Margin Calculation: 
     Calculates the profit margin for each product over the specified period.
@@ -17,30 +19,57 @@ The script includes the following key functionalities:
 
 5. ARIMA Forecasting: 
     Uses the ARIMA model to forecast future daily profits based on historical data.
+    The order (p,d,q) is selected by a parallel, time-boxed AIC grid search that is cached per series (see order_selection.py).
+    Fitted models are persisted (see model_cache.py): an unchanged series reuses its fit, a series that only gained
+    new days is updated with them, and other refits start from the parameters of a previous fit.
 
 6. RFM (Recency, Frequency, Monetary) Scoring: 
     Computes RFM scores for customers, a key method in customer segmentation.
+    The customers are aggregated into a temporary table and their quintile edges are ranked in the database,
+    so only the compact scores of every customer are streamed back, in chunks.
 
 The script employs pandas for data manipulation, statsmodels for ARIMA modeling, and SQLite3 for database interactions. 
 It is designed to be executed with start and end date arguments, allowing for flexible analysis over different time periods. 
-The results of each analysis are saved in CSV format in the '/app/data/analytics/advanced/' directory.
+The analyses run in parallel on a pool of threads with one read-only connection each (see metric_pool.py,
+--workers 1 runs them one after another), and the latency of every analysis is reported.
+Results already computed for the same range and data are copied from the result cache (see result_cache.py, --no-cache skips it).
+With --prefix-index, the store profit margins and the bollinger bands of every store and product are answered from the prefix sums of the daily aggregates
+(see prefix_index.py), which is refreshed incrementally first, instead of scanning Sales.
+With --approximate, the product profit margins are estimated from the Bernoulli sample of the sales kept with the
+sketches (see sketches.py), with their 95% confidence intervals.
+The results of each analysis are saved as typed Feather files (see output_format.py) in the '/app/data/analytics/advanced/' directory,
+and exported in CSV format too with --csv.
 
 Usage:
-    python advanced_analytics.py <start_date> <end_date>
+    python advanced_analytics.py <start_date> <end_date> [--engine sqlite|duckdb] [--workers N] [--no-cache] [--prefix-index]
+                                 [--approximate [--error E] [--sample-rate R]] [--csv]
 
 Where <start_date> and <end_date> are in YYYYMMDD format. 
 The script will reformat these dates for SQLLite queries and carry out the analytics for the given range.
 """
 
-import sqlite3
+import argparse
+import numpy as np
 import pandas as pd
 from statsmodels.tsa.arima.model import ARIMA
 import os
 import sys
-from datetime import datetime
+from datetime import datetime, timedelta
+
+sys.path.append('/app')
+
+from analytics.bollinger import grouping_bands, rolling_bands, series_band_table, DEFAULT_GROUPINGS, DEFAULT_STD_DEVS, DEFAULT_WINDOWS, GROUPINGS
+from analytics.date_filters import resolve_date_id_range, sales_date_filter
+from analytics.engines import analytics_connection, data_fingerprint, read_sql, DATABASE_ERRORS, DEFAULT_ENGINE, ENGINES
+from analytics.model_cache import ArimaModelCache
+from analytics.order_selection import select_order
+from analytics.metric_pool import format_timings, range_metrics, run_metrics, DEFAULT_WORKERS
+from analytics.output_format import with_csv, DEFAULT_FORMATS
+from analytics.prefix_index import load_prefix_index
+from analytics.result_cache import ResultCache
+from analytics.sketches import load_sketches, SketchSettings, DEFAULT_ERROR, DEFAULT_SAMPLE_RATE
 
 DATA_DIR = '/app/data/analytics/advanced/'
-DB_PATH = '/app/data/orestiscompanydb.sqlite'
 
 def reformat_date(date_str):
     """
@@ -50,20 +79,22 @@ def reformat_date(date_str):
     """
     return "{}-{}-{}".format(date_str[:4], date_str[4:6], date_str[6:])
 
-def calculate_daily_profits(conn, start_date=None, end_date=None):
-    query = """
-    SELECT DateInfo.date, 
+def calculate_daily_profits(conn, start_date=None, end_date=None, date_ids=None, group_by=()):
+    # With group_by (Sales columns, e.g. ('store_id',)), the daily profits of every group in one query
+    groups = ''.join(f"Sales.{column}, " for column in group_by)
+    sales, join, where, params = sales_date_filter(conn, start_date, end_date, date_ids, date_info_joined=True)
+    query = f"""
+    SELECT {groups}DateInfo.date, 
            SUM((Sales.unit_price - Products.purchase_price) * Sales.quantity) as daily_profit
-    FROM Sales
+    FROM {sales}
     JOIN Products ON Sales.product_id = Products.product_id
     JOIN DateInfo ON Sales.date_id = DateInfo.date_id
     """
-    if start_date and end_date:
-        query += f" WHERE DateInfo.date BETWEEN '{start_date}' AND '{end_date}'"
+    query += join + where
     
-    query += "GROUP BY DateInfo.date ORDER BY DateInfo.date ASC"
+    query += f" GROUP BY {groups}DateInfo.date ORDER BY {groups}DateInfo.date ASC"
     
-    df = pd.read_sql(query, conn)
+    df = read_sql(conn, query, params)
     return df
 
 def compute_bollinger_bands(daily_profits_df, window_size=20, num_std_dev=2):
@@ -72,87 +103,103 @@ def compute_bollinger_bands(daily_profits_df, window_size=20, num_std_dev=2):
     if len(daily_profits_df) < window_size*3:
         return None
 
-
-    # Calculate moving average
-    daily_profits_df['moving_avg'] = daily_profits_df['daily_profit'].rolling(window=window_size).mean()
-    # Calculate moving standard deviation
-    daily_profits_df['moving_std_dev'] = daily_profits_df['daily_profit'].rolling(window=window_size).std()
-    # Calculate upper Bollinger Bands
-    daily_profits_df['upper_band'] = daily_profits_df['moving_avg'] + (daily_profits_df['moving_std_dev']*num_std_dev)
-    # Calculate lower Bollinger Bands
-    daily_profits_df['lower_band'] = daily_profits_df['moving_avg'] - (daily_profits_df['moving_std_dev']*num_std_dev)
+    # Moving average and standard deviation bands of the profits (see bollinger.py), without modifying daily_profits_df
+    daily_profits = daily_profits_df['daily_profit'].to_numpy(dtype='float64')
+    lower_band, moving_avg, upper_band = rolling_bands(daily_profits[:, None], (window_size,), (num_std_dev,))[(window_size, num_std_dev)]
     
     # Select only required columns
-    bollinger_bands_df = daily_profits_df[['date', 'daily_profit', 'lower_band', 'moving_avg', 'upper_band']]
-    bollinger_bands_df.columns = ['date', 'daily_profit', 'lower_band', 'moving_avg', 'upper_band']
+    bollinger_bands_df = pd.DataFrame({
+        'date': daily_profits_df['date'].to_numpy(),
+        'daily_profit': daily_profits,
+        'lower_band': lower_band[:, 0],
+        'moving_avg': moving_avg[:, 0],
+        'upper_band': upper_band[:, 0],
+    })
     return bollinger_bands_df
 
-def calculate_product_profit_margin(conn, start_date=None, end_date=None):
-    query = """
+def calculate_series_bollinger_bands(conn, start_date=None, end_date=None, date_ids=None, groupings=DEFAULT_GROUPINGS,
+                                     windows=DEFAULT_WINDOWS, num_std_devs=DEFAULT_STD_DEVS):
+    """
+    Bollinger bands of the daily profits of every series of the groupings (e.g. every store and product), for every
+    window and deviation multiplier, in one long table (see bollinger.py).
+    """
+    return series_band_table([
+        grouping_bands(calculate_daily_profits(conn, start_date, end_date, date_ids=date_ids, group_by=GROUPINGS[grouping]),
+                       grouping, windows, num_std_devs)
+        for grouping in groupings
+    ])
+
+def calculate_product_profit_margin(conn, start_date=None, end_date=None, date_ids=None):
+    sales, join, where, params = sales_date_filter(conn, start_date, end_date, date_ids)
+    query = f"""
     SELECT Products.product_id,
            Products.name,
            AVG(Sales.unit_price - Products.purchase_price) / AVG(Sales.unit_price) as profit_margin
-    FROM Sales
+    FROM {sales}
     JOIN Products ON Sales.product_id = Products.product_id
-    JOIN DateInfo ON Sales.date_id = DateInfo.date_id
     """
-    if start_date and end_date:
-        query += f" WHERE DateInfo.date BETWEEN '{start_date}' AND '{end_date}'"
-    query += "GROUP BY Products.product_id, Products.name ORDER BY profit_margin DESC"
+    query += join + where
+    query += " GROUP BY Products.product_id, Products.name ORDER BY profit_margin DESC"
     
-    df = pd.read_sql(query, conn)
+    df = read_sql(conn, query, params)
     return df[['name', 'profit_margin']]
 
-def calculate_store_profit_margin(conn, start_date=None, end_date=None):
-    query = """
+def calculate_store_profit_margin(conn, start_date=None, end_date=None, date_ids=None):
+    sales, join, where, params = sales_date_filter(conn, start_date, end_date, date_ids)
+    query = f"""
     SELECT Stores.store_id,
            Stores.city,
            SUM((Sales.unit_price - Products.purchase_price) * Sales.quantity) AS total_profit,
            SUM(Sales.unit_price * Sales.quantity) AS total_sales,
            (SUM((Sales.unit_price - Products.purchase_price) * Sales.quantity) / SUM(Sales.unit_price * Sales.quantity)) AS profit_margin
-    FROM Sales
+    FROM {sales}
     JOIN Stores ON Sales.store_id = Stores.store_id
     JOIN Products ON Sales.product_id = Products.product_id
-    JOIN DateInfo ON Sales.date_id = DateInfo.date_id
     """
-    if start_date and end_date:
-        query += f" WHERE DateInfo.date BETWEEN '{start_date}' AND '{end_date}'"
-    query += "GROUP BY Stores.store_id, Stores.city ORDER BY profit_margin DESC"
-    df = pd.read_sql(query, conn)
+    query += join + where
+    query += " GROUP BY Stores.store_id, Stores.city ORDER BY profit_margin DESC"
+    df = read_sql(conn, query, params)
     return df[['store_id', 'city', 'profit_margin']]
 
-def forecast_with_arima(series, order, steps=5):
+def forecast_with_arima(series, order, steps=5, model_cache=None):
     # Check if the series index has a frequency set; if not, attempt to infer it
     if series.index.freq is None:
         # Assuming the series should have a daily frequency
         series = series.asfreq('D')
 
-    # Fit the ARIMA model
-    model = ARIMA(series, order=order)
-    model_fit = model.fit()
+    # Fit the ARIMA model, or reuse/update a persisted fit of the series (see model_cache.py)
+    if model_cache is not None:
+        model_fit = model_cache.fit(series, order)
+    else:
+        model = ARIMA(series, order=order)
+        model_fit = model.fit()
     
     # Forecast 'steps' ahead
     forecast = model_fit.forecast(steps=steps)
     return forecast
 
 
-def forecast_daily_profits(conn, start_date=None, end_date=None, forecast_steps=5):
+def forecast_daily_profits(conn, start_date=None, end_date=None, forecast_steps=5, date_ids=None, use_model_cache=True,
+                           order=None):
     # First, calculate daily profits
-    daily_profits_df = calculate_daily_profits(conn, start_date, end_date)
+    daily_profits_df = calculate_daily_profits(conn, start_date, end_date, date_ids=date_ids)
     historical_profits_df = daily_profits_df.copy(deep=True)
 
     # Ensure that the 'date' column is a datetime type and set as index
     daily_profits_df['date'] = pd.to_datetime(daily_profits_df['date'])
     daily_profits_df.set_index('date', inplace=True)
 
-    # ARIMA Model order (p,d,q) can be determined using ACF and PACF plots or grid search methods
-    order = (1, 1, 1)
-    
     # We need at least 60 days of data to forecast 5 days ahead
     if len(daily_profits_df) < 60:
         return None
 
-    forecasted_profits = forecast_with_arima(daily_profits_df['daily_profit'], order, steps=forecast_steps)
+    # Unless given, the ARIMA Model order (p,d,q) is selected by a grid search on AIC, cached per series (see order_selection.py)
+    if order is None:
+        order = select_order(daily_profits_df['daily_profit'])
+
+    model_cache = ArimaModelCache() if use_model_cache else None
+    forecasted_profits = forecast_with_arima(daily_profits_df['daily_profit'], order, steps=forecast_steps,
+                                             model_cache=model_cache)
     forecasted_profits = forecasted_profits.reset_index()
     
     # Rename the columns to give them appropriate names
@@ -168,7 +215,41 @@ def forecast_daily_profits(conn, start_date=None, end_date=None, forecast_steps=
     return combined_df[['date', 'daily_profit']]
 
 
-def calculate_rfm_scores(conn, start_date=None, end_date=None):
+# The four inner quintile edges of the RFM scores
+RFM_QUANTILES = np.linspace(0, 1, 6)[1:-1]
+# Customers scored per fetch from the database
+RFM_CHUNK_SIZE = 50_000
+RFM_TABLE = 'rfm_customers'
+
+def quintile_positions(n):
+    """
+    The positions below the four quintile edges of n sorted values and their weights, for interpolating the edges
+    linearly between neighbouring values like pd.qcut.
+    """
+    virtual = n * RFM_QUANTILES + (1 - RFM_QUANTILES) - 1
+    lower = np.floor(virtual).astype(np.int64)
+    return lower, virtual - lower
+
+def interpolate_edges(values, weights):
+    """The edges between the (lower, upper) values of every position, with the weights of quintile_positions."""
+    lower, upper = values[:, 0], values[:, 1]
+    diff = upper - lower
+    return np.where(weights >= 0.5, upper - diff * (1 - weights), lower + diff * weights)
+
+def quintile_edges(conn, n, column, order, to_value=float):
+    """The four quintile edges of column over the n customers of the RFM table, sorted by order."""
+    lower, weights = quintile_positions(n)
+    positions = np.stack([lower, np.minimum(lower + 1, n - 1)], axis=1)
+    wanted = sorted(set(positions.ravel().tolist()))
+    query = f"""
+    SELECT position, {column} FROM (
+        SELECT {column}, ROW_NUMBER() OVER (ORDER BY {order}) - 1 AS position FROM {RFM_TABLE}
+    ) AS ranked WHERE position IN ({', '.join('?' * len(wanted))})
+    """
+    values = dict(conn.execute(query, wanted).fetchall())
+    return interpolate_edges(np.array([[to_value(values[p]) for p in pair] for pair in positions], dtype=np.float64), weights)
+
+def calculate_rfm_scores(conn, start_date=None, end_date=None, date_ids=None):
 
     # Need at least 60 days of data to reliably calculate RFM scores
     if (datetime.strptime(end_date, '%Y-%m-%d') - datetime.strptime(start_date, '%Y-%m-%d')).days < 60:
@@ -179,70 +260,127 @@ def calculate_rfm_scores(conn, start_date=None, end_date=None):
     # Format current_date for SQL query
     formatted_current_date = current_date
     
-    query = """
+    # Aggregate every customer once into a temporary table, the quintiles are then ranked in the database.
+    # sale_id is the primary key of Sales, so counting the sales needs no DISTINCT
+    sales, join, where, params = sales_date_filter(conn, start_date, formatted_current_date, date_ids, date_info_joined=True)
+    query = f"""
+    CREATE TEMP TABLE {RFM_TABLE} AS
     SELECT
         Customers.customer_id,
-        Customers.name,
         MAX(DateInfo.date) as last_purchase_date,
-        COUNT(DISTINCT Sales.sale_id) as frequency,
+        COUNT(Sales.sale_id) as frequency,
         SUM(Sales.quantity * Sales.unit_price) as monetary
-    FROM Sales
+    FROM {sales}
     JOIN Customers ON Sales.customer_id = Customers.customer_id
     JOIN DateInfo ON Sales.date_id = DateInfo.date_id
     """
-
-    if start_date and end_date:
-        query += f" WHERE DateInfo.date BETWEEN '{start_date}' AND '{formatted_current_date}'"
+    query += join + where
     
-    query += " GROUP BY Customers.customer_id, Customers.name"
+    query += " GROUP BY Customers.customer_id"
 
-    rfm_df = pd.read_sql(query, conn)
-    
-    # Calculate Recency as days since last purchase
-    rfm_df['recency'] = (pd.to_datetime(formatted_current_date) - pd.to_datetime(rfm_df['last_purchase_date'])).dt.days
-    
-    # Assign RFM scores from 1 to 5
-    rfm_df['r_score'] = pd.qcut(rfm_df['recency'], 5, labels=[5, 4, 3, 2, 1], duplicates='drop') # Note that a lower 'recency' is better
-    rfm_df['f_score'] = pd.qcut(rfm_df['frequency'].rank(method='first'), 5, labels=[1, 2, 3, 4, 5], duplicates='drop')
-    rfm_df['m_score'] = pd.qcut(rfm_df['monetary'], 5, labels=[1, 2, 3, 4, 5], duplicates='drop')
-
-    # Combine RFM scores into a single RFM segment code and RFM score
-    rfm_df['rfm_segment'] = rfm_df['r_score'].astype(str) + rfm_df['f_score'].astype(str) + rfm_df['m_score'].astype(str)
-    rfm_df['rfm_score'] = rfm_df['r_score'].astype(int) + rfm_df['f_score'].astype(int) + rfm_df['m_score'].astype(int)
-    
-    # Select only the necessary columns to save to CSV
-    rfm_scores_df = rfm_df[['customer_id', 'r_score', 'f_score', 'm_score', 'rfm_segment', 'rfm_score']]
+    conn.execute(f"DROP TABLE IF EXISTS {RFM_TABLE}")
+    conn.execute(query, list(params))
+    try:
+        n = conn.execute(f"SELECT COUNT(*) FROM {RFM_TABLE}").fetchone()[0]
+        columns = ['customer_id', 'r_score', 'f_score', 'm_score', 'rfm_segment', 'rfm_score']
+        if n == 0:
+            return pd.DataFrame(columns=columns)
+
+        # Quintile edges as pd.qcut finds them, from the few sorted positions they are interpolated from.
+        # Recency is the days since the last purchase, so it sorts by the latest purchase first
+        current = datetime.strptime(formatted_current_date, '%Y-%m-%d').date()
+        recency_edges = quintile_edges(conn, n, 'last_purchase_date', 'last_purchase_date DESC',
+                                       lambda day: (current - datetime.strptime(str(day)[:10], '%Y-%m-%d').date()).days)
+        monetary_edges = quintile_edges(conn, n, 'monetary', 'monetary')
+        # Frequency is scored on its rank (ties in customer order), whose values are the positions + 1
+        lower, weights = quintile_positions(n)
+        rank_edges = interpolate_edges(np.stack([lower + 1, np.minimum(lower + 2, n)], axis=1).astype(np.float64), weights)
+
+        # A score is 1 + the number of edges a customer is above (a lower 'recency' is better, so it is reversed).
+        # A whole number of days is above a recency edge from the day after it, i.e. a purchase on or before:
+        recency_dates = [(current - timedelta(days=int(np.floor(edge)) + 1)).isoformat() for edge in recency_edges]
+        above = lambda expression, count: ' + '.join([f"CASE WHEN {expression} THEN 1 ELSE 0 END"] * count)
+        score_query = f"""
+        SELECT customer_id,
+               5 - ({above('last_purchase_date <= ?', 4)}) AS r_score,
+               1 + ({above('frequency_rank > ?', 4)}) AS f_score,
+               1 + ({above('monetary > ?', 4)}) AS m_score
+        FROM (
+            SELECT customer_id, last_purchase_date, monetary,
+                   ROW_NUMBER() OVER (ORDER BY frequency, customer_id) AS frequency_rank
+            FROM {RFM_TABLE}
+        ) AS ranked
+        ORDER BY customer_id
+        """
+        score_params = recency_dates + rank_edges.tolist() + monetary_edges.tolist()
+
+        # Stream the scores in chunks into compact arrays instead of a DataFrame of Python objects
+        customer_ids = np.empty(n, dtype=np.int64)
+        scores = np.empty((n, 3), dtype=np.int8)
+        cursor = conn.execute(score_query, score_params)
+        offset = 0
+        while True:
+            rows = cursor.fetchmany(RFM_CHUNK_SIZE)
+            if not rows:
+                break
+            chunk = np.array(rows, dtype=np.int64)
+            customer_ids[offset:offset + len(chunk)] = chunk[:, 0]
+            scores[offset:offset + len(chunk)] = chunk[:, 1:]
+            offset += len(chunk)
+    finally:
+        conn.execute(f"DROP TABLE IF EXISTS {RFM_TABLE}")
+
+    # Combine RFM scores into a single RFM segment code (e.g. 545) and RFM score
+    r_score, f_score, m_score = scores[:offset].T
+    rfm_scores_df = pd.DataFrame({
+        'customer_id': customer_ids[:offset],
+        'r_score': r_score,
+        'f_score': f_score,
+        'm_score': m_score,
+        'rfm_segment': r_score.astype(np.int16) * 100 + f_score * 10 + m_score,
+        'rfm_score': (r_score + f_score + m_score).astype(np.int8),
+    })
     
     return rfm_scores_df
 
 
-def compute_advanced_analytics(start_date=None, end_date=None):
+def daily_profit_bollinger_bands(conn, start_date=None, end_date=None, date_ids=None):
+    """Bollinger bands of the daily profits of the date range, or None if there are too few days."""
+    return compute_bollinger_bands(calculate_daily_profits(conn, start_date, end_date, date_ids=date_ids))
+
+# (output name, function, extra args) of every advanced analytic
+OUTPUTS = (
+    # Daily profits with their bollinger bands, skipped if there are too few days
+    ('daily_profits_bollinger_bands', daily_profit_bollinger_bands, ()),
+    # Bollinger bands of every store and product, for several windows
+    ('series_bollinger_bands', calculate_series_bollinger_bands, ()),
+    ('product_profit_margins', calculate_product_profit_margin, ()),
+    ('store_profit_margins', calculate_store_profit_margin, ()),
+    # Forecast 5 days of profits
+    ('profit_forecast', forecast_daily_profits, (5,)),
+    ('rfm_scores', calculate_rfm_scores, ()),
+)
+
+def compute_advanced_analytics(start_date=None, end_date=None, engine=DEFAULT_ENGINE, workers=DEFAULT_WORKERS,
+                               use_cache=True, prefix_index=False, approximate=None, formats=DEFAULT_FORMATS,
+                               data_dir=DATA_DIR):
+    """
+    Pre-process the advanced analytics to the output formats, running the metrics on `workers` threads and
+    serving unchanged outputs from the result cache if use_cache. With approximate (SketchSettings), the metrics
+    that can be are estimated from the sketches. Returns {metric: seconds}.
+    """
     try:
-        with sqlite3.connect(DB_PATH) as conn:
-            # Calculate daily profits, compute bollinger bands and save to csv
-            daily_profits_df = calculate_daily_profits(conn, start_date, end_date)
-            bollinger_bands_df = compute_bollinger_bands(daily_profits_df)
-            if bollinger_bands_df is not None:
-                bollinger_bands_df.to_csv(os.path.join(DATA_DIR, 'daily_profits_bollinger_bands.csv'), index=False)
-
-            # Calculate product profit margins and save to csv
-            product_profit_margin_df = calculate_product_profit_margin(conn, start_date, end_date)
-            product_profit_margin_df.to_csv(os.path.join(DATA_DIR, 'product_profit_margins.csv'), index=False)
-
-            # Calculate store profit margins and save to csv
-            store_profit_margin_df = calculate_store_profit_margin(conn, start_date, end_date)
-            store_profit_margin_df.to_csv(os.path.join(DATA_DIR, 'store_profit_margins.csv'), index=False)
-
-            # Forecast daily profits and save to csv
-            forecasted_profits = forecast_daily_profits(conn, start_date, end_date, 5)
-            if forecasted_profits is not None:
-                forecasted_profits.to_csv(os.path.join(DATA_DIR, 'profit_forecast.csv'), index=False)
-
-            # Calculate RFM scores and save to CSV
-            rfm_scores_df = calculate_rfm_scores(conn, start_date, end_date)
-            if rfm_scores_df is not None:
-                rfm_scores_df.to_csv(os.path.join(DATA_DIR, 'rfm_scores.csv'), index=False)
-    except sqlite3.Error as e:
+        with analytics_connection(engine) as conn:
+            # Resolve the date range to its date_id range once for all queries
+            date_ids = resolve_date_id_range(conn, start_date, end_date)
+            cache = ResultCache() if use_cache else None
+            fingerprint = data_fingerprint(conn) if use_cache else None
+            index = load_prefix_index() if prefix_index and date_ids is not None else None
+            sketches = load_sketches(approximate) if approximate and date_ids is not None else None
+            metrics = range_metrics('advanced', OUTPUTS, data_dir, start_date, end_date, date_ids, engine, cache,
+                                    fingerprint, index, sketches, formats)
+            return run_metrics(conn, metrics, engine, workers)
+    except DATABASE_ERRORS as e:
         print(f"Database error: {e}")
         sys.exit(1)
         
@@ -251,11 +389,21 @@ if __name__ == "__main__":
     if not os.path.exists(DATA_DIR):
         os.makedirs(DATA_DIR)
 
-    # Check if the command-line args are provided
-    if len(sys.argv) >= 3:
-        start_date = reformat_date(sys.argv[1])
-        end_date = reformat_date(sys.argv[2])
-        compute_advanced_analytics(start_date, end_date)
-    else:
-        print("Start date and end date arguments are required!")
-        sys.exit(1)
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Pre-process the advanced analytics.")
+    parser.add_argument('start_date', help="Start date in YYYYMMDD format")
+    parser.add_argument('end_date', help="End date in YYYYMMDD format")
+    parser.add_argument('--engine', choices=ENGINES, default=DEFAULT_ENGINE, help="Query engine to run the analytics on")
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS, help="Run the metrics on this many threads")
+    parser.add_argument('--prefix-index', action='store_true', help="Answer the derivable metrics from the prefix sums")
+    parser.add_argument('--no-cache', action='store_true', help="Recompute every analysis instead of using the result cache")
+    parser.add_argument('--approximate', action='store_true', help="Estimate the analyses that can be from the sketches of the sales")
+    parser.add_argument('--error', type=float, default=DEFAULT_ERROR, help="Relative error of the sketched distinct counts and quantiles")
+    parser.add_argument('--sample-rate', type=float, default=DEFAULT_SAMPLE_RATE, help="Fraction of the sales sampled for averages")
+    parser.add_argument('--csv', action='store_true', help="Export the outputs as CSV files too")
+    args = parser.parse_args()
+    approximate = SketchSettings(args.error, args.sample_rate) if args.approximate else None
+    timings = compute_advanced_analytics(reformat_date(args.start_date), reformat_date(args.end_date), args.engine,
+                                         args.workers, not args.no_cache,
+                                         args.prefix_index, approximate,
+                                         with_csv(DEFAULT_FORMATS) if args.csv else DEFAULT_FORMATS)
+    print('\n'.join(format_timings(timings)))
\ No newline at end of file
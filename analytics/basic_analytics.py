@@ -23,6 +23,7 @@ Key functions and their outputs include:
 
 7. Top Selling Products: 
     Identifies the top-selling products.
+    This and the next two list the top 3 unless --top-k says otherwise.
 
 8. Top Customers: 
     Ranks customers based on their total spending.
@@ -32,21 +33,55 @@ Key functions and their outputs include:
 
 The script uses pandas for data handling and SQLite3 for database interactions. 
 It is designed to run with command-line arguments specifying the start and end dates for the analysis period, ensuring flexibility and adaptability to different time ranges. 
-The results are saved in the '/app/data/analytics/basic/' directory as CSV files, which can be easily accessed and visualized for business insights.
+The results are saved in the '/app/data/analytics/basic/' directory as typed Feather files (see output_format.py), which can be easily accessed and visualized for business insights.
+With --csv, they are exported as CSV files too.
+
+With --columnar, the same outputs are computed with NumPy group-bys over the memory-mapped columnar copy of
+the Sales fact (see columnar.py), which is refreshed incrementally first.
+
+With --shared-scan, the filtered fact is read from the database once and all nine outputs are computed from it with
+the same NumPy group-bys, instead of one query (and one scan of Sales) per metric.
+
+Otherwise the nine queries run in parallel on a pool of threads with one read-only connection each (see metric_pool.py,
+--workers 1 runs them one after another). The latency of every metric is reported.
+
+Outputs already computed for the same range, mode and data are copied from the result cache (see result_cache.py),
+--no-cache skips it.
+
+With --prefix-index, every metric but top_customers is answered from the prefix sums of the daily aggregates
+(see prefix_index.py), which is refreshed incrementally first, instead of scanning Sales.
+
+With --approximate, the three top-k metrics are answered by merging the per-day top-k summaries of the customers,
+products and stores (see heavy_hitters.py), which are refreshed incrementally first, with bounds on every total.
+
+With --engine duckdb, the same queries run on the embedded DuckDB mirror of the database (see engines.py).
 
 Usage:
-    python basic_analytics.py <start_date> <end_date>
+    python basic_analytics.py <start_date> <end_date> [--columnar | --shared-scan | --prefix-index] [--engine sqlite|duckdb] [--workers N] [--no-cache]
+                              [--top-k K] [--approximate] [--csv]
 
 Where <start_date> and <end_date> are in YYYYMMDD format. The script will transform these into more SQLLite query-friendly formats and compute the analytics for the specified date range.
 """
 
-import sqlite3
-import pandas as pd
+import argparse
 import os
 import sys
 
+sys.path.append('/app')
+
+from analytics.columnar import basic_metrics, basic_metrics_from_fact, open_columns, refresh_columns, BASIC_FACT_COLUMNS, COLUMNAR_DIR, COLUMN_DTYPES
+from analytics.date_filters import resolve_date_id_range, sales_date_filter
+from analytics.engines import analytics_connection, data_fingerprint, read_sql, DATABASE_ERRORS, DEFAULT_ENGINE, ENGINES
+from analytics.metric_pool import format_timings, range_metrics, run_metrics, timed, with_cache, DEFAULT_WORKERS
+from analytics.output_format import output_paths, with_csv, write_output, DEFAULT_FORMATS
+from analytics.heavy_hitters import load_heavy_hitters
+from analytics.prefix_index import load_prefix_index
+from analytics.result_cache import ResultCache
+from database.connection import get_connection
+
 DATA_DIR = '/app/data/analytics/basic/'
-DB_PATH = '/app/data/orestiscompanydb.sqlite'
+# Rows of the top selling products, top customers and top stores
+DEFAULT_TOP_K = 3
 
 def reformat_date(date_str):
     """
@@ -56,137 +91,194 @@ def reformat_date(date_str):
     """
     return "{}-{}-{}".format(date_str[:4], date_str[4:6], date_str[6:])
 
-def total_sales(conn, start_date=None, end_date=None):
-    query = """
+def total_sales(conn, start_date=None, end_date=None, date_ids=None):
+    sales, join, where, params = sales_date_filter(conn, start_date, end_date, date_ids)
+    query = f"""
     SELECT SUM(Sales.quantity * Sales.unit_price) as total_sales
-    FROM Sales
-    JOIN DateInfo ON Sales.date_id = DateInfo.date_id
+    FROM {sales}
     """
-    if start_date and end_date:
-        query += f" WHERE DateInfo.date BETWEEN '{start_date}' AND '{end_date}'"
-    df = pd.read_sql(query, conn)
+    query += join + where
+    df = read_sql(conn, query, params)
     return df["total_sales"]
 
 
-def sales_by_product(conn, start_date=None, end_date=None):
-    query = """
+def sales_by_product(conn, start_date=None, end_date=None, date_ids=None):
+    sales, join, where, params = sales_date_filter(conn, start_date, end_date, date_ids)
+    query = f"""
     SELECT Products.name, SUM(Sales.quantity * Sales.unit_price) as sales_by_product
-    FROM Sales
+    FROM {sales}
     JOIN Products ON Sales.product_id = Products.product_id
-    JOIN DateInfo ON Sales.date_id = DateInfo.date_id
     """
-    if start_date and end_date:
-        query += f" WHERE DateInfo.date BETWEEN '{start_date}' AND '{end_date}'"
-    query += " GROUP BY Products.name"
-    df = pd.read_sql(query, conn)
+    query += join + where
+    query += " GROUP BY Products.name ORDER BY Products.name"
+    df = read_sql(conn, query, params)
     return df
 
 
-def sales_by_region(conn, start_date=None, end_date=None):
-    query = """
+def sales_by_region(conn, start_date=None, end_date=None, date_ids=None):
+    sales, join, where, params = sales_date_filter(conn, start_date, end_date, date_ids)
+    query = f"""
     SELECT Stores.city, SUM(Sales.quantity * Sales.unit_price) as sales_by_region
-    FROM Sales
+    FROM {sales}
     JOIN Stores ON Sales.store_id = Stores.store_id
-    JOIN DateInfo ON Sales.date_id = DateInfo.date_id
     """
-    if start_date and end_date:
-        query += f" WHERE DateInfo.date BETWEEN '{start_date}' AND '{end_date}'"
-    query += " GROUP BY Stores.city"
-    df = pd.read_sql(query, conn)
+    query += join + where
+    query += " GROUP BY Stores.city ORDER BY Stores.city"
+    df = read_sql(conn, query, params)
     return df
 
-def profit_total(conn, start_date=None, end_date=None):
-    query = """
+def profit_total(conn, start_date=None, end_date=None, date_ids=None):
+    sales, join, where, params = sales_date_filter(conn, start_date, end_date, date_ids)
+    query = f"""
     SELECT SUM((Sales.unit_price - Products.purchase_price) * Sales.quantity) as total_profit
-    FROM Sales
+    FROM {sales}
     JOIN Products ON Sales.product_id = Products.product_id
-    JOIN DateInfo ON Sales.date_id = DateInfo.date_id
     """
-    if start_date and end_date:
-        query += f" WHERE DateInfo.date BETWEEN '{start_date}' AND '{end_date}'"
-    df = pd.read_sql(query, conn)
+    query += join + where
+    df = read_sql(conn, query, params)
     return df["total_profit"]
 
-def profit_by_product(conn, start_date=None, end_date=None):
-    query = """
+def profit_by_product(conn, start_date=None, end_date=None, date_ids=None):
+    sales, join, where, params = sales_date_filter(conn, start_date, end_date, date_ids)
+    query = f"""
     SELECT Products.name, SUM((Sales.unit_price - Products.purchase_price) * Sales.quantity) as profit_by_product
-    FROM Sales
+    FROM {sales}
     JOIN Products ON Sales.product_id = Products.product_id
-    JOIN DateInfo ON Sales.date_id = DateInfo.date_id
     """
-    if start_date and end_date:
-        query += f" WHERE DateInfo.date BETWEEN '{start_date}' AND '{end_date}'"
-    query += " GROUP BY Products.name"
-    df = pd.read_sql(query, conn)
+    query += join + where
+    query += " GROUP BY Products.name ORDER BY Products.name"
+    df = read_sql(conn, query, params)
     return df
 
-def profit_by_region(conn, start_date=None, end_date=None):
-    query = """
+def profit_by_region(conn, start_date=None, end_date=None, date_ids=None):
+    sales, join, where, params = sales_date_filter(conn, start_date, end_date, date_ids)
+    query = f"""
     SELECT Stores.city, SUM((Sales.unit_price - Products.purchase_price) * Sales.quantity) as profit_by_region
-    FROM Sales
+    FROM {sales}
     JOIN Stores ON Sales.store_id = Stores.store_id
     JOIN Products ON Sales.product_id = Products.product_id
-    JOIN DateInfo ON Sales.date_id = DateInfo.date_id
     """
-    if start_date and end_date:
-        query += f" WHERE DateInfo.date BETWEEN '{start_date}' AND '{end_date}'"
-    query += " GROUP BY Stores.city"
-    df = pd.read_sql(query, conn)
+    query += join + where
+    query += " GROUP BY Stores.city ORDER BY Stores.city"
+    df = read_sql(conn, query, params)
     return df
 
-def top_selling_products(conn, start_date=None, end_date=None, limit=3):
-    query = """
+def top_selling_products(conn, start_date=None, end_date=None, limit=3, date_ids=None):
+    sales, join, where, params = sales_date_filter(conn, start_date, end_date, date_ids)
+    query = f"""
     SELECT Products.name, SUM(Sales.quantity * Sales.unit_price) as total_sales
-    FROM Sales
+    FROM {sales}
     JOIN Products ON Sales.product_id = Products.product_id
-    JOIN DateInfo ON Sales.date_id = DateInfo.date_id
     """
-    if start_date and end_date:
-        query += f" WHERE DateInfo.date BETWEEN '{start_date}' AND '{end_date}'"
+    query += join + where
     query += " GROUP BY Products.name ORDER BY total_sales DESC LIMIT ?"
-    df = pd.read_sql_query(query, conn, params=(limit,))
+    df = read_sql(conn, query, params + (limit,))
     return df
 
-def top_customers(conn, start_date=None, end_date=None, limit=3):
-    query = """
+def top_customers(conn, start_date=None, end_date=None, limit=3, date_ids=None):
+    sales, join, where, params = sales_date_filter(conn, start_date, end_date, date_ids)
+    query = f"""
     SELECT Customers.name, SUM(Sales.quantity * Sales.unit_price) as total_spent
-    FROM Sales
+    FROM {sales}
     JOIN Customers ON Sales.customer_id = Customers.customer_id
-    JOIN DateInfo ON Sales.date_id = DateInfo.date_id
     """
-    if start_date and end_date:
-        query += f" WHERE DateInfo.date BETWEEN '{start_date}' AND '{end_date}'"
+    query += join + where
     query += " GROUP BY Customers.name ORDER BY total_spent DESC LIMIT ?"
-    df = pd.read_sql_query(query, conn, params=(limit,))
+    df = read_sql(conn, query, params + (limit,))
     return df
 
-def top_stores_by_sales(conn, start_date=None, end_date=None, limit=3):
-    query = """
+def top_stores_by_sales(conn, start_date=None, end_date=None, limit=3, date_ids=None):
+    sales, join, where, params = sales_date_filter(conn, start_date, end_date, date_ids)
+    query = f"""
     SELECT Stores.address || ', ' || Stores.city as store_location, SUM(Sales.quantity * Sales.unit_price) as total_sales
-    FROM Sales
+    FROM {sales}
     JOIN Stores ON Sales.store_id = Stores.store_id
-    JOIN DateInfo ON Sales.date_id = DateInfo.date_id
     """
-    if start_date and end_date:
-        query += f" WHERE DateInfo.date BETWEEN '{start_date}' AND '{end_date}'"
+    query += join + where
     query += " GROUP BY store_location ORDER BY total_sales DESC LIMIT ?"
-    df = pd.read_sql_query(query, conn, params=(limit,))
+    df = read_sql(conn, query, params + (limit,))
     return df
 
 
-def compute_basic_analytics(start_date=None, end_date=None):
+# The nine basic metrics, each writes the CSV named after it
+BASIC_METRICS = (total_sales, sales_by_product, sales_by_region, profit_total, profit_by_product, profit_by_region,
+                 top_selling_products, top_customers, top_stores_by_sales)
+TOP_K_METRICS = (top_selling_products, top_customers, top_stores_by_sales)
+
+def basic_outputs(top_k=DEFAULT_TOP_K):
+    """(output name, function, extra args) of every basic analytic, the top-k metrics listing top_k rows."""
+    return tuple((function.__name__, function, (top_k,) if function in TOP_K_METRICS else ())
+                 for function in BASIC_METRICS)
+
+OUTPUTS = basic_outputs()
+
+def read_basic_fact(conn, start_date=None, end_date=None, date_ids=None):
+    """
+    Read the filtered fact columns every basic analytic needs in a single scan of Sales, as NumPy arrays.
+    The query is filtered like the per-metric queries, so SQLite scans the rows in the same order.
+    """
+    sales, join, where, params = sales_date_filter(conn, start_date, end_date, date_ids)
+    query = f"""
+    SELECT {', '.join(f'Sales.{column}' for column in BASIC_FACT_COLUMNS)}
+    FROM {sales}
+    """
+    query += join + where
+    df = read_sql(conn, query, params)
+    return {column: df[column].to_numpy(dtype=COLUMN_DTYPES[column]) for column in BASIC_FACT_COLUMNS}
+
+def compute_basic_analytics_shared_scan(conn, start_date=None, end_date=None, date_ids=None, data_dir=DATA_DIR,
+                                        top_k=DEFAULT_TOP_K, formats=DEFAULT_FORMATS):
+    """Compute all basic analytics from one shared scan of the fact instead of one query per metric."""
+    fact = read_basic_fact(conn, start_date, end_date, date_ids)
+    for name, result in basic_metrics_from_fact(conn, fact, top_k).items():
+        write_output(result, data_dir, name, formats)
+
+def compute_basic_analytics_columnar(conn, date_ids=None, data_dir=DATA_DIR, top_k=DEFAULT_TOP_K,
+                                     formats=DEFAULT_FORMATS, db_path=None, columnar_dir=COLUMNAR_DIR):
+    """
+    Compute the basic analytics with np.bincount group-bys over the memory-mapped Sales columns.
+    The columns are exported from a SQLite reader of db_path whatever the engine of conn, in the order SQLite sums them.
+    """
+    refresh_columns(get_connection(read_only=True, db_path=db_path), columnar_dir)
+    for name, result in basic_metrics(conn, open_columns(columnar_dir), date_ids, top_k).items():
+        write_output(result, data_dir, name, formats)
+
+def compute_basic_analytics(start_date=None, end_date=None, columnar=False, engine=DEFAULT_ENGINE, shared_scan=False,
+                            workers=DEFAULT_WORKERS, use_cache=True, prefix_index=False, approximate=False,
+                            top_k=DEFAULT_TOP_K, formats=DEFAULT_FORMATS, data_dir=DATA_DIR):
+    """
+    Pre-process the basic analytics to the output formats, running the per-metric queries on `workers` threads and
+    serving unchanged outputs from the result cache if use_cache. The top-k metrics list top_k rows, merged from the
+    per-day top-k summaries if approximate. Returns {metric: seconds}, the columnar and shared scan paths are timed
+    as a whole.
+    """
     try:
-        with sqlite3.connect(DB_PATH) as conn:
-            total_sales(conn, start_date, end_date).to_csv(os.path.join(DATA_DIR, 'total_sales.csv'), index=False)
-            sales_by_product(conn, start_date, end_date).to_csv(os.path.join(DATA_DIR, 'sales_by_product.csv'), index=False)
-            sales_by_region(conn, start_date, end_date).to_csv(os.path.join(DATA_DIR, 'sales_by_region.csv'), index=False)
-            profit_total(conn, start_date, end_date).to_csv(os.path.join(DATA_DIR, 'profit_total.csv'), index=False)
-            profit_by_product(conn, start_date, end_date).to_csv(os.path.join(DATA_DIR, 'profit_by_product.csv'), index=False)
-            profit_by_region(conn, start_date, end_date).to_csv(os.path.join(DATA_DIR, 'profit_by_region.csv'), index=False)
-            top_selling_products(conn, start_date, end_date).to_csv(os.path.join(DATA_DIR, 'top_selling_products.csv'), index=False)
-            top_customers(conn, start_date, end_date).to_csv(os.path.join(DATA_DIR, 'top_customers.csv'), index=False)
-            top_stores_by_sales(conn, start_date, end_date).to_csv(os.path.join(DATA_DIR, 'top_stores_by_sales.csv'), index=False)
-    except sqlite3.Error as e:
+        with analytics_connection(engine) as conn:
+            # Resolve the date range to its date_id range once for all queries
+            date_ids = resolve_date_id_range(conn, start_date, end_date)
+            cache = ResultCache() if use_cache else None
+            fingerprint = data_fingerprint(conn) if use_cache else None
+            paths = {file_name: path for name, _, _ in OUTPUTS
+                     for file_name, path in output_paths(data_dir, name, formats).items()}
+
+            # A non-contiguous date range can't be selected on the date_id column, it falls back to SQL
+            if columnar and date_ids is not None:
+                metric = with_cache(lambda conn: compute_basic_analytics_columnar(conn, date_ids, data_dir, top_k, formats), cache, 'basic',
+                                    paths, start_date, end_date, fingerprint, engine=engine, mode='columnar', top_k=top_k)
+                return {'columnar': timed(metric, conn)}
+            if shared_scan:
+                metric = with_cache(lambda conn: compute_basic_analytics_shared_scan(conn, start_date, end_date, date_ids, data_dir, top_k,
+                                                                                 formats),
+                                    cache, 'basic', paths, start_date, end_date, fingerprint, engine=engine, mode='shared_scan',
+                                    top_k=top_k)
+                return {'shared_scan': timed(metric, conn)}
+            # The metrics derivable from the prefix sums skip the query, the others (top_customers) still run it
+            index = load_prefix_index() if prefix_index and date_ids is not None else None
+            heavy_hitters = load_heavy_hitters() if approximate and date_ids is not None else None
+            metrics = range_metrics('basic', basic_outputs(top_k), data_dir, start_date, end_date, date_ids, engine,
+                                    cache, fingerprint, index, heavy_hitters, formats)
+            return run_metrics(conn, metrics, engine, workers)
+    except DATABASE_ERRORS as e:
         print(f"Database error: {e}")
         sys.exit(1)  
         
@@ -195,11 +287,21 @@ if __name__ == "__main__":
     if not os.path.exists(DATA_DIR):
         os.makedirs(DATA_DIR)
 
-    # Check if the command-line args are provided
-    if len(sys.argv) >= 3:
-        start_date = reformat_date(sys.argv[1])
-        end_date = reformat_date(sys.argv[2])
-        compute_basic_analytics(start_date, end_date)
-    else:
-        print("Start date and end date arguments are required!")
-        sys.exit(1)
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Pre-process the basic analytics.")
+    parser.add_argument('start_date', help="Start date in YYYYMMDD format")
+    parser.add_argument('end_date', help="End date in YYYYMMDD format")
+    parser.add_argument('--engine', choices=ENGINES, default=DEFAULT_ENGINE, help="Query engine to run the analytics on")
+    parser.add_argument('--columnar', action='store_true', help="Use the memory-mapped Sales columns")
+    parser.add_argument('--shared-scan', action='store_true', help="Compute every metric from one scan of Sales")
+    parser.add_argument('--prefix-index', action='store_true', help="Answer the derivable metrics from the prefix sums")
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS, help="Run the per-metric queries on this many threads")
+    parser.add_argument('--no-cache', action='store_true', help="Recompute every metric instead of using the result cache")
+    parser.add_argument('--top-k', type=int, default=DEFAULT_TOP_K, help="Rows of the top products, customers and stores")
+    parser.add_argument('--approximate', action='store_true', help="Merge the top-k metrics from the per-day summaries")
+    parser.add_argument('--csv', action='store_true', help="Export the outputs as CSV files too")
+    args = parser.parse_args()
+    timings = compute_basic_analytics(reformat_date(args.start_date), reformat_date(args.end_date), args.columnar,
+                                      args.engine, args.shared_scan, args.workers, not args.no_cache,
+                                      args.prefix_index, args.approximate, args.top_k,
+                                      with_csv(DEFAULT_FORMATS) if args.csv else DEFAULT_FORMATS)
+    print('\n'.join(format_timings(timings)))
\ No newline at end of file
@@ -0,0 +1,129 @@
+"""
+This module, batch.py, pre-processes an analytics level for many date ranges in one run, e.g. every month,
+quarter or rolling 30-day window of the history, instead of one full pipeline per range.
+It provides the following:
+
+1. Range Specs:
+    calendar_ranges turns a calendar spec (month, quarter, year or rollingN for N-day windows ending on every day)
+    into the named date ranges within [start_date, end_date], and parse_ranges reads an explicit list of
+    YYYYMMDD-YYYYMMDD ranges.
+
+2. Shared Work:
+    One connection, database fingerprint and prefix-sum index (see prefix_index.py) serve every range. The
+    metrics derivable from the prefix sums cost two slices per range however much the ranges overlap, and only
+    the others (e.g. per customer) query Sales, each reading just its own range. The metrics of all ranges run in a
+    single thread pool, and outputs computed before for a range are served from the result cache.
+    In approximate mode, the sketches (see sketches.py), or the per-day top-k summaries of the basic level
+    (see heavy_hitters.py), are refreshed once too and merged per range.
+
+3. Partitioned Outputs:
+    The outputs of every range are written to /app/data/analytics/<level>/<range>/, where <range> is the range name
+    (e.g. 2021-03, 2021-Q1, 2021 or 2021-01-01_2021-01-30).
+
+Usage:
+    ranges = calendar_ranges('month', '2021-01-01', '2022-12-31')
+    timings = compute_batch('intermediate', intermediate_analytics, ranges, engine='sqlite')
+"""
+
+import os
+import re
+import sys
+from datetime import date, timedelta
+
+sys.path.append('/app')
+
+from analytics.date_filters import resolve_date_id_range
+from analytics.engines import analytics_connection, data_fingerprint, DEFAULT_ENGINE
+from analytics.heavy_hitters import load_heavy_hitters
+from analytics.metric_pool import range_metrics, run_metrics, DEFAULT_WORKERS
+from analytics.output_format import DEFAULT_FORMATS
+from analytics.prefix_index import load_prefix_index
+from analytics.result_cache import ResultCache
+from analytics.sketches import load_sketches
+
+CALENDAR_SPECS = ('month', 'quarter', 'year', 'rollingN')
+ROLLING_SPEC = re.compile(r'rolling(\d+)$')
+
+def month_start(day, months=1):
+    """First day of the `months`-month period containing day, counted from January."""
+    return date(day.year, (day.month - 1) // months * months + 1, 1)
+
+def add_months(day, months):
+    month = day.month - 1 + months
+    return date(day.year + month // 12, month % 12 + 1, 1)
+
+def calendar_ranges(every, start_date, end_date):
+    """
+    {range name: (start, end)} of the calendar periods of every in [start_date, end_date] (YYYY-MM-DD), in order.
+    Periods at either end are cut to the bounds.
+    """
+    first, last = date.fromisoformat(start_date), date.fromisoformat(end_date)
+    ranges = {}
+    rolling = ROLLING_SPEC.match(every)
+    if rolling:
+        days = int(rolling.group(1))
+        if days < 1:
+            raise ValueError("Rolling windows need at least one day")
+        end = first + timedelta(days=days - 1)
+        while end <= last:
+            start = end - timedelta(days=days - 1)
+            ranges[f"{start.isoformat()}_{end.isoformat()}"] = (start.isoformat(), end.isoformat())
+            end += timedelta(days=1)
+        return ranges
+    months = {'month': 1, 'quarter': 3, 'year': 12}.get(every)
+    if months is None:
+        raise ValueError(f"Unknown calendar spec {every!r}, expected one of {', '.join(CALENDAR_SPECS)}")
+    period = month_start(first, months)
+    while period <= last:
+        next_period = add_months(period, months)
+        if every == 'month':
+            name = f"{period.year}-{period.month:02d}"
+        elif every == 'quarter':
+            name = f"{period.year}-Q{(period.month - 1) // 3 + 1}"
+        else:
+            name = str(period.year)
+        ranges[name] = (max(period, first).isoformat(), min(next_period - timedelta(days=1), last).isoformat())
+        period = next_period
+    return ranges
+
+def parse_ranges(spec):
+    """{range name: (start, end)} of comma separated YYYYMMDD-YYYYMMDD ranges."""
+    ranges = {}
+    for part in spec.split(','):
+        match = re.fullmatch(r'\s*(\d{8})-(\d{8})\s*', part)
+        if not match:
+            raise ValueError(f"Invalid date range {part!r}, expected YYYYMMDD-YYYYMMDD")
+        start, end = (f"{d[:4]}-{d[4:6]}-{d[6:]}" for d in match.groups())
+        if start > end:
+            raise ValueError(f"Date range {part.strip()!r} ends before it starts")
+        ranges[f"{start}_{end}"] = (start, end)
+    return ranges
+
+def compute_batch(level, module, ranges, engine=DEFAULT_ENGINE, workers=DEFAULT_WORKERS, use_cache=True,
+                  prefix_index=True, approximate=None, top_k=None, formats=DEFAULT_FORMATS):
+    """
+    Pre-process the outputs of the level's analytics module for every {name: (start, end)} of ranges
+    into its DATA_DIR/<name>/, estimating what can be from the sketches with approximate (SketchSettings),
+    or for the basic level from the per-day top-k summaries. The basic top-k metrics list top_k rows (default 3).
+    Every output is written in the output formats.
+    Returns {<name>/<metric>: seconds}.
+    """
+    with analytics_connection(engine) as conn:
+        cache = ResultCache() if use_cache else None
+        fingerprint = data_fingerprint(conn) if use_cache else None
+        index = load_prefix_index() if prefix_index else None
+        outputs = module.OUTPUTS
+        if level == 'basic':
+            outputs = module.basic_outputs(top_k or module.DEFAULT_TOP_K)
+            sketches = load_heavy_hitters() if approximate else None
+        else:
+            sketches = load_sketches(approximate) if approximate else None
+        metrics = {}
+        for name, (start_date, end_date) in ranges.items():
+            data_dir = os.path.join(module.DATA_DIR, name)
+            os.makedirs(data_dir, exist_ok=True)
+            date_ids = resolve_date_id_range(conn, start_date, end_date)
+            for metric_name, metric in range_metrics(level, outputs, data_dir, start_date, end_date, date_ids,
+                                                     engine, cache, fingerprint, index, sketches, formats).items():
+                metrics[f"{name}/{metric_name}"] = metric
+        return run_metrics(conn, metrics, engine, workers)
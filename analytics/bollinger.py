@@ -0,0 +1,142 @@
+"""
+This module, bollinger.py, computes Bollinger bands for many daily profit series, window sizes and deviation
+multipliers at once, instead of one pandas rolling window over one series. It provides the following:
+
+1. Dates×Series Matrix:
+    profit_matrix pivots the grouped daily profits (e.g. per store or product, see calculate_daily_profits)
+    into one float64 matrix with a column per series. Days without sales of a series have zero profit.
+
+2. Sliding-Window Kernels:
+    rolling_bands takes the cumulative sums of every column and of its squares once, and derives the moving
+    average and (sample) standard deviation of every window size from differences of these sums, for all
+    series at once. The columns are centered on their mean before summing, so the squares stay small enough
+    for float64. The input matrix is only read, never modified.
+
+3. Long-Format Output:
+    band_table lays the bands of every series, window and multiplier out as one table with a row per
+    series, window, multiplier and day, skipping the first window - 1 days of every window, which have no band.
+
+4. Groupings:
+    grouping_bands computes the table of every series of a grouping (store, product or store_product) and
+    series_band_table combines several groupings, with their store_id and product_id.
+
+Usage:
+    dates, keys, values = profit_matrix(daily_profits, ('store_id',))
+    bands = rolling_bands(values, windows=(10, 20, 50), num_std_devs=(2,))
+    table = band_table(dates, keys, ('store_id',), values, bands)
+    table = series_band_table([grouping_bands(daily_profits, 'store')])
+"""
+
+import numpy as np
+import pandas as pd
+
+# The Sales columns of the per store, per product and per store×product daily profit series
+GROUPINGS = {
+    'store': ('store_id',),
+    'product': ('product_id',),
+    'store_product': ('store_id', 'product_id'),
+}
+DEFAULT_GROUPINGS = ('store', 'product')
+DEFAULT_WINDOWS = (10, 20, 50)
+DEFAULT_STD_DEVS = (2,)
+# Need more than 3 times the window size for bollinger bands to be reliable
+MIN_WINDOWS_PER_SERIES = 3
+
+def profit_matrix(daily_profits, group_by):
+    """
+    (dates, keys, values) of the daily_profits of every group of the group_by columns, where values is a
+    dates×keys matrix covering every day between the first and last date.
+    """
+    matrix = daily_profits.pivot_table(index='date', columns=list(group_by), values='daily_profit', aggfunc='sum')
+    matrix.index = pd.to_datetime(matrix.index)
+    days = pd.date_range(matrix.index.min(), matrix.index.max(), freq='D')
+    matrix = matrix.reindex(days, fill_value=0.0).fillna(0.0)
+    keys = [key if isinstance(key, tuple) else (key,) for key in matrix.columns]
+    return days, keys, matrix.to_numpy(dtype=np.float64)
+
+def rolling_bands(values, windows=(20,), num_std_devs=(2,)):
+    """
+    {(window, num_std_dev): (lower_band, moving_avg, upper_band)} of the dates×series matrix values, each a matrix
+    of its shape whose first window - 1 rows are NaN. Windows must be at least 2 days.
+    """
+    num_days, num_series = values.shape
+    # Sums of the centered values, the variance doesn't change by the shift
+    offset = values.mean(axis=0) if num_days else np.zeros(num_series)
+    centered = values - offset
+    sums = np.zeros((num_days + 1, num_series))
+    np.cumsum(centered, axis=0, out=sums[1:])
+    squares = np.zeros((num_days + 1, num_series))
+    np.cumsum(centered * centered, axis=0, out=squares[1:])
+
+    bands = {}
+    for window in windows:
+        if window < 2:
+            raise ValueError(f"Bollinger windows need at least 2 days, got {window}")
+        moving_avg = np.full((num_days, num_series), np.nan)
+        moving_std_dev = np.full((num_days, num_series), np.nan)
+        if num_days >= window:
+            window_sums = sums[window:] - sums[:-window]
+            window_mean = window_sums / window
+            variance = (squares[window:] - squares[:-window] - window_sums * window_mean) / (window - 1)
+            # Rounding can leave a tiny negative variance for a constant window
+            np.maximum(variance, 0, out=variance)
+            moving_avg[window - 1:] = window_mean + offset
+            moving_std_dev[window - 1:] = np.sqrt(variance)
+        for num_std_dev in num_std_devs:
+            bands[(window, num_std_dev)] = (moving_avg - moving_std_dev * num_std_dev, moving_avg,
+                                            moving_avg + moving_std_dev * num_std_dev)
+    return bands
+
+def band_table(dates, keys, group_by, values, bands):
+    """One long table of the rolling_bands of every (key of the group_by columns, window, multiplier, date)."""
+    num_days, num_series = values.shape
+    frames = []
+    for (window, num_std_dev), (lower_band, moving_avg, upper_band) in bands.items():
+        rows = slice(window - 1, None)
+        days = num_days - (window - 1)
+        if days <= 0:
+            continue
+        frame = {column: np.repeat([key[i] for key in keys], days) for i, column in enumerate(group_by)}
+        # Column-major, so the rows of a series are contiguous and in date order
+        frame.update({
+            'window': window,
+            'num_std_dev': num_std_dev,
+            'date': np.tile(dates[rows].date, num_series),
+            'daily_profit': values[rows].ravel(order='F'),
+            'lower_band': lower_band[rows].ravel(order='F'),
+            'moving_avg': moving_avg[rows].ravel(order='F'),
+            'upper_band': upper_band[rows].ravel(order='F'),
+        })
+        frames.append(pd.DataFrame(frame))
+    columns = [*group_by, 'window', 'num_std_dev', 'date', 'daily_profit', 'lower_band', 'moving_avg', 'upper_band']
+    if not frames:
+        return pd.DataFrame(columns=columns)
+    return pd.concat(frames, ignore_index=True)[columns]
+
+def grouping_bands(daily_profits, grouping, windows=DEFAULT_WINDOWS, num_std_devs=DEFAULT_STD_DEVS):
+    """
+    Long band table of the (group columns, date, daily_profit) rows of one grouping, for every window
+    that is reliable over its days, or None if there are no rows or too few days for any window.
+    """
+    if daily_profits.empty:
+        return None
+    group_by = GROUPINGS[grouping]
+    dates, keys, values = profit_matrix(daily_profits, group_by)
+    reliable_windows = [window for window in windows if len(dates) >= window * MIN_WINDOWS_PER_SERIES]
+    if not reliable_windows:
+        return None
+    table = band_table(dates, keys, group_by, values, rolling_bands(values, reliable_windows, num_std_devs))
+    table.insert(0, 'grouping', grouping)
+    return table
+
+def series_band_table(tables):
+    """One table of the grouping_bands tables of several groupings, or None if all are None."""
+    tables = [table for table in tables if table is not None]
+    if not tables:
+        return None
+    table = pd.concat(tables, ignore_index=True)
+    columns = ['grouping', 'store_id', 'product_id', 'window', 'num_std_dev', 'date', 'daily_profit', 'lower_band',
+               'moving_avg', 'upper_band']
+    table = table.reindex(columns=columns)
+    table[['store_id', 'product_id']] = table[['store_id', 'product_id']].astype('Int64')
+    return table
@@ -0,0 +1,254 @@
+"""
+This module, columnar.py, keeps a memory-mapped columnar copy of the Sales fact for vectorized analytics.
+Instead of decoding the same Sales rows from SQLite pages for every query, the fact columns are exported once as
+contiguous typed NumPy arrays and every analytics process maps the same files, sharing the OS page cache.
+It provides the following:
+
+1. Columnar Export:
+    Writes date_id, store_id, product_id, customer_id, quantity and unit_price of every sale as one raw
+    array file per column in /app/data/columnar/, plus a manifest with the row count, the last exported sale_id and
+    the fingerprint of the exported sales (see engines.sales_fingerprint).
+
+2. Incremental Refresh:
+    Sales are only ever appended with increasing sale_ids (populate_db, load_sales, append_sales), so a refresh
+    appends the sales after the manifest's last sale_id, in (date_id, store_id, ...) order. If the fingerprint of the
+    exported sales no longer matches the database (e.g. after reset_db, even to the same number of sales, or an
+    in-place edit), the export is rebuilt from scratch as the next generation of column files, which readers only map
+    once the manifest names it. The manifest is replaced last, so readers never see a partially appended column.
+
+3. Memory-Mapped Columns:
+    open_columns maps every column read-only with np.memmap, and date_range_mask selects a resolved date_id range.
+
+4. Vectorized Basic Analytics:
+    basic_metrics computes the nine basic analytics with np.bincount group-bys over the product, city, customer
+    and store codes, returning the same DataFrames as the SQL queries of basic_analytics.py.
+    basic_metrics_from_fact runs the same group-bys on fact arrays from any other source (e.g. a single SQL scan).
+
+Usage:
+    python columnar.py
+    columns = open_columns()
+"""
+
+import fcntl
+import json
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+sys.path.append('/app')
+
+from analytics.engines import sales_fingerprint
+from database.connection import connect
+from database.partitions import sales_source
+
+COLUMNAR_DIR = '/app/data/columnar/'
+MANIFEST_NAME = 'manifest.json'
+LOCK_NAME = '.lock'
+
+# Typed layout of the exported fact columns, ids and quantities fit comfortably in 32 bits
+COLUMN_DTYPES = {
+    'date_id': np.int32,
+    'store_id': np.int32,
+    'product_id': np.int32,
+    'customer_id': np.int32,
+    'quantity': np.int32,
+    'unit_price': np.float64,
+}
+FETCH_SIZE = 100_000
+
+# Fact columns the basic analytics read
+BASIC_FACT_COLUMNS = ['store_id', 'product_id', 'customer_id', 'quantity', 'unit_price']
+
+def column_path(columnar_dir, name, generation):
+    return os.path.join(columnar_dir, f"{name}.{generation}.{np.dtype(COLUMN_DTYPES[name]).name}")
+
+def read_manifest(columnar_dir=COLUMNAR_DIR):
+    """Return the manifest of the export, or None if nothing was exported yet."""
+    try:
+        with open(os.path.join(columnar_dir, MANIFEST_NAME)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+def write_manifest(columnar_dir, manifest):
+    path = os.path.join(columnar_dir, MANIFEST_NAME)
+    with open(path + '.tmp', 'w') as f:
+        json.dump(manifest, f)
+    os.replace(path + '.tmp', path)
+
+def export_is_current(conn, manifest):
+    """
+    Check the exported rows are still exactly the sales up to the manifest's last sale_id, by their fingerprint
+    (see engines.sales_fingerprint), so a reset to the same number of sales or an in-place edit rebuilds the export.
+    """
+    if manifest is None:
+        return False
+    return manifest.get('fingerprint') == sales_fingerprint(conn, manifest['max_sale_id'])
+
+def refresh_columns(conn, columnar_dir=COLUMNAR_DIR, fetch_size=FETCH_SIZE):
+    """
+    Append the sales after the last exported sale_id to the column files, or rebuild the export if it is stale.
+    Returns the number of appended rows.
+    """
+    os.makedirs(columnar_dir, exist_ok=True)
+    # One refresh at a time, concurrent analytics processes wait and then find the export current
+    with open(os.path.join(columnar_dir, LOCK_NAME), 'w') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        manifest = read_manifest(columnar_dir)
+        if not export_is_current(conn, manifest):
+            # Readers only map the committed rows of the manifest's generation, so appends go in place after them,
+            # while a rebuild writes the files of the next generation, which no reader maps before the manifest names it
+            generation = manifest.get('generation', 0) + 1 if manifest else 1
+            manifest = {'rows': 0, 'max_sale_id': 0, 'generation': generation}
+        generation = manifest['generation']
+        files = {}
+        try:
+            for name in COLUMN_DTYPES:
+                path = column_path(columnar_dir, name, generation)
+                files[name] = open(path, 'r+b' if manifest['rows'] and os.path.exists(path) else 'w+b')
+                # Drop rows of an interrupted refresh that were never committed to the manifest
+                files[name].truncate(manifest['rows'] * np.dtype(COLUMN_DTYPES[name]).itemsize)
+                files[name].seek(0, os.SEEK_END)
+            # Rows are written in the order of idx_sales_covering, the order SQLite sums them in,
+            # so the NumPy group-bys add up the same floats in the same order as the SQL queries
+            cursor = conn.execute(
+                f"SELECT sale_id, {', '.join(COLUMN_DTYPES)} FROM {sales_source(conn)} "
+                f"WHERE sale_id > ? ORDER BY {', '.join(COLUMN_DTYPES)}",
+                (manifest['max_sale_id'],)
+            )
+            appended = 0
+            max_sale_id = manifest['max_sale_id']
+            while True:
+                rows = cursor.fetchmany(fetch_size)
+                if not rows:
+                    break
+                batch = list(zip(*rows))
+                for i, (name, dtype) in enumerate(COLUMN_DTYPES.items(), start=1):
+                    np.asarray(batch[i], dtype=dtype).tofile(files[name])
+                appended += len(rows)
+                max_sale_id = max(max_sale_id, max(batch[0]))
+        finally:
+            for f in files.values():
+                f.close()
+        write_manifest(columnar_dir, {'rows': manifest['rows'] + appended, 'max_sale_id': max_sale_id,
+                                      'fingerprint': sales_fingerprint(conn, max_sale_id), 'generation': generation})
+        # Files of older generations are only still mapped by readers, which keep them open after the unlink
+        current = {os.path.basename(column_path(columnar_dir, name, generation)) for name in COLUMN_DTYPES}
+        for fname in os.listdir(columnar_dir):
+            if fname.startswith(tuple(f"{name}." for name in COLUMN_DTYPES)) and fname not in current:
+                os.remove(os.path.join(columnar_dir, fname))
+    return appended
+
+def open_columns(columnar_dir=COLUMNAR_DIR):
+    """Map every exported column read-only, returns None if nothing was exported yet."""
+    while True:
+        manifest = read_manifest(columnar_dir)
+        if manifest is None:
+            return None
+        if manifest['rows'] == 0:
+            return {name: np.empty(0, dtype=dtype) for name, dtype in COLUMN_DTYPES.items()}
+        try:
+            return {
+                name: np.memmap(column_path(columnar_dir, name, manifest['generation']), dtype=dtype, mode='r',
+                                shape=(manifest['rows'],))
+                for name, dtype in COLUMN_DTYPES.items()
+            }
+        except FileNotFoundError:
+            # A rebuild removed the generation after the manifest was read, map the new one
+            if read_manifest(columnar_dir) == manifest:
+                raise
+
+def date_range_mask(columns, date_ids=None):
+    """Boolean mask of the rows in the (min_date_id, max_date_id) range, None selects every row."""
+    if date_ids is None:
+        return np.ones(len(columns['date_id']), dtype=bool)
+    min_date_id, max_date_id = date_ids
+    return (columns['date_id'] >= min_date_id) & (columns['date_id'] <= max_date_id)
+
+def group_codes(conn, query):
+    """
+    Map the (id, label) rows of query to (codes, labels): codes[id] is the position of the id's label
+    in the sorted unique labels, so rows of equal labels fall into the same group like in a SQL GROUP BY.
+    """
+    ids, labels = zip(*conn.execute(query).fetchall())
+    labels, inverse = np.unique(np.array(labels, dtype=object), return_inverse=True)
+    codes = np.full(max(ids) + 1, -1, dtype=np.int64)
+    codes[np.array(ids)] = inverse
+    return codes, labels
+
+def grouped_sums(keys, weights, labels):
+    """Sum weights per group key, keeping only the groups that have rows (like GROUP BY) in label order."""
+    sums = np.bincount(keys, weights=weights, minlength=len(labels))
+    present = np.bincount(keys, minlength=len(labels)) > 0
+    return labels[present], sums[present]
+
+def sequential_sum(values):
+    """Sum values one after the other like SQLite's SUM, NumPy's pairwise sum differs in the last digits."""
+    return np.cumsum(values)[-1]
+
+def top_k(labels, sums, label_column, value_column, limit):
+    df = pd.DataFrame({label_column: labels, value_column: sums})
+    return df.sort_values(value_column, ascending=False, kind='stable').head(limit).reset_index(drop=True)
+
+def basic_metrics(conn, columns, date_ids=None, limit=3):
+    """
+    Compute the nine basic analytics from the fact columns for the date_id range.
+    Returns {metric name: result} with the same Series/DataFrames as the functions of basic_analytics.py.
+    """
+    mask = date_range_mask(columns, date_ids)
+    return basic_metrics_from_fact(conn, {name: np.asarray(columns[name][mask]) for name in BASIC_FACT_COLUMNS}, limit)
+
+def basic_metrics_from_fact(conn, fact, limit=3):
+    """
+    Compute the nine basic analytics from the already filtered BASIC_FACT_COLUMNS arrays of fact.
+    The arrays have to be in the order SQLite scans Sales in for the sums to match the SQL queries to the last digit.
+    """
+    store_ids = fact['store_id']
+    product_ids = fact['product_id']
+    customer_ids = fact['customer_id']
+    quantity = fact['quantity']
+    unit_price = fact['unit_price']
+
+    purchase_price = np.zeros(conn.execute("SELECT MAX(product_id) FROM Products").fetchone()[0] + 1)
+    # fetchall, a DuckDB connection isn't iterable like a SQLite cursor
+    for product_id, price in conn.execute("SELECT product_id, purchase_price FROM Products").fetchall():
+        purchase_price[product_id] = price
+    revenue = quantity * unit_price
+    profit = (unit_price - purchase_price[product_ids]) * quantity
+
+    product_codes, product_names = group_codes(conn, "SELECT product_id, name FROM Products")
+    city_codes, cities = group_codes(conn, "SELECT store_id, city FROM Stores")
+    location_codes, locations = group_codes(conn, "SELECT store_id, address || ', ' || city FROM Stores")
+    customer_codes, customer_names = group_codes(conn, "SELECT customer_id, name FROM Customers")
+    product_keys = product_codes[product_ids]
+    city_keys = city_codes[store_ids]
+
+    # SUM over no rows is NULL in SQL
+    empty = len(revenue) == 0
+    names, sales = grouped_sums(product_keys, revenue, product_names)
+    city_names, city_sales = grouped_sums(city_keys, revenue, cities)
+    return {
+        'total_sales': pd.Series([None if empty else sequential_sum(revenue)], name='total_sales'),
+        'sales_by_product': pd.DataFrame({'name': names, 'sales_by_product': sales}),
+        'sales_by_region': pd.DataFrame({'city': city_names, 'sales_by_region': city_sales}),
+        'profit_total': pd.Series([None if empty else sequential_sum(profit)], name='total_profit'),
+        'profit_by_product': pd.DataFrame(dict(zip(
+            ('name', 'profit_by_product'), grouped_sums(product_keys, profit, product_names)))),
+        'profit_by_region': pd.DataFrame(dict(zip(
+            ('city', 'profit_by_region'), grouped_sums(city_keys, profit, cities)))),
+        'top_selling_products': top_k(names, sales, 'name', 'total_sales', limit),
+        'top_customers': top_k(*grouped_sums(customer_codes[customer_ids], revenue, customer_names),
+                               'name', 'total_spent', limit),
+        'top_stores_by_sales': top_k(*grouped_sums(location_codes[store_ids], revenue, locations),
+                                     'store_location', 'total_sales', limit),
+    }
+
+if __name__ == "__main__":
+    conn = connect()
+    try:
+        appended = refresh_columns(conn)
+    finally:
+        conn.close()
+    print(f"Exported {appended:,} new sales, {read_manifest()['rows']:,} sales in {COLUMNAR_DIR}")
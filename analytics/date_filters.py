@@ -0,0 +1,66 @@
+"""
+This module, date_filters.py, builds the date range filter shared by the basic, intermediate and advanced analytics queries.
+
+DateInfo.date_id is assigned in ascending date order, so a `DateInfo.date BETWEEN start AND end` filter is the same as
+a contiguous `Sales.date_id` range. The range is resolved once per date range, and the filter is then pushed down
+to the fact table as `Sales.date_id BETWEEN ? AND ?`. That makes the filter an index range scan on Sales, and queries
+that don't select any date attribute no longer need to join DateInfo at all.
+
+If the date_ids of the range turn out not to be contiguous (e.g. an older date was bulk loaded after newer ones),
+the filter falls back to joining DateInfo and filtering on DateInfo.date.
+
+When Sales is partitioned by month (see database/partitions.py), the resolved range also prunes the partitions:
+the filter returns the Sales source to select FROM, which only reads the partitions overlapping the range.
+
+Usage:
+    date_ids = resolve_date_id_range(conn, start_date, end_date)
+    sales, join, where, params = sales_date_filter(conn, start_date, end_date, date_ids)
+    query = f"SELECT ... FROM {sales}" + join + where
+    df = pd.read_sql(query, conn, params=params)
+"""
+
+import sys
+
+sys.path.append('/app')
+
+from database.partitions import sales_source
+
+DATE_INFO_JOIN = "\n    JOIN DateInfo ON Sales.date_id = DateInfo.date_id"
+
+def resolve_date_id_range(conn, start_date, end_date):
+    """
+    Resolve [start_date, end_date] to the (min_date_id, max_date_id) range covering exactly those dates.
+    Returns None if there is no date range, or if the date_ids of the range are not contiguous.
+    """
+    if not (start_date and end_date):
+        return None
+    min_date_id, max_date_id, num_dates = conn.execute(
+        "SELECT MIN(date_id), MAX(date_id), COUNT(*) FROM DateInfo WHERE date BETWEEN ? AND ?",
+        (start_date, end_date)
+    ).fetchone()
+    if num_dates == 0:
+        # No dates in the range, so an empty date_id range gives the same (empty) result
+        return (0, -1)
+    num_ids = conn.execute(
+        "SELECT COUNT(*) FROM DateInfo WHERE date_id BETWEEN ? AND ?", (min_date_id, max_date_id)
+    ).fetchone()[0]
+    if num_ids != num_dates:
+        return None
+    return (min_date_id, max_date_id)
+
+def sales_date_filter(conn, start_date=None, end_date=None, date_ids=None, date_info_joined=False):
+    """
+    Return the (sales, join, where, params) of a query over Sales for the date range, where sales is the
+    source to select FROM and join/where are appended to the query.
+    date_ids is the range resolved by resolve_date_id_range, it is resolved here when not given.
+    Set date_info_joined when the query already joins DateInfo to select a date attribute.
+    """
+    if not (start_date and end_date):
+        return sales_source(conn), "", "", ()
+    if date_ids is None:
+        date_ids = resolve_date_id_range(conn, start_date, end_date)
+    if date_ids is not None:
+        return sales_source(conn, date_ids), "", " WHERE Sales.date_id BETWEEN ? AND ?", tuple(date_ids)
+    # Fall back to filtering on the date itself, which reads every partition
+    join = "" if date_info_joined else DATE_INFO_JOIN
+    return sales_source(conn), join, " WHERE DateInfo.date BETWEEN ? AND ?", (start_date, end_date)
@@ -0,0 +1,197 @@
+"""
+This module, engines.py, is the query engine abstraction under the basic, intermediate and advanced analytics.
+The analytics functions only use the `conn` they are given and read_sql below, so the same SQL runs on either engine:
+
+1. sqlite (default):
+    The read-only SQLite connection of database/connection.py, queries run row by row on one thread.
+
+2. duckdb:
+    An embedded, local-only DuckDB database mirroring the SQLite one, for multi-core columnar execution of the
+    same SQL. The mirror is a DuckDB file next to the SQLite file (ORESTIS_DUCKDB_PATH overrides it). It is imported
+    from SQLite through Python, so it needs no DuckDB extensions or network access, and it is only re-imported
+    when the SQLite fingerprint (row counts, max ids and first and last rows of every table, and the write counter of
+    migration 003) changed since the last import.
+    A re-import is written to a temporary file and swapped in with a rename, so concurrent readers keep their
+    snapshot, and an exclusive lock keeps concurrent analytics processes from importing at the same time.
+
+open_reader opens further read-only connections of either engine, e.g. one per worker thread of metric_pool.py.
+
+duckdb is an optional dependency, only needed for the duckdb engine.
+
+Usage:
+    with analytics_connection('duckdb') as conn:
+        df = read_sql(conn, query, params)
+"""
+
+import fcntl
+import hashlib
+import os
+import sqlite3
+import sys
+from contextlib import contextmanager
+
+import pandas as pd
+
+try:
+    import duckdb
+except ImportError:
+    duckdb = None
+
+sys.path.append('/app')
+
+from database.connection import connect, get_connection, DB_PATH
+from database.partitions import sales_source
+
+ENGINES = ('sqlite', 'duckdb')
+DEFAULT_ENGINE = 'sqlite'
+
+# Dimension tables are copied as they are, Sales is copied from its full history across partitions
+MIRROR_TABLES = ['Stores', 'Products', 'Customers', 'DateInfo']
+MIRROR_FETCH_SIZE = 200_000
+
+DATABASE_ERRORS = (sqlite3.Error,) + ((duckdb.Error,) if duckdb is not None else ())
+
+def duckdb_path(db_path=None):
+    db_path = db_path or DB_PATH
+    return os.environ.get('ORESTIS_DUCKDB_PATH', os.path.splitext(db_path)[0] + '.duckdb')
+
+def read_sql(conn, query, params=()):
+    """Run query with its ? parameters on either engine and return the result as a DataFrame."""
+    if isinstance(conn, sqlite3.Connection):
+        return pd.read_sql(query, conn, params=params)
+    return conn.execute(query, list(params)).df()
+
+def data_version(conn):
+    """
+    The write counter of migration 003, bumped on every UPDATE or DELETE of Sales and the dimension tables,
+    or None if the migration wasn't applied.
+    """
+    exists = conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'DataVersion'").fetchone()
+    return conn.execute("SELECT version FROM DataVersion").fetchone()[0] if exists else None
+
+def sqlite_fingerprint(conn):
+    """
+    Row count and max id of Sales and of every dimension table, which change with every load or append,
+    plus a hash of their first and last rows, which tells apart databases of the same size (e.g. other seeds),
+    and the write counter of the in-place updates and deletes (see data_version).
+    """
+    sales = sales_source(conn)
+    parts = [conn.execute(f"SELECT COUNT(*), MAX(sale_id) FROM {sales}").fetchone()]
+    edge_rows = [conn.execute(f"SELECT * FROM {sales} ORDER BY sale_id {order} LIMIT 1").fetchone() for order in ('ASC', 'DESC')]
+    for table in MIRROR_TABLES:
+        parts.append(conn.execute(f"SELECT COUNT(*), MAX(rowid) FROM {table}").fetchone())
+        edge_rows += [conn.execute(f"SELECT * FROM {table} ORDER BY rowid {order} LIMIT 1").fetchone() for order in ('ASC', 'DESC')]
+    edge_hash = hashlib.sha1(repr(edge_rows).encode()).hexdigest()[:16]
+    return ';'.join(f"{count}:{max_id}" for count, max_id in parts) + f";{edge_hash};v{data_version(conn)}"
+
+def sales_fingerprint(conn, max_sale_id):
+    """
+    Fingerprint of the sales up to max_sale_id, for the stores derived from them (see columnar.export_is_current):
+    their count and a hash of their first and last rows, which change with a reset even at the same size, and the
+    write counter of the in-place updates and deletes. Unlike sqlite_fingerprint it doesn't change with appends.
+    """
+    sales = sales_source(conn)
+    count, = conn.execute(f"SELECT COUNT(*) FROM {sales} WHERE sale_id <= ?", (max_sale_id,)).fetchone()
+    edge_rows = [conn.execute(f"SELECT * FROM {sales} WHERE sale_id <= ? ORDER BY sale_id {order} LIMIT 1",
+                              (max_sale_id,)).fetchone() for order in ('ASC', 'DESC')]
+    edge_hash = hashlib.sha1(repr(edge_rows).encode()).hexdigest()[:16]
+    return f"{count};{edge_hash};v{data_version(conn)}"
+
+def data_fingerprint(conn):
+    """Fingerprint of the data conn reads, for a DuckDB mirror the one of the SQLite data it was imported from."""
+    if isinstance(conn, sqlite3.Connection):
+        return sqlite_fingerprint(conn)
+    return conn.execute("SELECT fingerprint FROM mirror_info").fetchone()[0]
+
+def mirror_fingerprint(path):
+    """Fingerprint of the SQLite data the DuckDB mirror at path was imported from, or None."""
+    if not os.path.exists(path):
+        return None
+    conn = duckdb.connect(path, read_only=True)
+    try:
+        return conn.execute("SELECT fingerprint FROM mirror_info").fetchone()[0]
+    except duckdb.Error:
+        return None
+    finally:
+        conn.close()
+
+def import_mirror(sqlite_conn, path, fingerprint, fetch_size=MIRROR_FETCH_SIZE):
+    """Import every table of the SQLite database into a new DuckDB file at path."""
+    conn = duckdb.connect(path)
+    try:
+        for table in MIRROR_TABLES:
+            conn.register('dimension', pd.read_sql(f"SELECT * FROM {table}", sqlite_conn))
+            conn.execute(f"CREATE TABLE {table} AS SELECT * FROM dimension")
+            conn.unregister('dimension')
+        conn.execute('''
+            CREATE TABLE Sales (
+                sale_id BIGINT, date_id BIGINT, store_id BIGINT, product_id BIGINT,
+                customer_id BIGINT, quantity BIGINT, unit_price DOUBLE
+            )
+        ''')
+        cursor = sqlite_conn.execute(
+            f"SELECT sale_id, date_id, store_id, product_id, customer_id, quantity, unit_price FROM {sales_source(sqlite_conn)}"
+        )
+        columns = [c[0] for c in cursor.description]
+        while True:
+            rows = cursor.fetchmany(fetch_size)
+            if not rows:
+                break
+            conn.register('chunk', pd.DataFrame(rows, columns=columns))
+            conn.execute("INSERT INTO Sales SELECT * FROM chunk")
+            conn.unregister('chunk')
+        conn.execute("CREATE TABLE mirror_info AS SELECT ? AS fingerprint", [fingerprint])
+        conn.execute("CHECKPOINT")
+    finally:
+        conn.close()
+
+def refresh_duckdb_mirror(db_path=None):
+    """Re-import the DuckDB mirror if the SQLite database changed since its last import. Returns True if it did."""
+    if duckdb is None:
+        raise RuntimeError("The duckdb engine requires the duckdb package (pip install duckdb).")
+    db_path = db_path or DB_PATH
+    path = duckdb_path(db_path)
+    with open(path + '.lock', 'w') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        sqlite_conn = connect(db_path, read_only=True)
+        try:
+            fingerprint = sqlite_fingerprint(sqlite_conn)
+            if mirror_fingerprint(path) == fingerprint:
+                return False
+            tmp_path = path + '.tmp'
+            for stale in (tmp_path, tmp_path + '.wal'):
+                if os.path.exists(stale):
+                    os.remove(stale)
+            import_mirror(sqlite_conn, tmp_path, fingerprint)
+        finally:
+            sqlite_conn.close()
+        os.replace(tmp_path, path)
+    return True
+
+def open_reader(engine=DEFAULT_ENGINE, db_path=None):
+    """
+    Open a new, uncached read-only connection of the engine, e.g. one per worker thread.
+    Unlike analytics_connection it doesn't refresh the DuckDB mirror, so open it inside an analytics_connection.
+    """
+    if engine == 'sqlite':
+        return connect(db_path, read_only=True, check_same_thread=False)
+    return duckdb.connect(duckdb_path(db_path), read_only=True)
+
+@contextmanager
+def analytics_connection(engine=DEFAULT_ENGINE, db_path=None):
+    """Yield a read-only connection of the engine for the analytics queries."""
+    if engine not in ENGINES:
+        raise ValueError(f"Unknown engine {engine!r}, expected one of {', '.join(ENGINES)}")
+    if engine == 'sqlite':
+        yield get_connection(read_only=True, db_path=db_path)
+        return
+    refresh_duckdb_mirror(db_path)
+    conn = duckdb.connect(duckdb_path(db_path), read_only=True)
+    try:
+        yield conn
+    finally:
+        conn.close()
+
+if __name__ == "__main__":
+    refreshed = refresh_duckdb_mirror()
+    print(f"{'Imported' if refreshed else 'Up to date:'} DuckDB mirror {duckdb_path()}")
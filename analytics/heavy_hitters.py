@@ -0,0 +1,252 @@
+"""
+This module, heavy_hitters.py, keeps per-day top-k summaries of the sales of every customer, product and store, so
+top_customers, top_selling_products and top_stores_by_sales are answered for any date range and any k by merging
+the summaries of its days instead of grouping and sorting the Sales of the range. It provides the following:
+
+1. Per-Day Summaries:
+    For every day and dimension, the `capacity` customers (products, stores) with the highest sales of the day and
+    their sales, plus the threshold: the highest sales of a customer left out of the day's summary (0 if no one was
+    left out). They are ranked in the database with one windowed GROUP BY per dimension, and stored in
+    /app/data/heavy_hitters/ as one fixed-size row per date_id. With the default capacity all products and stores
+    fit in the summaries, so their results are exact.
+
+2. Guaranteed Bounds:
+    The sales of a customer over a range are at least the sum of its sales in the summaries of the days it is in
+    (low), and at most that plus the thresholds of the days it isn't in (high). A customer in no summary of the
+    range has sold at most the sum of the thresholds of the range. The top k are ranked by their low bound, and
+    written with both bounds.
+
+3. Incremental Maintenance:
+    Sales are appended with increasing sale_ids. A refresh re-ranks the days from the first day with sales after the
+    manifest's last sale_id on, so both new days and sales landing on already summarized days are added. New days
+    are appended in place, re-ranked days are written to temporary files renamed over the mapped ones. Summarized
+    sales whose fingerprint no longer matches the database (e.g. after reset_db, even to the same number of sales,
+    or an in-place edit, see columnar.export_is_current) or a new capacity rebuild the summaries.
+    The manifest is replaced last, under a file lock.
+
+4. Fast Path:
+    HeavyHitters has a method for every top-k analytics function, with the same name, arguments and columns. Unlike
+    top_customers, which groups by customer name, the summaries count every customer_id on its own.
+
+Usage:
+    python heavy_hitters.py [--capacity N]
+    heavy_hitters = load_heavy_hitters()
+    df = heavy_hitters.fast_path(top_customers)(conn, start_date, end_date, 10, date_ids=date_ids)
+"""
+
+import argparse
+import fcntl
+import os
+import sys
+import threading
+
+import numpy as np
+import pandas as pd
+
+sys.path.append('/app')
+
+from analytics.columnar import export_is_current, read_manifest, write_manifest, LOCK_NAME
+from analytics.engines import sales_fingerprint
+from database.connection import connect
+from database.partitions import sales_source
+
+HEAVY_HITTERS_DIR = '/app/data/heavy_hitters/'
+# Entries kept per day and dimension
+DEFAULT_CAPACITY = 256
+
+# (Sales column, dimension table, label expression) of every summarized dimension
+DIMENSIONS = {
+    'customer': ('customer_id', 'Customers', 'name'),
+    'product': ('product_id', 'Products', 'name'),
+    'store': ('store_id', 'Stores', "address || ', ' || city"),
+}
+
+# (dimension, label column, value column) of the analytics functions HeavyHitters has a method of the same name for
+HEAVY_HITTER_METRICS = {
+    'top_customers': ('customer', 'name', 'total_spent'),
+    'top_selling_products': ('product', 'name', 'total_sales'),
+    'top_stores_by_sales': ('store', 'store_location', 'total_sales'),
+}
+
+def summary_paths(heavy_hitters_dir, dimension):
+    """Paths of the ids, sales and thresholds of the summaries of dimension."""
+    return tuple(os.path.join(heavy_hitters_dir, f"{dimension}_{name}") for name in
+                 ('ids.int64', 'sales.float64', 'thresholds.float64'))
+
+def summarize_days(conn, column, first_day, last_day, capacity):
+    """
+    (ids, sales, thresholds) of the days first_day to last_day, the ids and sales of the capacity best selling
+    `column`s of every day (-1 and 0 past the last one) and the highest sales of a `column` left out.
+    """
+    days = last_day + 1 - first_day
+    ids = np.full((days, capacity), -1, dtype=np.int64)
+    sales = np.zeros((days, capacity))
+    thresholds = np.zeros(days)
+    query = f"""
+    SELECT date_id, id, total, position FROM (
+        SELECT Sales.date_id, Sales.{column} AS id, SUM(Sales.quantity * Sales.unit_price) AS total,
+               ROW_NUMBER() OVER (
+                   PARTITION BY Sales.date_id ORDER BY SUM(Sales.quantity * Sales.unit_price) DESC, Sales.{column}
+               ) AS position
+        FROM {sales_source(conn, (first_day, last_day))}
+        WHERE Sales.date_id BETWEEN ? AND ?
+        GROUP BY Sales.date_id, Sales.{column}
+    ) AS ranked WHERE position <= ?
+    """
+    rows = conn.execute(query, (first_day, last_day, capacity + 1)).fetchall()
+    if rows:
+        date_ids, row_ids, totals, positions = (np.asarray(column) for column in zip(*rows))
+        kept = positions <= capacity
+        ids[date_ids[kept] - first_day, positions[kept] - 1] = row_ids[kept]
+        sales[date_ids[kept] - first_day, positions[kept] - 1] = totals[kept]
+        # Only the highest of the left out sales is returned, the one ranked right after the summary
+        thresholds[date_ids[~kept] - first_day] = totals[~kept]
+    return ids, sales, thresholds
+
+def write_rows(path, committed_rows, first_row, rows):
+    """
+    Write rows to the file at path from row first_row (at most committed_rows) on, dropping anything after the
+    first committed_rows rows that an interrupted refresh left. Rows after the committed ones are appended in place,
+    readers only map the committed rows. Rewriting committed rows (or all of them on a rebuild) writes the rows kept
+    and the new ones to a temporary file renamed into place, so readers still mapping the old file keep their summaries.
+    """
+    row_bytes = rows.itemsize * int(np.prod(rows.shape[1:]))
+    if committed_rows and first_row == committed_rows:
+        with open(path, 'r+b') as f:
+            f.truncate(committed_rows * row_bytes)
+            f.seek(0, os.SEEK_END)
+            rows.tofile(f)
+        return
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        if first_row:
+            with open(path, 'rb') as old:
+                f.write(old.read(first_row * row_bytes))
+        rows.tofile(f)
+    os.replace(tmp_path, path)
+
+def refresh_heavy_hitters(conn, capacity=DEFAULT_CAPACITY, heavy_hitters_dir=HEAVY_HITTERS_DIR):
+    """
+    Re-rank the summaries of the days with sales after the last summarized sale_id and the days after them,
+    or rebuild them if they are stale or of another capacity. Returns the number of summarized sales added.
+    """
+    os.makedirs(heavy_hitters_dir, exist_ok=True)
+    with open(os.path.join(heavy_hitters_dir, LOCK_NAME), 'w') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        manifest = read_manifest(heavy_hitters_dir)
+        if not export_is_current(conn, manifest) or manifest['capacity'] != capacity:
+            manifest = {'rows': 0, 'max_sale_id': 0, 'days': 0, 'capacity': capacity}
+        first_day, added, max_sale_id = conn.execute(
+            f"SELECT MIN(date_id), COUNT(*), MAX(sale_id) FROM {sales_source(conn)} WHERE sale_id > ?",
+            (manifest['max_sale_id'],)
+        ).fetchone()
+        if not added:
+            write_manifest(heavy_hitters_dir, dict(manifest, fingerprint=sales_fingerprint(conn, manifest['max_sale_id'])))
+            return 0
+        last_day, = conn.execute(f"SELECT MAX(date_id) FROM {sales_source(conn)}").fetchone()
+        days = manifest['days']
+        # Days already summarized that got new sales are re-ranked too, and so are the days after them
+        first_day = min(first_day, days)
+        for dimension, (column, _, _) in DIMENSIONS.items():
+            summaries = summarize_days(conn, column, first_day, last_day, capacity)
+            for path, rows in zip(summary_paths(heavy_hitters_dir, dimension), summaries):
+                write_rows(path, days, first_day, rows)
+        write_manifest(heavy_hitters_dir, dict(manifest, rows=manifest['rows'] + added, max_sale_id=max_sale_id,
+                                               days=max(days, last_day + 1),
+                                               fingerprint=sales_fingerprint(conn, max_sale_id)))
+    return added
+
+def open_heavy_hitters(heavy_hitters_dir=HEAVY_HITTERS_DIR):
+    """Map the summaries read-only, returns None if they were never built."""
+    manifest = read_manifest(heavy_hitters_dir)
+    if manifest is None:
+        return None
+    days, capacity = manifest['days'], manifest['capacity']
+    summaries = {}
+    for dimension in DIMENSIONS:
+        if days:
+            ids_path, sales_path, thresholds_path = summary_paths(heavy_hitters_dir, dimension)
+            summaries[dimension] = (
+                np.memmap(ids_path, dtype=np.int64, mode='r', shape=(days, capacity)),
+                np.memmap(sales_path, dtype=np.float64, mode='r', shape=(days, capacity)),
+                np.memmap(thresholds_path, dtype=np.float64, mode='r', shape=(days,)),
+            )
+        else:
+            summaries[dimension] = (np.empty((0, capacity), dtype=np.int64), np.empty((0, capacity)), np.empty(0))
+    return HeavyHitters(manifest, summaries)
+
+def load_heavy_hitters(db_path=None, capacity=DEFAULT_CAPACITY, heavy_hitters_dir=HEAVY_HITTERS_DIR):
+    """Refresh the summaries from the SQLite database and open them."""
+    conn = connect(db_path, read_only=True)
+    try:
+        refresh_heavy_hitters(conn, capacity, heavy_hitters_dir)
+    finally:
+        conn.close()
+    return open_heavy_hitters(heavy_hitters_dir)
+
+class HeavyHitters:
+    def __init__(self, manifest, summaries):
+        self.manifest = manifest
+        self.summaries = summaries
+        self.settings = (manifest['capacity'],)
+
+    def fast_path(self, function):
+        """The method answering function from the summaries, or function itself if it is not a top-k metric."""
+        return getattr(self, function.__name__) if function.__name__ in HEAVY_HITTER_METRICS else function
+
+    def clamp(self, date_ids):
+        """The (start, end) date_id range clamped to the summarized days."""
+        return max(date_ids[0], 0), min(date_ids[1], self.manifest['days'] - 1)
+
+    def top(self, conn, date_ids, dimension, limit):
+        """(ids, low, high) of the limit best selling ids of dimension over the date_id range, best first."""
+        start, end = self.clamp(date_ids)
+        if start > end:
+            return np.empty(0, dtype=np.int64), np.empty(0), np.empty(0)
+        ids, sales, thresholds = (np.asarray(summary[start:end + 1]) for summary in self.summaries[dimension])
+        present = ids >= 0
+        candidates, inverse = np.unique(ids[present], return_inverse=True)
+        low = np.bincount(inverse, sales[present], minlength=len(candidates))
+        # Every day a candidate is not in, it sold at most that day's threshold
+        covered = np.bincount(inverse, np.broadcast_to(thresholds[:, None], ids.shape)[present], minlength=len(candidates))
+        high = low + np.maximum(thresholds.sum() - covered, 0)
+        best = np.lexsort((candidates, -high, -low))[:limit]
+        return candidates[best], low[best], high[best]
+
+    def top_table(self, conn, date_ids, metric, limit):
+        dimension, label_column, value_column = HEAVY_HITTER_METRICS[metric]
+        ids, low, high = self.top(conn, date_ids, dimension, limit)
+        column, table, label = DIMENSIONS[dimension]
+        labels = dict(conn.execute(
+            f"SELECT {column}, {label} FROM {table} WHERE {column} IN ({', '.join('?' * len(ids))})", ids.tolist()
+        ).fetchall()) if len(ids) else {}
+        return pd.DataFrame({
+            label_column: [labels.get(id_) for id_ in ids.tolist()],
+            value_column: low,
+            f'{value_column}_low': low,
+            f'{value_column}_high': high,
+        })
+
+    # Basic analytics
+
+    def top_selling_products(self, conn, start_date=None, end_date=None, limit=3, date_ids=None):
+        return self.top_table(conn, date_ids, 'top_selling_products', limit)
+
+    def top_customers(self, conn, start_date=None, end_date=None, limit=3, date_ids=None):
+        return self.top_table(conn, date_ids, 'top_customers', limit)
+
+    def top_stores_by_sales(self, conn, start_date=None, end_date=None, limit=3, date_ids=None):
+        return self.top_table(conn, date_ids, 'top_stores_by_sales', limit)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Refresh the per-day top-k summaries of the sales.")
+    parser.add_argument('--capacity', type=int, default=DEFAULT_CAPACITY, help="Entries kept per day and dimension")
+    args = parser.parse_args()
+    conn = connect(read_only=True)
+    try:
+        added = refresh_heavy_hitters(conn, args.capacity)
+    finally:
+        conn.close()
+    manifest = read_manifest(HEAVY_HITTERS_DIR)
+    print(f"Summarized {added:,} new sales, {manifest['rows']:,} sales over {manifest['days']:,} days "
+          f"in {HEAVY_HITTERS_DIR}")
@@ -18,23 +18,47 @@ The key functionalities of this script include:
 5. Average Sales by Weekday: 
     Computes the average sales for each weekday, offering insights into day-wise sales performance.
 
-The script is structured to export each of these analytical results into separate CSV files within the '/app/data/analytics/intermediate/' directory for easy access and visualization. 
+6. Purchase Value Quantiles: 
+    Finds the 10th, 25th, 50th, 75th, 90th and 99th percentile of the purchase values, ranked in the database.
+
+The six metrics are independent queries, they run in parallel on a pool of threads with one read-only connection each
+(see metric_pool.py, --workers 1 runs them one after another), and the latency of every metric is reported.
+Outputs already computed for the same range and data are copied from the result cache (see result_cache.py, --no-cache skips it).
+
+With --prefix-index, every metric but avg_purchase_frequency is answered from the prefix sums of the daily aggregates
+(see prefix_index.py), which is refreshed incrementally first, instead of scanning Sales.
+With --approximate, avg_purchase_frequency, avg_purchase and purchase_value_quantiles are estimated from the per-day
+sketches of the sales (see sketches.py) with the given --error and --sample-rate, and carry their error bounds.
+
+The script is structured to export each of these analytical results into separate typed Feather files (see output_format.py) within the '/app/data/analytics/intermediate/' directory for easy access and visualization, 
+and into CSV files too with --csv. 
 It is designed to be run with start and end date parameters, allowing for flexible analysis over different time frames.
 
 Usage:
-    python intermediate_analytics.py <start_date> <end_date>
+    python intermediate_analytics.py <start_date> <end_date> [--engine sqlite|duckdb] [--workers N] [--no-cache] [--prefix-index]
+                                     [--approximate [--error E] [--sample-rate R]] [--csv]
 
 Where <start_date> and <end_date> are in YYYYMMDD format. 
 The script will reformat these dates for compatibility with SQLLite queries and execute the analyses for the specified period.
 """
 
-import sqlite3
+import argparse
+import numpy as np
 import pandas as pd
 import os
 import sys
 
+sys.path.append('/app')
+
+from analytics.date_filters import resolve_date_id_range, sales_date_filter
+from analytics.engines import analytics_connection, data_fingerprint, read_sql, DATABASE_ERRORS, DEFAULT_ENGINE, ENGINES
+from analytics.metric_pool import format_timings, range_metrics, run_metrics, DEFAULT_WORKERS
+from analytics.output_format import with_csv, DEFAULT_FORMATS
+from analytics.prefix_index import load_prefix_index
+from analytics.result_cache import ResultCache
+from analytics.sketches import load_sketches, SketchSettings, DEFAULT_ERROR, DEFAULT_SAMPLE_RATE, PURCHASE_QUANTILES
+
 DATA_DIR = '/app/data/analytics/intermediate/'
-DB_PATH = '/app/data/orestiscompanydb.sqlite'
 
 def reformat_date(date_str):
     """
@@ -44,69 +68,67 @@ def reformat_date(date_str):
     """
     return "{}-{}-{}".format(date_str[:4], date_str[4:6], date_str[6:])
 
-def avg_purchase_frequency(conn, start_date=None, end_date=None):
-    query = """
+def avg_purchase_frequency(conn, start_date=None, end_date=None, date_ids=None):
+    sales, join, where, params = sales_date_filter(conn, start_date, end_date, date_ids)
+    query = f"""
     SELECT Customers.customer_id, COUNT(Sales.sale_id) AS purchase_count
-    FROM Sales
+    FROM {sales}
     JOIN Customers ON Sales.customer_id = Customers.customer_id
-    JOIN DateInfo ON Sales.date_id = DateInfo.date_id
     """
-    if start_date and end_date:
-        query += f" WHERE DateInfo.date BETWEEN '{start_date}' AND '{end_date}'"
+    query += join + where
     query += """
     GROUP BY Customers.customer_id
     """
 
-    temp_df = pd.read_sql_query(query, conn)
+    temp_df = read_sql(conn, query, params)
 
     df = pd.DataFrame({
         'average_purchase_frequency': [temp_df['purchase_count'].mean()]
     })
     return df
 
-def avg_purchase(conn, start_date=None, end_date=None):
-    query = """
+def avg_purchase(conn, start_date=None, end_date=None, date_ids=None):
+    sales, join, where, params = sales_date_filter(conn, start_date, end_date, date_ids)
+    query = f"""
     SELECT AVG(Sales.quantity * Sales.unit_price) as avg_purchase_value
-    FROM Sales
-    JOIN DateInfo ON Sales.date_id = DateInfo.date_id
+    FROM {sales}
     """
-    if start_date and end_date:
-        query += f" WHERE DateInfo.date BETWEEN '{start_date}' AND '{end_date}'"
-    df = pd.read_sql_query(query, conn)
+    query += join + where
+    df = read_sql(conn, query, params)
     return df
 
-def sales_by_day_of_month(conn, start_date=None, end_date=None):
-    query = """
+def sales_by_day_of_month(conn, start_date=None, end_date=None, date_ids=None):
+    sales, join, where, params = sales_date_filter(conn, start_date, end_date, date_ids, date_info_joined=True)
+    query = f"""
     SELECT DateInfo.day, SUM(Sales.quantity * Sales.unit_price) as total_sales
-    FROM Sales
+    FROM {sales}
     JOIN DateInfo ON Sales.date_id = DateInfo.date_id
     """
-    if start_date and end_date:
-        query += f" WHERE DateInfo.date BETWEEN '{start_date}' AND '{end_date}'"
+    query += join + where
     query += " GROUP BY DateInfo.day ORDER BY DateInfo.day ASC"
-    df = pd.read_sql_query(query, conn)
+    df = read_sql(conn, query, params)
     return df
 
-def monthly_sales_trend(conn, start_date=None, end_date=None):
-    query = """
-    SELECT strftime('%Y-%m', DateInfo.date) as YearMonth, SUM(Sales.quantity * Sales.unit_price) as total_sales
-    FROM Sales
+def monthly_sales_trend(conn, start_date=None, end_date=None, date_ids=None):
+    sales, join, where, params = sales_date_filter(conn, start_date, end_date, date_ids, date_info_joined=True)
+    query = f"""
+    SELECT substr(DateInfo.date, 1, 7) as YearMonth, SUM(Sales.quantity * Sales.unit_price) as total_sales
+    FROM {sales}
     JOIN DateInfo ON Sales.date_id = DateInfo.date_id
     """
-    if start_date and end_date:
-        query += f" WHERE DateInfo.date BETWEEN '{start_date}' AND '{end_date}'"
+    query += join + where
     query += " GROUP BY YearMonth ORDER BY YearMonth ASC"
-    df = pd.read_sql_query(query, conn)
+    df = read_sql(conn, query, params)
     return df
 
-def avg_sales_by_weekday(conn, start_date=None, end_date=None):
-    query = """
+def avg_sales_by_weekday(conn, start_date=None, end_date=None, date_ids=None):
+    sales, join, where, params = sales_date_filter(conn, start_date, end_date, date_ids, date_info_joined=True)
+    query = f"""
     SELECT DateInfo.weekday, AVG(Sales.quantity * Sales.unit_price) AS avg_sales
-    FROM Sales
+    FROM {sales}
     JOIN DateInfo ON Sales.date_id = DateInfo.date_id
     """
-    if start_date and end_date:
-        query += f" WHERE DateInfo.date BETWEEN '{start_date}' AND '{end_date}'"
+    query += join + where
     query += """
     GROUP BY DateInfo.weekday
     ORDER BY
@@ -120,18 +142,65 @@ def avg_sales_by_weekday(conn, start_date=None, end_date=None):
             WHEN DateInfo.weekday = 'Sunday' THEN 7
         END
     """
-    df = pd.read_sql_query(query, conn)
+    df = read_sql(conn, query, params)
     return df
 
-def compute_intermediate_analytics(start_date=None, end_date=None):
+def purchase_value_quantiles(conn, start_date=None, end_date=None, date_ids=None):
+    sales, join, where, params = sales_date_filter(conn, start_date, end_date, date_ids)
+    n = conn.execute(f"SELECT COUNT(*) FROM {sales}" + join + where, list(params)).fetchone()[0]
+    if n == 0:
+        return pd.DataFrame(columns=['quantile', 'purchase_value'])
+
+    # Interpolated between the neighbouring ranks like np.quantile, only those ranks are read back
+    virtual = np.array(PURCHASE_QUANTILES) * (n - 1)
+    lower = np.floor(virtual).astype(np.int64)
+    upper = np.minimum(lower + 1, n - 1)
+    positions = sorted(set(lower.tolist() + upper.tolist()))
+    query = f"""
+    SELECT position, purchase_value FROM (
+        SELECT Sales.quantity * Sales.unit_price AS purchase_value,
+               ROW_NUMBER() OVER (ORDER BY Sales.quantity * Sales.unit_price) - 1 AS position
+        FROM {sales}
+    """
+    query += join + where
+    query += f"""
+    ) AS ranked WHERE position IN ({', '.join('?' * len(positions))})
+    """
+    values = dict(conn.execute(query, list(params) + positions).fetchall())
+    lower_values = np.array([values[p] for p in lower], dtype=np.float64)
+    upper_values = np.array([values[p] for p in upper], dtype=np.float64)
+    df = pd.DataFrame({
+        'quantile': PURCHASE_QUANTILES,
+        'purchase_value': lower_values + (upper_values - lower_values) * (virtual - lower),
+    })
+    return df
+
+# (output name, function, extra args) of every intermediate analytic
+OUTPUTS = tuple((function.__name__, function, ()) for function in (
+    avg_sales_by_weekday, sales_by_day_of_month, monthly_sales_trend, avg_purchase_frequency, avg_purchase,
+    purchase_value_quantiles
+))
+
+def compute_intermediate_analytics(start_date=None, end_date=None, engine=DEFAULT_ENGINE, workers=DEFAULT_WORKERS,
+                                   use_cache=True, prefix_index=False, approximate=None, formats=DEFAULT_FORMATS,
+                                   data_dir=DATA_DIR):
+    """
+    Pre-process the intermediate analytics to the output formats, running the metrics on `workers` threads and
+    serving unchanged outputs from the result cache if use_cache. With approximate (SketchSettings), the metrics
+    that can be are estimated from the sketches. Returns {metric: seconds}.
+    """
     try:
-        with sqlite3.connect(DB_PATH) as conn:
-            avg_sales_by_weekday(conn, start_date, end_date).to_csv(os.path.join(DATA_DIR, 'avg_sales_by_weekday.csv'), index=False)
-            sales_by_day_of_month(conn, start_date, end_date).to_csv(os.path.join(DATA_DIR, 'sales_by_day_of_month.csv'), index=False)
-            monthly_sales_trend(conn, start_date, end_date).to_csv(os.path.join(DATA_DIR, 'monthly_sales_trend.csv'), index=False)
-            avg_purchase_frequency(conn, start_date, end_date).to_csv(os.path.join(DATA_DIR, 'avg_purchase_frequency.csv'), index=False)
-            avg_purchase(conn, start_date, end_date).to_csv(os.path.join(DATA_DIR, 'avg_purchase.csv'), index=False)
-    except sqlite3.Error as e:
+        with analytics_connection(engine) as conn:
+            # Resolve the date range to its date_id range once for all queries
+            date_ids = resolve_date_id_range(conn, start_date, end_date)
+            cache = ResultCache() if use_cache else None
+            fingerprint = data_fingerprint(conn) if use_cache else None
+            index = load_prefix_index() if prefix_index and date_ids is not None else None
+            sketches = load_sketches(approximate) if approximate and date_ids is not None else None
+            metrics = range_metrics('intermediate', OUTPUTS, data_dir, start_date, end_date, date_ids, engine, cache,
+                                    fingerprint, index, sketches, formats)
+            return run_metrics(conn, metrics, engine, workers)
+    except DATABASE_ERRORS as e:
         print(f"Database error: {e}")
         sys.exit(1)  
 
@@ -140,11 +209,21 @@ if __name__ == "__main__":
     if not os.path.exists(DATA_DIR):
         os.makedirs(DATA_DIR)
 
-    # Check if the command-line args are provided
-    if len(sys.argv) >= 3:
-        start_date = reformat_date(sys.argv[1])
-        end_date = reformat_date(sys.argv[2])
-        compute_intermediate_analytics(start_date, end_date)
-    else:
-        print("Start date and end date arguments are required!")
-        sys.exit(1)
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Pre-process the intermediate analytics.")
+    parser.add_argument('start_date', help="Start date in YYYYMMDD format")
+    parser.add_argument('end_date', help="End date in YYYYMMDD format")
+    parser.add_argument('--engine', choices=ENGINES, default=DEFAULT_ENGINE, help="Query engine to run the analytics on")
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS, help="Run the metrics on this many threads")
+    parser.add_argument('--prefix-index', action='store_true', help="Answer the derivable metrics from the prefix sums")
+    parser.add_argument('--no-cache', action='store_true', help="Recompute every metric instead of using the result cache")
+    parser.add_argument('--approximate', action='store_true', help="Estimate the metrics that can be from the sketches of the sales")
+    parser.add_argument('--error', type=float, default=DEFAULT_ERROR, help="Relative error of the sketched distinct counts and quantiles")
+    parser.add_argument('--sample-rate', type=float, default=DEFAULT_SAMPLE_RATE, help="Fraction of the sales sampled for averages")
+    parser.add_argument('--csv', action='store_true', help="Export the outputs as CSV files too")
+    args = parser.parse_args()
+    approximate = SketchSettings(args.error, args.sample_rate) if args.approximate else None
+    timings = compute_intermediate_analytics(reformat_date(args.start_date), reformat_date(args.end_date), args.engine,
+                                             args.workers, not args.no_cache,
+                                             args.prefix_index, approximate,
+                                             with_csv(DEFAULT_FORMATS) if args.csv else DEFAULT_FORMATS)
+    print('\n'.join(format_timings(timings)))
\ No newline at end of file
@@ -0,0 +1,138 @@
+"""
+This module, metric_pool.py, runs the independent metrics of an analytics level in parallel within its process.
+The metrics of a level are separate queries (e.g. the five of the intermediate analytics), so instead of running
+them one after another on the level's connection:
+
+1. Thread Pool:
+    Every metric runs in a worker thread. SQLite and DuckDB release the GIL while they execute a query,
+    so the queries of a level run on several cores at once and the level takes about as long as its slowest metric.
+
+2. Per-Thread Read-Only Connections:
+    Every worker thread opens its own read-only connection (see engines.open_reader) on first use, since a
+    connection runs one statement at a time. The connections are closed when the level is done.
+
+3. Per-Metric Latency:
+    run_metrics returns the wall time of every metric, the compute_*_analytics functions return it to their caller.
+
+4. Result Cache:
+    with_cache wraps a metric with the result cache, so outputs computed before for the same date range,
+    parameters and data are copied into place instead of being queried again.
+
+With a single worker the metrics run one after another on the level's own connection, as before.
+
+Usage:
+    timings = run_metrics(conn, {'avg_purchase': output_metric(avg_purchase, [path], start_date, end_date)}, engine, workers=4)
+"""
+
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.append('/app')
+
+from analytics.engines import open_reader, DEFAULT_ENGINE
+from analytics.output_format import output_paths, write_file, DEFAULT_FORMATS
+
+DEFAULT_WORKERS = os.cpu_count() or 1
+
+def output_metric(function, paths, *args, **kwargs):
+    """
+    A metric that writes the DataFrame of function(conn, *args, **kwargs) to every path of paths (Feather or CSV, see
+    output_format.py), unless it is None.
+    """
+    def metric(conn):
+        result = function(conn, *args, **kwargs)
+        if result is not None:
+            for path in paths:
+                write_file(result, path)
+    return metric
+
+def cached_metric(metric, cache, outputs):
+    """
+    Wrap metric, which writes the {cache key: path} outputs, with the result cache (see result_cache.py):
+    if every output is cached it is copied into place, otherwise metric runs and its outputs are cached.
+    """
+    def run(conn):
+        if all(cache.materialize(key, path) for key, path in outputs.items()):
+            return
+        # A file left by an earlier run is not this range's result, e.g. when the metric has no output for it
+        for path in outputs.values():
+            if os.path.exists(path):
+                os.remove(path)
+        metric(conn)
+        for key, path in outputs.items():
+            cache.store(key, path)
+    return run
+
+def with_cache(metric, cache, level, paths, start_date, end_date, fingerprint, **params):
+    """Wrap metric, which writes the {output file name: path} files of level, with cache unless it is None."""
+    if cache is None:
+        return metric
+    return cached_metric(metric, cache, {
+        cache.key(level, name, start_date, end_date, fingerprint, **params): path for name, path in paths.items()
+    })
+
+def range_metrics(level, outputs, data_dir, start_date, end_date, date_ids, engine=DEFAULT_ENGINE, cache=None,
+                  fingerprint=None, index=None, sketches=None, formats=DEFAULT_FORMATS):
+    """
+    The {name: metric} writing every (name, function, args) of outputs for the date range to data_dir/name.<format>,
+    each approximated from the sketches where possible (see sketches.py and heavy_hitters.py), otherwise answered
+    from the prefix index where derivable (see prefix_index.py), and wrapped with cache.
+    """
+    if date_ids is None:
+        # The prefix sums and sketches can only answer contiguous date_id ranges
+        index = sketches = None
+    metrics = {}
+    for name, function, args in outputs:
+        paths = output_paths(data_dir, name, formats)
+        fast = sketches.fast_path(function) if sketches is not None else function
+        if fast is not function:
+            mode = {'mode': 'approximate', 'settings': tuple(sketches.settings)}
+        else:
+            fast = index.fast_path(function) if index is not None else function
+            mode = {'mode': 'prefix_index'} if fast is not function else {}
+        # Extra args (e.g. the k of a top-k metric) change the output, so they are part of its cache key
+        metrics[name] = with_cache(output_metric(fast, list(paths.values()), start_date, end_date, *args, date_ids=date_ids),
+                                   cache, level, paths, start_date, end_date, fingerprint, engine=engine,
+                                   **mode, **({'args': args} if args else {}))
+    return metrics
+
+def timed(metric, conn):
+    start_time = time.perf_counter()
+    metric(conn)
+    return time.perf_counter() - start_time
+
+def run_metrics(conn, metrics, engine=DEFAULT_ENGINE, workers=DEFAULT_WORKERS, db_path=None):
+    """
+    Run every metric(conn) of the {name: metric} dict and return {name: seconds} in the order of metrics.
+    With more than one worker the metrics run in a thread pool, every thread on its own read-only connection
+    of the engine, otherwise they run one after another on conn. The first error of a metric is raised.
+    """
+    workers = min(workers, len(metrics))
+    if workers <= 1:
+        return {name: timed(metric, conn) for name, metric in metrics.items()}
+
+    local = threading.local()
+    opened = []
+    lock = threading.Lock()
+
+    def run(metric):
+        if not hasattr(local, 'conn'):
+            local.conn = open_reader(engine, db_path)
+            with lock:
+                opened.append(local.conn)
+        return timed(metric, local.conn)
+
+    try:
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='metric') as pool:
+            futures = {name: pool.submit(run, metric) for name, metric in metrics.items()}
+            return {name: future.result() for name, future in futures.items()}
+    finally:
+        for worker_conn in opened:
+            worker_conn.close()
+
+def format_timings(timings):
+    """One line per metric with its latency, slowest first."""
+    return [f"{name:<35} {seconds * 1000:>10.1f} ms" for name, seconds in sorted(timings.items(), key=lambda t: -t[1])]
@@ -0,0 +1,241 @@
+"""
+This module, order_selection.py, selects the (p, d, q) order of the ARIMA profit forecast instead of hardcoding (1, 1, 1).
+It provides the following:
+
+1. Bounded Grid Search:
+    Candidate orders up to (MAX_P, MAX_D, MAX_Q) are fitted and ranked by their AIC (or BIC).
+
+2. Early Pruning:
+    The differencing d is the smallest one for which the augmented Dickey-Fuller test finds the differenced series
+    stationary, so only the (p, q) grid of that d is searched. The (p, q) orders are searched by increasing p + q,
+    and the search stops at the first p + q whose best model doesn't improve on the simpler ones.
+
+3. Parallel Fits Under a Budget:
+    The candidates of every p + q are fitted in parallel on a process pool (from the runner's forkserver, see
+    runner.py). The search stops at its wall-clock budget, cancelling the pending fits (fits already running are
+    finished), and keeps the best order found so far (DEFAULT_ORDER if none was fitted in time).
+
+4. Cached Orders:
+    The selected order is stored per series fingerprint (see model_cache.py) and search settings in
+    /app/data/cache/arima/orders/, so later runs on the same series skip the search. Like the fitted models, a series
+    that only gained new days since a stored order (same start, the old days unchanged) keeps that order until the
+    appended days exceed REFIT_FRACTION of the days it was searched on, so appending a day doesn't search again.
+
+Usage:
+    order = select_order(series)
+    forecast = forecast_with_arima(series, order)
+"""
+
+import hashlib
+import json
+import os
+import sys
+import threading
+import time
+import warnings
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+import numpy as np
+from statsmodels.tsa.arima.model import ARIMA
+from statsmodels.tsa.stattools import adfuller
+
+sys.path.append('/app')
+
+from analytics.model_cache import series_fingerprint, REFIT_FRACTION
+from analytics.runner import pool_context
+
+ORDER_DIR = '/app/data/cache/arima/orders/'
+MAX_ORDERS = 256
+MAX_P, MAX_D, MAX_Q = 3, 2, 3
+CRITERIA = ('aic', 'bic')
+# Wall-clock seconds a search may take
+DEFAULT_BUDGET = 30
+DEFAULT_WORKERS = os.cpu_count() or 1
+# Used when no candidate could be fitted within the budget
+DEFAULT_ORDER = (1, 1, 1)
+# p-value below which the augmented Dickey-Fuller test rejects a unit root
+STATIONARITY_P_VALUE = 0.05
+
+def select_differencing(series, max_d=MAX_D):
+    """The smallest d <= max_d for which the d times differenced series is stationary."""
+    values = series.dropna().to_numpy()
+    for d in range(max_d + 1):
+        differenced = np.diff(values, n=d)
+        # A constant series is stationary, but breaks the test's regression
+        if np.ptp(differenced) == 0:
+            return d
+        with warnings.catch_warnings():
+            # Newer statsmodels warn about the tuple result
+            warnings.simplefilter('ignore', FutureWarning)
+            p_value = adfuller(differenced, autolag='AIC')[1]
+        if p_value < STATIONARITY_P_VALUE:
+            return d
+    return max_d
+
+def fit_candidate(series, order):
+    """(order, aic, bic) of the ARIMA model of the order fitted on series."""
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        model_fit = ARIMA(series, order=order).fit()
+    return order, model_fit.aic, model_fit.bic
+
+def order_key(series, criterion, max_p, max_d, max_q):
+    identity = [series_fingerprint(series), criterion, max_p, max_d, max_q]
+    return hashlib.sha256(json.dumps(identity).encode()).hexdigest()
+
+def order_entries(order_dir=ORDER_DIR):
+    """(path, entry) of every stored order."""
+    entries = []
+    if not os.path.isdir(order_dir):
+        return entries
+    with os.scandir(order_dir) as it:
+        for entry in it:
+            if not entry.name.endswith('.json'):
+                continue
+            try:
+                with open(entry.path) as f:
+                    entries.append((entry.path, json.load(f)))
+            except (OSError, ValueError):
+                continue
+    return entries
+
+def load_order(key, series, settings, order_dir=ORDER_DIR):
+    """
+    The stored order of the series and search settings, or of the longest stored series it extends (same start,
+    the old days unchanged) while the appended days are within REFIT_FRACTION of the days the order was searched on.
+    Returns (order, stored entry) or (None, None).
+    """
+    path = os.path.join(order_dir, f"{key}.json")
+    candidates = []
+    try:
+        with open(path) as f:
+            candidates.append((path, json.load(f)))
+    except (OSError, ValueError):
+        start = series.index[0].isoformat()
+        candidates = sorted((
+            (path, entry) for path, entry in order_entries(order_dir)
+            if entry.get('settings') == settings and entry.get('start') == start and entry['nobs'] < len(series)
+            and len(series) - entry['searched_nobs'] <= REFIT_FRACTION * entry['searched_nobs']
+            and series_fingerprint(series.iloc[:entry['nobs']]) == entry['fingerprint']
+        ), key=lambda candidate: candidate[1]['nobs'], reverse=True)
+    for path, entry in candidates:
+        try:
+            order = tuple(entry['order'])
+            # Refresh the entry for the eviction order
+            os.utime(path)
+            return order, entry
+        except (OSError, KeyError, TypeError):
+            continue
+    return None, None
+
+def store_order(key, order, score, series, settings, searched_nobs, order_dir=ORDER_DIR, max_orders=MAX_ORDERS):
+    try:
+        os.makedirs(order_dir, exist_ok=True)
+        path = os.path.join(order_dir, f"{key}.json")
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        entry = {
+            'order': list(order),
+            'score': score,
+            'settings': settings,
+            'start': series.index[0].isoformat(),
+            'nobs': len(series),
+            'searched_nobs': searched_nobs,
+            'fingerprint': series_fingerprint(series),
+        }
+        with open(tmp_path, 'w') as f:
+            json.dump(entry, f)
+        os.replace(tmp_path, path)
+        with os.scandir(order_dir) as it:
+            entries = sorted((entry.stat().st_mtime, entry.path) for entry in it if entry.name.endswith('.json'))
+        for _, stale_path in entries[:-max_orders]:
+            os.remove(stale_path)
+    except OSError:
+        pass
+
+def search_orders(series, d, criterion, max_p, max_q, budget, pool):
+    """(best order, its score, number of fits) of the (p, d, q) grid, searched by increasing p + q within budget."""
+    deadline = time.perf_counter() + budget
+    best_order, best_score, fits = None, np.inf, 0
+    for complexity in range(max_p + max_q + 1):
+        candidates = [(p, d, complexity - p) for p in range(max_p + 1) if 0 <= complexity - p <= max_q]
+        if pool is None:
+            results = []
+            for order in candidates:
+                if time.perf_counter() >= deadline:
+                    break
+                try:
+                    results.append(fit_candidate(series, order))
+                except Exception:
+                    continue
+        else:
+            futures = [pool.submit(fit_candidate, series, order) for order in candidates]
+            results, pending = [], set(futures)
+            while pending and time.perf_counter() < deadline:
+                done, pending = wait(pending, timeout=deadline - time.perf_counter(), return_when=FIRST_COMPLETED)
+                for future in done:
+                    try:
+                        results.append(future.result())
+                    except Exception:
+                        # A candidate that can't be estimated is just not selected
+                        continue
+            for future in pending:
+                future.cancel()
+        fits += len(results)
+        scores = {order: (aic if criterion == 'aic' else bic) for order, aic, bic in results}
+        scores = {order: score for order, score in scores.items() if np.isfinite(score)}
+        level_best = min(scores, key=scores.get, default=None)
+        if level_best is None or scores[level_best] >= best_score:
+            # Higher orders are pruned once adding a parameter stops paying off (or the budget is spent)
+            if best_order is not None or time.perf_counter() >= deadline:
+                break
+            continue
+        best_order, best_score = level_best, scores[level_best]
+        if time.perf_counter() >= deadline:
+            break
+    return best_order, best_score, fits
+
+def select_order(series, criterion='aic', max_p=MAX_P, max_d=MAX_D, max_q=MAX_Q, budget=DEFAULT_BUDGET,
+                 workers=DEFAULT_WORKERS, use_cache=True):
+    """
+    The (p, d, q) order minimizing the criterion ('aic' or 'bic') of an ARIMA model of series, searched
+    in parallel on `workers` processes for at most `budget` seconds, or served from the order cache.
+    """
+    if criterion not in CRITERIA:
+        raise ValueError(f"Unknown criterion {criterion!r}, expected one of {', '.join(CRITERIA)}")
+    start_time = time.perf_counter()
+    if series.index.freq is None:
+        # Assuming the series should have a daily frequency, like forecast_with_arima
+        series = series.asfreq('D')
+    key = order_key(series, criterion, max_p, max_d, max_q)
+    settings = [criterion, max_p, max_d, max_q]
+    if use_cache:
+        order, entry = load_order(key, series, settings)
+        if order is not None:
+            if entry.get('nobs', len(series)) < len(series):
+                # Serve the extended series directly next time, still counting the days from the searched ones
+                store_order(key, order, entry['score'], series, settings, entry['searched_nobs'])
+                source = f"the order cache ({len(series) - entry['nobs']} days appended)"
+            else:
+                source = "the order cache"
+            print(f"ARIMA order {order} from {source} in {(time.perf_counter() - start_time) * 1000:.0f} ms")
+            return order
+
+    d = select_differencing(series, max_d)
+    remaining = budget - (time.perf_counter() - start_time)
+    if workers <= 1:
+        order, score, fits = search_orders(series, d, criterion, max_p, max_q, remaining, None)
+    else:
+        pool = ProcessPoolExecutor(max_workers=min(workers, max_p + 1), mp_context=pool_context())
+        try:
+            order, score, fits = search_orders(series, d, criterion, max_p, max_q, remaining, pool)
+        finally:
+            # Only the fits already running when the budget ran out are waited for
+            pool.shutdown(cancel_futures=True)
+    seconds = time.perf_counter() - start_time
+    if order is None:
+        print(f"No ARIMA order could be fitted in {seconds:.2f}s, using {DEFAULT_ORDER}")
+        return DEFAULT_ORDER
+    print(f"ARIMA order {order} selected by {criterion.upper()} ({score:.1f}) from {fits} fits in {seconds:.2f}s")
+    if use_cache:
+        store_order(key, order, score, series, settings, len(series))
+    return order
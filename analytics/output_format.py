@@ -0,0 +1,90 @@
+"""
+This module, output_format.py, writes and reads the pre-processed analytics outputs in a typed columnar format,
+so the dashboard doesn't parse CSV text and infer its dtypes again on every refresh. It provides the following:
+
+1. Feather Outputs:
+    Every output is written as an uncompressed Arrow IPC (Feather v2) file, <name>.feather, with an explicit schema:
+    the integer, float and string columns keep their pandas types (e.g. the int8 RFM scores), and the DATE_COLUMNS
+    are stored as dates, whether the query returned them as ISO strings or date objects. Files are written to a
+    temporary file and renamed into place, so the dashboard never reads a partial output.
+
+2. Memory-Mapped Reads:
+    read_output maps the Feather file and converts its Arrow columns to a DataFrame, without parsing or type
+    inference. The date columns are read as datetime64.
+
+3. CSV Export:
+    With 'csv' among the formats, <name>.csv is written too, as before. read_output falls back to it when there is
+    no Feather file. pyarrow is optional: without it the outputs are written and read as CSV only.
+
+Usage:
+    write_output(df, data_dir, 'total_sales', formats=('feather', 'csv'))
+    df = read_output(data_dir, 'total_sales')
+"""
+
+import os
+import threading
+
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    from pyarrow import feather
+except ImportError:
+    pa = feather = None
+
+FORMATS = ('feather', 'csv')
+EXTENSIONS = {'feather': '.feather', 'csv': '.csv'}
+DEFAULT_FORMATS = ('feather',) if feather is not None else ('csv',)
+
+# Columns stored as Arrow dates, the daily profits and forecasts have them as ISO strings or date objects
+DATE_COLUMNS = ('date',)
+
+def output_paths(data_dir, name, formats=DEFAULT_FORMATS):
+    """{file name: path} of the output name in every format of formats."""
+    return {name + EXTENSIONS[fmt]: os.path.join(data_dir, name + EXTENSIONS[fmt]) for fmt in formats}
+
+def with_csv(formats):
+    """formats with the CSV export added."""
+    return tuple(formats) + (('csv',) if 'csv' not in formats else ())
+
+def arrow_table(df):
+    """The Arrow table of df, with the DATE_COLUMNS as dates and every other column as pandas types it."""
+    if isinstance(df, pd.Series):
+        # Single values (e.g. total_sales) are Series, written as one column like their CSV
+        df = df.to_frame()
+    dates = [column for column in DATE_COLUMNS if column in df.columns]
+    if dates:
+        df = df.assign(**{column: pd.to_datetime(df[column]).dt.date for column in dates})
+    schema = pa.Schema.from_pandas(df, preserve_index=False)
+    for column in dates:
+        schema = schema.set(schema.get_field_index(column), pa.field(column, pa.date32()))
+    return pa.Table.from_pandas(df, schema=schema, preserve_index=False)
+
+def write_file(df, path):
+    """Write df to path, as Feather or CSV by its extension."""
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    if path.endswith(EXTENSIONS['feather']):
+        # Uncompressed, so reads map the columns instead of decompressing them
+        feather.write_feather(arrow_table(df), tmp_path, compression='uncompressed')
+    else:
+        df.to_csv(tmp_path, index=False)
+    os.replace(tmp_path, path)
+
+def write_output(df, data_dir, name, formats=DEFAULT_FORMATS):
+    """Write df as the output name in data_dir, in every format of formats."""
+    for path in output_paths(data_dir, name, formats).values():
+        write_file(df, path)
+
+def read_output(data_dir, name):
+    """
+    The DataFrame of the output name in data_dir, memory-mapped from its Feather file if there is one, otherwise
+    parsed from its CSV. Raises FileNotFoundError if it has neither.
+    """
+    path = os.path.join(data_dir, name + EXTENSIONS['feather'])
+    if feather is not None and os.path.exists(path):
+        return feather.read_table(path, memory_map=True).to_pandas(date_as_object=False)
+    return pd.read_csv(os.path.join(data_dir, name + EXTENSIONS['csv']))
+
+def has_outputs(directory):
+    """Whether directory holds any output file."""
+    return any(fname.endswith(tuple(EXTENSIONS.values())) for fname in os.listdir(directory))
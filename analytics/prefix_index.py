@@ -0,0 +1,335 @@
+"""
+This module, prefix_index.py, keeps a prefix-sum index of the daily sales aggregates, so the sums the basic and
+intermediate analytics break down by product, store, region or date attribute are answered for any date range
+without scanning Sales. It provides the following:
+
+1. Daily Aggregate Tensor:
+    Revenue, profit, quantity and number of transactions per (date_id, store_id, product_id), stored as cumulative
+    sums along the date_id axis in /app/data/prefix_index/. Any [start, end] date_id range is then the difference of
+    two prefix slices, prefix[end + 1] - prefix[start], whatever the length of the range. The per-day totals are kept
+    next to it for the breakdowns by day of month, month and weekday. The tensor is dense, its size is
+    days x stores x products x 4 doubles (about 1.2MB for two years of 5 stores and 10 products).
+
+2. Incremental Maintenance:
+    Sales are appended with increasing sale_ids, and append_sales adds new days after the last one. A refresh only
+    aggregates the sales after the manifest's last sale_id and appends their days to the prefix sums. Sales landing
+    on an already indexed day, a new store or product beyond the tensor, or indexed sales whose fingerprint no longer
+    matches the database (see columnar.export_is_current, e.g. after reset_db or an in-place edit of the sales or a
+    purchase price) rebuild the index instead, into temporary files renamed over the mapped ones.
+    The manifest is replaced last, under a file lock.
+
+3. Fast Path:
+    PrefixIndex has a method for every analytics function it can derive, with the same name, arguments and result.
+    fast_path(function) returns that method, or the function itself if the metric is not derivable (e.g. anything
+    per customer). The results equal the SQL queries up to floating point rounding, since the sums are taken
+    in another order.
+
+Usage:
+    python prefix_index.py
+    index = load_prefix_index()
+    df = index.fast_path(sales_by_product)(conn, start_date, end_date, date_ids=date_ids)
+"""
+
+import fcntl
+import os
+import sys
+import threading
+
+import numpy as np
+import pandas as pd
+
+sys.path.append('/app')
+
+from analytics.bollinger import grouping_bands, series_band_table, DEFAULT_GROUPINGS, DEFAULT_STD_DEVS, DEFAULT_WINDOWS, GROUPINGS
+from analytics.columnar import export_is_current, group_codes, grouped_sums, read_manifest, top_k, write_manifest, LOCK_NAME
+from analytics.engines import sales_fingerprint
+from database.connection import connect
+from database.partitions import sales_source
+
+PREFIX_DIR = '/app/data/prefix_index/'
+PREFIX_FILE = 'prefix.float64'
+DAILY_FILE = 'daily.float64'
+
+MEASURES = ('revenue', 'profit', 'quantity', 'transactions')
+REVENUE, PROFIT, QUANTITY, TRANSACTIONS = range(len(MEASURES))
+
+# Analytics functions PrefixIndex has a method of the same name for
+DERIVED_METRICS = frozenset([
+    'total_sales', 'profit_total', 'sales_by_product', 'profit_by_product', 'sales_by_region', 'profit_by_region',
+    'top_selling_products', 'top_stores_by_sales', 'avg_purchase', 'sales_by_day_of_month', 'monthly_sales_trend',
+    'avg_sales_by_weekday', 'calculate_store_profit_margin', 'calculate_series_bollinger_bands',
+])
+
+WEEKDAYS = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+
+def aggregate_sales(conn, after_sale_id=0):
+    """
+    Sum the measures of the sales after after_sale_id per (date_id, store_id, product_id).
+    Returns the (n, 3) ids, the (n, 4) measures and the last aggregated sale_id.
+    """
+    query = f"""
+    SELECT Sales.date_id, Sales.store_id, Sales.product_id,
+           SUM(Sales.quantity * Sales.unit_price),
+           SUM((Sales.unit_price - Products.purchase_price) * Sales.quantity),
+           SUM(Sales.quantity),
+           COUNT(*),
+           MAX(Sales.sale_id)
+    FROM {sales_source(conn)}
+    JOIN Products ON Sales.product_id = Products.product_id
+    WHERE Sales.sale_id > ?
+    GROUP BY Sales.date_id, Sales.store_id, Sales.product_id
+    """
+    rows = conn.execute(query, (after_sale_id,)).fetchall()
+    if not rows:
+        return np.empty((0, 3), dtype=np.int64), np.empty((0, len(MEASURES))), after_sale_id
+    ids = np.array([row[:3] for row in rows], dtype=np.int64)
+    measures = np.array([row[3:7] for row in rows], dtype=np.float64)
+    return ids, measures, max(row[7] for row in rows)
+
+def refresh_index(conn, index_dir=PREFIX_DIR):
+    """
+    Append the days of the sales after the last indexed sale_id to the prefix sums, or rebuild the index
+    if those sales can't just be appended. Returns the number of indexed sales added.
+    """
+    os.makedirs(index_dir, exist_ok=True)
+    with open(os.path.join(index_dir, LOCK_NAME), 'w') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        manifest = read_manifest(index_dir)
+        if not export_is_current(conn, manifest):
+            manifest = None
+        ids, measures, max_sale_id = aggregate_sales(conn, manifest['max_sale_id'] if manifest else 0)
+        if manifest is not None:
+            if len(ids) == 0:
+                return 0
+            # Only whole new days can be appended to the prefix sums
+            if (ids[:, 0].min() < manifest['days'] or ids[:, 1].max() >= manifest['stores']
+                    or ids[:, 2].max() >= manifest['products']):
+                manifest = None
+                ids, measures, max_sale_id = aggregate_sales(conn)
+        if manifest is None:
+            max_store_id, = conn.execute("SELECT COALESCE(MAX(store_id), 0) FROM Stores").fetchone()
+            max_product_id, = conn.execute("SELECT COALESCE(MAX(product_id), 0) FROM Products").fetchone()
+            manifest = {
+                'rows': 0,
+                'max_sale_id': 0,
+                'days': 0,
+                'stores': int(max(max_store_id, ids[:, 1].max(initial=0))) + 1,
+                'products': int(max(max_product_id, ids[:, 2].max(initial=0))) + 1,
+            }
+        shape = (manifest['stores'], manifest['products'], len(MEASURES))
+        row_bytes = int(np.prod(shape)) * 8
+
+        days = manifest['days']
+        new_days = int(ids[:, 0].max(initial=days - 1)) + 1 - days
+        daily = np.zeros((new_days,) + shape)
+        np.add.at(daily, (ids[:, 0] - days, ids[:, 1], ids[:, 2]), measures)
+
+        prefix_path = os.path.join(index_dir, PREFIX_FILE)
+        daily_path = os.path.join(index_dir, DAILY_FILE)
+        if days:
+            # Readers only map the committed rows, so the new days are appended in place after them
+            with open(prefix_path, 'r+b') as f:
+                # Drop rows of an interrupted refresh that were never committed to the manifest
+                f.truncate((days + 1) * row_bytes)
+                f.seek(days * row_bytes)
+                last = np.frombuffer(f.read(row_bytes), dtype=np.float64).reshape(shape)
+                (last + np.cumsum(daily, axis=0)).tofile(f)
+            with open(daily_path, 'r+b') as f:
+                f.truncate(days * len(MEASURES) * 8)
+                f.seek(0, os.SEEK_END)
+                daily.sum(axis=(1, 2)).tofile(f)
+        else:
+            # A rebuild is written to temporary files and renamed into place, readers keep mapping the old index
+            tmp_suffix = f".{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(prefix_path + tmp_suffix, 'wb') as f:
+                np.zeros(shape).tofile(f)
+                np.cumsum(daily, axis=0).tofile(f)
+            with open(daily_path + tmp_suffix, 'wb') as f:
+                daily.sum(axis=(1, 2)).tofile(f)
+            os.replace(prefix_path + tmp_suffix, prefix_path)
+            os.replace(daily_path + tmp_suffix, daily_path)
+
+        added = int(measures[:, TRANSACTIONS].sum())
+        write_manifest(index_dir, dict(manifest, rows=manifest['rows'] + added, max_sale_id=max_sale_id,
+                                       days=days + new_days, fingerprint=sales_fingerprint(conn, max_sale_id)))
+    return added
+
+def open_index(index_dir=PREFIX_DIR):
+    """Map the prefix sums and daily totals read-only, returns None if the index was never built."""
+    manifest = read_manifest(index_dir)
+    if manifest is None:
+        return None
+    shape = (manifest['stores'], manifest['products'], len(MEASURES))
+    prefix = np.memmap(os.path.join(index_dir, PREFIX_FILE), dtype=np.float64, mode='r',
+                       shape=(manifest['days'] + 1,) + shape)
+    if manifest['days']:
+        daily = np.memmap(os.path.join(index_dir, DAILY_FILE), dtype=np.float64, mode='r',
+                          shape=(manifest['days'], len(MEASURES)))
+    else:
+        daily = np.empty((0, len(MEASURES)))
+    return PrefixIndex(prefix, daily)
+
+def load_prefix_index(db_path=None, index_dir=PREFIX_DIR):
+    """Refresh the index from the SQLite database and open it."""
+    conn = connect(db_path, read_only=True)
+    try:
+        refresh_index(conn, index_dir)
+    finally:
+        conn.close()
+    return open_index(index_dir)
+
+class PrefixIndex:
+    def __init__(self, prefix, daily):
+        self.prefix = prefix
+        self.daily = daily
+        num_stores, num_products = prefix.shape[1:3]
+        # Store and product id of every (store, product) cell of a flattened slice
+        self.cell_stores = np.repeat(np.arange(num_stores), num_products)
+        self.cell_products = np.tile(np.arange(num_products), num_stores)
+
+    def fast_path(self, function):
+        """The method answering function from the index, or function itself if it is not derivable."""
+        return getattr(self, function.__name__) if function.__name__ in DERIVED_METRICS else function
+
+    def clamp(self, date_ids):
+        """The (start, end) date_id range clamped to the indexed days."""
+        return max(date_ids[0], 0), min(date_ids[1], len(self.daily) - 1)
+
+    def range_cells(self, date_ids):
+        """
+        Measures summed over the date_id range per (store, product) cell, flattened to (cells, measures),
+        with only the cells that have sales in the range.
+        """
+        start, end = self.clamp(date_ids)
+        if start > end:
+            cells = np.zeros((len(self.cell_stores), len(MEASURES)))
+        else:
+            cells = (self.prefix[end + 1] - self.prefix[start]).reshape(-1, len(MEASURES))
+        present = cells[:, TRANSACTIONS] > 0
+        return cells[present], self.cell_stores[present], self.cell_products[present]
+
+    def range_days(self, date_ids):
+        """date_ids and measures of the days of the range that have sales."""
+        start, end = self.clamp(date_ids)
+        days = np.asarray(self.daily[start:end + 1]) if start <= end else np.empty((0, len(MEASURES)))
+        present = days[:, TRANSACTIONS] > 0
+        return np.arange(start, start + len(days))[present], days[present]
+
+    def grouped(self, conn, date_ids, label_query, measure, by='product'):
+        """Sum measure per label of the (id, label) rows of label_query, ids being product or store ids."""
+        cells, stores, products = self.range_cells(date_ids)
+        codes, labels = group_codes(conn, label_query)
+        return grouped_sums(codes[products if by == 'product' else stores], cells[:, measure], labels)
+
+    def total(self, date_ids, measure, name):
+        cells, _, _ = self.range_cells(date_ids)
+        # SUM over no rows is NULL in SQL
+        return pd.Series([cells[:, measure].sum() if len(cells) else None], name=name)
+
+    def grouped_daily_profits(self, conn, date_ids, grouping):
+        """The (group columns, date, daily_profit) rows of the days each group of the grouping has sales in the range."""
+        group_by = GROUPINGS[grouping]
+        columns = [*group_by, 'date', 'daily_profit']
+        start, end = self.clamp(date_ids)
+        if start > end:
+            return pd.DataFrame(columns=columns)
+        # Daily cells are the differences of consecutive prefix slices, summed over the axes not grouped by
+        daily = np.diff(self.prefix[start:end + 2][..., [PROFIT, TRANSACTIONS]], axis=0)
+        summed_axes = tuple(axis for axis, column in ((1, 'store_id'), (2, 'product_id')) if column not in group_by)
+        daily = daily.sum(axis=summed_axes)
+        present = np.nonzero(daily[..., 1] > 0)
+        dates = dict(conn.execute("SELECT date_id, date FROM DateInfo WHERE date_id BETWEEN ? AND ?", (start, end)).fetchall())
+        df = pd.DataFrame(dict(zip(group_by, present[1:])))
+        df['date'] = [dates[date_id] for date_id in present[0] + start]
+        df['daily_profit'] = daily[..., 0][present]
+        return df[columns]
+
+    def by_date_attribute(self, conn, date_ids, attribute):
+        """Revenue and transactions of the range per value of the DateInfo attribute (SQL expression)."""
+        day_ids, days = self.range_days(date_ids)
+        codes, labels = group_codes(conn, f"SELECT date_id, {attribute} FROM DateInfo")
+        labels_present, revenue = grouped_sums(codes[day_ids], days[:, REVENUE], labels)
+        _, transactions = grouped_sums(codes[day_ids], days[:, TRANSACTIONS], labels)
+        return labels_present, revenue, transactions
+
+    # Basic analytics
+
+    def total_sales(self, conn, start_date=None, end_date=None, date_ids=None):
+        return self.total(date_ids, REVENUE, 'total_sales')
+
+    def profit_total(self, conn, start_date=None, end_date=None, date_ids=None):
+        return self.total(date_ids, PROFIT, 'total_profit')
+
+    def sales_by_product(self, conn, start_date=None, end_date=None, date_ids=None):
+        names, sales = self.grouped(conn, date_ids, "SELECT product_id, name FROM Products", REVENUE)
+        return pd.DataFrame({'name': names, 'sales_by_product': sales})
+
+    def profit_by_product(self, conn, start_date=None, end_date=None, date_ids=None):
+        names, profit = self.grouped(conn, date_ids, "SELECT product_id, name FROM Products", PROFIT)
+        return pd.DataFrame({'name': names, 'profit_by_product': profit})
+
+    def sales_by_region(self, conn, start_date=None, end_date=None, date_ids=None):
+        cities, sales = self.grouped(conn, date_ids, "SELECT store_id, city FROM Stores", REVENUE, by='store')
+        return pd.DataFrame({'city': cities, 'sales_by_region': sales})
+
+    def profit_by_region(self, conn, start_date=None, end_date=None, date_ids=None):
+        cities, profit = self.grouped(conn, date_ids, "SELECT store_id, city FROM Stores", PROFIT, by='store')
+        return pd.DataFrame({'city': cities, 'profit_by_region': profit})
+
+    def top_selling_products(self, conn, start_date=None, end_date=None, limit=3, date_ids=None):
+        names, sales = self.grouped(conn, date_ids, "SELECT product_id, name FROM Products", REVENUE)
+        return top_k(names, sales, 'name', 'total_sales', limit)
+
+    def top_stores_by_sales(self, conn, start_date=None, end_date=None, limit=3, date_ids=None):
+        locations, sales = self.grouped(conn, date_ids, "SELECT store_id, address || ', ' || city FROM Stores",
+                                        REVENUE, by='store')
+        return top_k(locations, sales, 'store_location', 'total_sales', limit)
+
+    # Intermediate analytics
+
+    def avg_purchase(self, conn, start_date=None, end_date=None, date_ids=None):
+        cells, _, _ = self.range_cells(date_ids)
+        transactions = cells[:, TRANSACTIONS].sum()
+        return pd.DataFrame({'avg_purchase_value': [cells[:, REVENUE].sum() / transactions if transactions else None]})
+
+    def sales_by_day_of_month(self, conn, start_date=None, end_date=None, date_ids=None):
+        days, revenue, _ = self.by_date_attribute(conn, date_ids, 'day')
+        return pd.DataFrame({'day': days.astype(np.int64), 'total_sales': revenue})
+
+    def monthly_sales_trend(self, conn, start_date=None, end_date=None, date_ids=None):
+        months, revenue, _ = self.by_date_attribute(conn, date_ids, 'substr(date, 1, 7)')
+        return pd.DataFrame({'YearMonth': months, 'total_sales': revenue})
+
+    def avg_sales_by_weekday(self, conn, start_date=None, end_date=None, date_ids=None):
+        weekdays, revenue, transactions = self.by_date_attribute(conn, date_ids, 'weekday')
+        df = pd.DataFrame({'weekday': weekdays, 'avg_sales': revenue / transactions})
+        df['order'] = df['weekday'].map(WEEKDAYS.index)
+        return df.sort_values('order').drop(columns='order').reset_index(drop=True)
+
+    # Advanced analytics
+
+    def calculate_store_profit_margin(self, conn, start_date=None, end_date=None, date_ids=None):
+        cells, stores, _ = self.range_cells(date_ids)
+        store_ids, profit = grouped_sums(stores, cells[:, PROFIT], np.arange(self.prefix.shape[1]))
+        _, sales = grouped_sums(stores, cells[:, REVENUE], np.arange(self.prefix.shape[1]))
+        cities = dict(conn.execute("SELECT store_id, city FROM Stores").fetchall())
+        df = pd.DataFrame({'store_id': store_ids, 'city': [cities[store_id] for store_id in store_ids],
+                           'profit_margin': profit / sales})
+        return df.sort_values('profit_margin', ascending=False, kind='stable').reset_index(drop=True)
+
+    def calculate_series_bollinger_bands(self, conn, start_date=None, end_date=None, date_ids=None,
+                                         groupings=DEFAULT_GROUPINGS, windows=DEFAULT_WINDOWS,
+                                         num_std_devs=DEFAULT_STD_DEVS):
+        return series_band_table([
+            grouping_bands(self.grouped_daily_profits(conn, date_ids, grouping), grouping, windows, num_std_devs)
+            for grouping in groupings
+        ])
+
+if __name__ == "__main__":
+    conn = connect(read_only=True)
+    try:
+        added = refresh_index(conn)
+    finally:
+        conn.close()
+    manifest = read_manifest(PREFIX_DIR)
+    print(f"Indexed {added:,} new sales, {manifest['rows']:,} sales over {manifest['days']:,} days in {PREFIX_DIR}")
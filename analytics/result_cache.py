@@ -0,0 +1,139 @@
+"""
+This module, result_cache.py, is a content-addressed cache of the pre-processed analytics outputs.
+pre_process_analytics wipes /app/data/analytics/ and recomputes every level, even when the database and the
+date range didn't change since a previous run. With the cache, an output whose inputs were seen before is
+copied into place instead of being queried again:
+
+1. Content-Addressed Keys:
+    Every output file (Feather or CSV, see output_format.py) is stored under the SHA-256 of its level, name, date range, parameters (engine, mode, ...)
+    and the fingerprint of the database (row counts, max ids and edge rows of every table, see engines.data_fingerprint).
+    Any load, append or reset changes the fingerprint, so stale results are never served, they just age out. In-place
+    updates and deletes only change it through the write counter of migration 003; on a database without the
+    migration, recompute with pre_process_analytics --no-cache after editing rows.
+
+2. LRU Eviction:
+    Entries live in /app/data/cache/analytics/ (outside the wiped analytics directory). A hit refreshes the
+    entry's mtime, and after every store the least recently used entries are removed until the cache fits
+    its size budget (ORESTIS_CACHE_MB, default 256MB).
+
+3. Empty Results:
+    Metrics that produce no output for a range (e.g. too few days for a forecast) are cached as such too.
+
+Entries are written to a temporary file and renamed into place, so concurrent analytics processes and threads
+never read a partial entry. Cache I/O errors only cost a recompute, they never fail the analytics.
+
+Usage:
+    cache = ResultCache()
+    key = cache.key('intermediate', 'avg_purchase', start_date, end_date, fingerprint, engine='sqlite')
+    if not cache.materialize(key, path):
+        compute(path)
+        cache.store(key, path)
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import threading
+
+CACHE_DIR = '/app/data/cache/analytics/'
+DEFAULT_MAX_BYTES = int(os.environ.get('ORESTIS_CACHE_MB', 256)) * 1024 * 1024
+
+# Bump when the analytics change what they compute, so results of older code are not served
+CACHE_VERSION = 2
+
+# Entries keep the extension of their output file
+ENTRY_SUFFIXES = ('.feather', '.csv')
+# Marks an output the metric didn't write for its range
+EMPTY_SUFFIX = '.empty'
+
+class ResultCache:
+    def __init__(self, cache_dir=CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+
+    def key(self, level, output, start_date, end_date, fingerprint, **params):
+        """Content address of one output of a level for the date range, database fingerprint and parameters."""
+        identity = {
+            'version': CACHE_VERSION,
+            'level': level,
+            'output': output,
+            'start_date': start_date,
+            'end_date': end_date,
+            'fingerprint': fingerprint,
+            'params': params,
+        }
+        return hashlib.sha256(json.dumps(identity, sort_keys=True, default=str).encode()).hexdigest()
+
+    def entry_path(self, key, suffix):
+        return os.path.join(self.cache_dir, key + suffix)
+
+    def materialize(self, key, path):
+        """Copy the cached output of key to path. Returns False on a miss."""
+        entry_suffix = os.path.splitext(path)[1]
+        for suffix in (entry_suffix, EMPTY_SUFFIX):
+            entry = self.entry_path(key, suffix)
+            try:
+                if suffix == entry_suffix:
+                    shutil.copyfile(entry, path)
+                # Refresh the entry for the LRU order
+                os.utime(entry)
+                return True
+            except FileNotFoundError:
+                continue
+            except OSError:
+                return False
+        return False
+
+    def store(self, key, path):
+        """Cache the output at path under key (or that there is none if the metric didn't write path), then evict."""
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            exists = os.path.exists(path)
+            entry = self.entry_path(key, os.path.splitext(path)[1] if exists else EMPTY_SUFFIX)
+            tmp_path = f"{entry}.{os.getpid()}.{threading.get_ident()}.tmp"
+            if exists:
+                shutil.copyfile(path, tmp_path)
+            else:
+                open(tmp_path, 'w').close()
+            os.replace(tmp_path, entry)
+            self.evict()
+        except OSError:
+            pass
+
+    def entries(self):
+        """(mtime, size, path) of every cache entry."""
+        entries = []
+        with os.scandir(self.cache_dir) as it:
+            for entry in it:
+                if not entry.name.endswith(ENTRY_SUFFIXES + (EMPTY_SUFFIX,)):
+                    continue
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+        return entries
+
+    def evict(self):
+        """Remove the least recently used entries until the cache fits max_bytes."""
+        entries = sorted(self.entries())
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+
+    def clear(self):
+        shutil.rmtree(self.cache_dir, ignore_errors=True)
+
+    def size(self):
+        """Number of entries and their total size in bytes."""
+        if not os.path.isdir(self.cache_dir):
+            return 0, 0
+        entries = self.entries()
+        return len(entries), sum(size for _, size, _ in entries)
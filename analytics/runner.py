@@ -0,0 +1,99 @@
+"""
+This module, runner.py, runs the pre-processing of the analytics levels concurrently and in-process,
+instead of starting one shell script and Python interpreter per level one after another.
+
+Key Features:
+1. Process Pool:
+    Every selected level runs its compute_*_analytics function in a worker process, so the levels run
+    in parallel on separate cores (pandas and statsmodels hold the GIL, so threads would serialize).
+    There is at most one worker per core.
+2. One-Time Imports:
+    Workers are forked from a forkserver that has imported the analytics modules (pandas, statsmodels) once
+    per CLI session, so a run doesn't pay the interpreter start-up and imports again. Unlike forking the CLI itself,
+    the forkserver holds no open SQLite connections that the workers could inherit.
+3. Timings and Failures:
+    Every level reports its wall time and the latency of each of its metrics (the metrics of a level run on a
+    thread pool of their own, see metric_pool.py), and failures are returned with their error instead of being
+    reported as a success (including the sys.exit of a database error in compute_*_analytics).
+4. Batches:
+    With ranges, every level pre-processes all of them in one worker (see batch.py).
+
+Usage:
+    results = run_analytics(['basic', 'advanced'], '2021-01-01', '2022-12-31', engine='duckdb')
+    for result in results:
+        print(result.level, result.seconds, result.metrics, result.error)
+"""
+
+import importlib
+import multiprocessing
+import os
+import sys
+import time
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+sys.path.append('/app')
+
+from analytics.batch import compute_batch
+
+LEVELS = ['basic', 'intermediate', 'advanced']
+LEVEL_MODULES = {level: f'analytics.{level}_analytics' for level in LEVELS}
+
+# Options of compute_basic_analytics that the other levels and batches don't take
+BASIC_ONLY_OPTIONS = ('columnar', 'shared_scan')
+# Options of the basic level, single range or batch, that the other levels don't take
+BASIC_LEVEL_OPTIONS = ('top_k',)
+
+# metrics is the {metric: seconds} latency of every metric of the level
+LevelResult = namedtuple('LevelResult', ['level', 'seconds', 'metrics', 'error'])
+
+_context = None
+
+def pool_context():
+    """The forkserver context of the worker pools, started once per process with the analytics modules imported."""
+    global _context
+    if _context is None:
+        _context = multiprocessing.get_context('forkserver')
+        _context.set_forkserver_preload(list(LEVEL_MODULES.values()))
+    return _context
+
+def run_level(level, start_date, end_date, options, ranges=None):
+    """
+    Compute one analytics level in a worker, for the date range or for every range of ranges (see batch.py),
+    returning its wall time in seconds and the latency of every metric.
+    """
+    start_time = time.perf_counter()
+    module = importlib.import_module(LEVEL_MODULES[level])
+    os.makedirs(module.DATA_DIR, exist_ok=True)
+    if level != 'basic' or ranges is not None:
+        options = {k: v for k, v in options.items() if k not in BASIC_ONLY_OPTIONS}
+    if level != 'basic':
+        options = {k: v for k, v in options.items() if k not in BASIC_LEVEL_OPTIONS}
+    try:
+        if ranges is not None:
+            metrics = compute_batch(level, module, ranges, **options)
+        else:
+            metrics = getattr(module, f'compute_{level}_analytics')(start_date, end_date, **options)
+    except SystemExit as e:
+        # compute_*_analytics exits on database errors when run as a script
+        raise RuntimeError(f"{level} analytics exited with status {e.code}") from None
+    return time.perf_counter() - start_time, metrics
+
+def run_analytics(levels, start_date, end_date, ranges=None, **options):
+    """
+    Run the analytics levels concurrently for the YYYY-MM-DD date range, or for every {name: (start, end)} of ranges
+    into per-range directories, and return a LevelResult per level, in the order of levels. options are passed to compute_*_analytics (engine, workers, use_cache, prefix_index, approximate, columnar, shared_scan, top_k, formats).
+    """
+    if not levels:
+        return []
+    # More workers than cores only adds contention, the remaining levels queue up for a free worker
+    max_workers = min(len(levels), os.cpu_count() or 1)
+    with ProcessPoolExecutor(max_workers=max_workers, mp_context=pool_context()) as pool:
+        futures = {level: pool.submit(run_level, level, start_date, end_date, options, ranges) for level in levels}
+        results = []
+        for level in levels:
+            try:
+                results.append(LevelResult(level, *futures[level].result(), None))
+            except Exception as e:
+                results.append(LevelResult(level, None, None, f"{type(e).__name__}: {e}"))
+    return results
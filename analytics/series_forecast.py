@@ -0,0 +1,193 @@
+"""
+This script, series_forecast.py, forecasts the daily profits of every store, every product and every store×product
+pair, not just of the company as a whole. These are hundreds to thousands of series, so instead of fitting
+them one after another:
+
+1. One Grouped Query:
+    The daily profits of all series of a grouping come from a single calculate_daily_profits query grouped
+    by store_id and/or product_id. Days without sales of a series are days with zero profit.
+
+2. Process Pool with Chunking:
+    The series are split in chunks, and the chunks are fitted by forecast_with_arima on a pool of worker
+    processes (statsmodels holds the GIL, so threads would serialize). Workers come from the forkserver of the
+    analytics runner (see runner.py), which has imported pandas and statsmodels already.
+
+3. Per-Series Timeout:
+    Every fit runs under a timer of its own, a series that doesn't converge in time is reported as failed
+    instead of holding up its chunk. Series with fewer than 60 days of sales are skipped, like the company forecast.
+
+4. Consolidated Output:
+    The forecasts of all series are written to one table, series_profit_forecasts.feather (and .csv with --csv, see
+    output_format.py) in '/app/data/analytics/advanced/', with the grouping, store_id and product_id of every forecast day.
+    The throughput (series/second) and every failed fit are reported.
+
+Usage:
+    python series_forecast.py <start_date> <end_date> [--by store,product,store_product] [--steps N]
+                              [--workers N] [--chunk-size N] [--timeout SECONDS] [--engine sqlite|duckdb] [--csv]
+
+Where <start_date> and <end_date> are in YYYYMMDD format.
+"""
+
+import argparse
+import os
+import signal
+import sys
+import time
+import warnings
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+sys.path.append('/app')
+
+from analytics.advanced_analytics import calculate_daily_profits, forecast_with_arima, reformat_date, DATA_DIR, GROUPINGS
+from analytics.date_filters import resolve_date_id_range
+from analytics.engines import analytics_connection, DATABASE_ERRORS, DEFAULT_ENGINE, ENGINES
+from analytics.output_format import with_csv, write_output, DEFAULT_FORMATS
+from analytics.runner import pool_context
+
+DEFAULT_WORKERS = os.cpu_count() or 1
+DEFAULT_CHUNK_SIZE = 16
+# Seconds a single fit may take
+DEFAULT_TIMEOUT = 30
+ORDER = (1, 1, 1)
+# Like forecast_daily_profits, a series needs at least 60 days of sales
+MIN_DAYS = 60
+OUTPUT_NAME = 'series_profit_forecasts'
+
+# failed is the {series label: error} of every fit that failed or timed out
+ForecastReport = namedtuple('ForecastReport', ['series', 'forecasted', 'skipped', 'failed', 'seconds'])
+
+class FitTimeout(Exception):
+    pass
+
+def raise_fit_timeout(signum, frame):
+    raise FitTimeout()
+
+def series_label(grouping, key):
+    return f"{grouping} " + ', '.join(f"{column}={value}" for column, value in zip(GROUPINGS[grouping], key))
+
+def grouped_series(conn, start_date, end_date, grouping, date_ids=None):
+    """{(grouping, key): daily profit series} of every series of the grouping with at least MIN_DAYS days of sales."""
+    group_by = GROUPINGS[grouping]
+    daily_profits = calculate_daily_profits(conn, start_date, end_date, date_ids=date_ids, group_by=group_by)
+    daily_profits['date'] = pd.to_datetime(daily_profits['date'])
+    if daily_profits.empty:
+        return {}, 0
+    # Every series covers all days with any sales, a day without sales of the series has zero profit
+    days = pd.date_range(daily_profits['date'].min(), daily_profits['date'].max(), freq='D')
+    series, skipped = {}, 0
+    for key, group in daily_profits.groupby(list(group_by)):
+        if len(group) < MIN_DAYS:
+            skipped += 1
+            continue
+        series[(grouping, key)] = group.set_index('date')['daily_profit'].reindex(days, fill_value=0.0)
+    return series, skipped
+
+def fit_chunk(chunk, order, steps, timeout):
+    """[(series id, forecast or None, error or None)] of every (series id, series) of chunk, each fit within timeout."""
+    results = []
+    previous_handler = signal.signal(signal.SIGALRM, raise_fit_timeout)
+    try:
+        for series_id, series in chunk:
+            try:
+                signal.setitimer(signal.ITIMER_REAL, timeout)
+                with warnings.catch_warnings():
+                    # Convergence warnings of thousands of fits would drown the report
+                    warnings.simplefilter('ignore')
+                    forecast = forecast_with_arima(series, order, steps=steps)
+                signal.setitimer(signal.ITIMER_REAL, 0)
+                results.append((series_id, forecast, None))
+            except FitTimeout:
+                results.append((series_id, None, f"timed out after {timeout}s"))
+            except Exception as e:
+                signal.setitimer(signal.ITIMER_REAL, 0)
+                results.append((series_id, None, f"{type(e).__name__}: {e}"))
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, previous_handler)
+    return results
+
+def consolidate(forecasts):
+    """One table of the {(grouping, key): forecast} forecasts."""
+    frames = []
+    for (grouping, key), forecast in forecasts.items():
+        frame = pd.DataFrame({'grouping': grouping, 'date': forecast.index.date, 'forecast_profit': forecast.values})
+        for column, value in zip(GROUPINGS[grouping], key):
+            frame[column] = value
+        frames.append(frame)
+    columns = ['grouping', 'store_id', 'product_id', 'date', 'forecast_profit']
+    if not frames:
+        return pd.DataFrame(columns=columns)
+    table = pd.concat(frames, ignore_index=True).reindex(columns=columns)
+    table[['store_id', 'product_id']] = table[['store_id', 'product_id']].astype('Int64')
+    return table
+
+def forecast_series(start_date=None, end_date=None, groupings=tuple(GROUPINGS), steps=5, engine=DEFAULT_ENGINE,
+                    workers=DEFAULT_WORKERS, chunk_size=DEFAULT_CHUNK_SIZE, timeout=DEFAULT_TIMEOUT,
+                    formats=DEFAULT_FORMATS, data_dir=DATA_DIR):
+    """
+    Forecast `steps` days of profits of every series of the groupings for the YYYY-MM-DD date range, fitting the
+    series in chunks on `workers` processes, and write them to data_dir/series_profit_forecasts in the formats.
+    Returns the forecast table and a ForecastReport.
+    """
+    start_time = time.perf_counter()
+    series, skipped = {}, 0
+    with analytics_connection(engine) as conn:
+        date_ids = resolve_date_id_range(conn, start_date, end_date)
+        for grouping in groupings:
+            grouping_series, grouping_skipped = grouped_series(conn, start_date, end_date, grouping, date_ids)
+            series.update(grouping_series)
+            skipped += grouping_skipped
+
+    items = list(series.items())
+    chunks = [items[i:i + chunk_size] for i in range(0, len(items), chunk_size)]
+    if workers <= 1 or len(chunks) <= 1:
+        results = [result for chunk in chunks for result in fit_chunk(chunk, ORDER, steps, timeout)]
+    else:
+        with ProcessPoolExecutor(max_workers=min(workers, len(chunks)), mp_context=pool_context()) as pool:
+            futures = [pool.submit(fit_chunk, chunk, ORDER, steps, timeout) for chunk in chunks]
+            results = [result for future in futures for result in future.result()]
+
+    forecasts = {series_id: forecast for series_id, forecast, error in results if error is None}
+    failed = {series_label(*series_id): error for series_id, _, error in results if error is not None}
+    table = consolidate(forecasts)
+    os.makedirs(data_dir, exist_ok=True)
+    write_output(table, data_dir, OUTPUT_NAME, formats)
+    return table, ForecastReport(len(series), len(forecasts), skipped, failed, time.perf_counter() - start_time)
+
+def format_report(report):
+    """Lines of the throughput of the forecasts followed by every failed fit."""
+    throughput = report.forecasted / report.seconds if report.seconds else 0
+    lines = [
+        f"Forecasted {report.forecasted} of {report.series} series in {report.seconds:.2f}s ({throughput:.1f} series/s), "
+        f"{len(report.failed)} failed, {report.skipped} skipped with fewer than {MIN_DAYS} days of sales"
+    ]
+    lines += [f"    {label}: {error}" for label, error in report.failed.items()]
+    return lines
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Forecast the daily profits of every store, product and store×product.")
+    parser.add_argument('start_date', help="Start date in YYYYMMDD format")
+    parser.add_argument('end_date', help="End date in YYYYMMDD format")
+    parser.add_argument('--by', default=','.join(GROUPINGS), help="Comma separated groupings: store, product, store_product")
+    parser.add_argument('--steps', type=int, default=5, help="Days to forecast")
+    parser.add_argument('--engine', choices=ENGINES, default=DEFAULT_ENGINE, help="Query engine to read the profits from")
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS, help="Fit the series on this many processes")
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE, help="Series fitted per task")
+    parser.add_argument('--timeout', type=float, default=DEFAULT_TIMEOUT, help="Seconds a single fit may take")
+    parser.add_argument('--csv', action='store_true', help="Export the forecasts as CSV too")
+    args = parser.parse_args()
+    groupings = [grouping.strip() for grouping in args.by.split(',')]
+    unknown = [grouping for grouping in groupings if grouping not in GROUPINGS]
+    if unknown:
+        parser.error(f"unknown grouping(s) {', '.join(unknown)}, expected {', '.join(GROUPINGS)}")
+    try:
+        _, report = forecast_series(reformat_date(args.start_date), reformat_date(args.end_date), groupings, args.steps,
+                                    args.engine, args.workers, args.chunk_size, args.timeout,
+                                    with_csv(DEFAULT_FORMATS) if args.csv else DEFAULT_FORMATS)
+    except DATABASE_ERRORS as e:
+        print(f"Database error: {e}")
+        sys.exit(1)
+    print('\n'.join(format_report(report)))
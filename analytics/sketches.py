@@ -0,0 +1,413 @@
+"""
+This module, sketches.py, keeps mergeable per-day sketches of the sales, so the intermediate and advanced analytics
+can answer the metrics that need every sale or every customer (distinct customers, purchase value quantiles,
+averages) approximately, with error bounds, for any date range without scanning Sales. It provides the following:
+
+1. HyperLogLog Distinct Customers:
+    Every day has the 2^precision HyperLogLog registers of the customers that bought on it. The registers of a date
+    range are the element-wise maximum of its days, so the distinct customers of any range are estimated within a
+    relative standard error of 1.04 / sqrt(2^precision).
+
+2. Log-Bucket Quantiles:
+    Every day counts its purchase values in logarithmic buckets, bucket k holding the values in (gamma^(k-1), gamma^k]
+    with gamma = (1 + error) / (1 - error). The counts of a range are the sums of its days, any quantile is then
+    within the relative error of the true one, and the bucket edges bound it. The counts also give the exact
+    number of sales of the range.
+
+3. Bernoulli Sample:
+    A deterministic Bernoulli sample of the sales (a sale is sampled if the hash of its sale_id falls below the sample
+    rate) is kept per day with its purchase value, unit price and unit margin, and averages are estimated from the
+    sampled sales of the range with 95% confidence intervals.
+
+4. Persistence and Maintenance:
+    The sketches live in /app/data/sketches/ as one row per date_id, so a range merges a contiguous slice of days.
+    Like the prefix index (see prefix_index.py), a refresh only adds the sales after the manifest's last sale_id as
+    new days, and rebuilds the sketches when those sales land on indexed days, when the fingerprint of the sketched
+    sales no longer matches the database (e.g. after reset_db or an in-place edit, see columnar.export_is_current),
+    or when the error or sample rate changed. Rebuilt files are renamed over the mapped ones, and
+    the manifest is replaced last, under a file lock.
+
+5. Fast Path:
+    SketchIndex has a method for every analytics function it can approximate, with the same name and arguments. Its
+    results have the columns of the exact function, each estimate followed by its <column>_low and <column>_high bounds.
+
+Usage:
+    python sketches.py [--error E] [--sample-rate R]
+    sketches = load_sketches(SketchSettings(error=0.01, sample_rate=0.01))
+    df = sketches.fast_path(avg_purchase_frequency)(conn, start_date, end_date, date_ids=date_ids)
+"""
+
+import argparse
+import fcntl
+import math
+import os
+import sys
+import threading
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+sys.path.append('/app')
+
+from analytics.columnar import export_is_current, read_manifest, write_manifest, LOCK_NAME
+from analytics.engines import sales_fingerprint
+from database.connection import connect
+from database.partitions import sales_source
+
+SKETCH_DIR = '/app/data/sketches/'
+REGISTERS_FILE = 'registers.uint8'
+BUCKETS_FILE = 'buckets.uint32'
+SAMPLE_FILE = 'sample.float64'
+SAMPLE_PRODUCTS_FILE = 'sample_products.int32'
+SAMPLE_DAYS_FILE = 'sample_days.int64'
+FETCH_SIZE = 100_000
+
+# Relative error of the distinct counts and quantiles, and the fraction of the sales sampled for averages
+SketchSettings = namedtuple('SketchSettings', ['error', 'sample_rate'])
+DEFAULT_ERROR = 0.01
+DEFAULT_SAMPLE_RATE = 0.01
+
+# Purchase values below MIN_VALUE or above MAX_VALUE are counted in the first or last bucket
+MIN_VALUE, MAX_VALUE = 1e-2, 1e9
+MIN_PRECISION, MAX_PRECISION = 4, 16
+# z of the two-sided 95% confidence intervals
+Z_95 = 1.96
+# Columns of a sampled sale
+SAMPLE_VALUE, SAMPLE_PRICE, SAMPLE_MARGIN = range(3)
+
+# The quantiles of the purchase values reported by purchase_value_quantiles
+PURCHASE_QUANTILES = (0.1, 0.25, 0.5, 0.75, 0.9, 0.99)
+
+# Analytics functions SketchIndex has a method of the same name for
+APPROXIMATE_METRICS = frozenset([
+    'avg_purchase_frequency', 'avg_purchase', 'purchase_value_quantiles', 'calculate_product_profit_margin',
+])
+
+def check_settings(settings):
+    if not 0 < settings.error < 1:
+        raise ValueError(f"The sketch error must be between 0 and 1, got {settings.error}")
+    if not 0 < settings.sample_rate <= 1:
+        raise ValueError(f"The sample rate must be in (0, 1], got {settings.sample_rate}")
+
+def hll_precision(error):
+    """The number of index bits of the HyperLogLog registers whose standard error is at most error."""
+    return min(max(math.ceil(math.log2((1.04 / error) ** 2)), MIN_PRECISION), MAX_PRECISION)
+
+def bucket_keys(error):
+    """gamma and the (first, last) bucket keys of the values between MIN_VALUE and MAX_VALUE."""
+    gamma = (1 + error) / (1 - error)
+    return gamma, math.ceil(math.log(MIN_VALUE, gamma)), math.ceil(math.log(MAX_VALUE, gamma))
+
+def mix64(values, seed=0):
+    """The SplitMix64 output of the integers values as its counter, a well-mixed 64-bit hash."""
+    with np.errstate(over='ignore'):
+        z = (values.astype(np.uint64) + np.uint64(seed + 1)) * np.uint64(0x9E3779B97F4A7C15)
+        z = (z ^ (z >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+        z = (z ^ (z >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+        return z ^ (z >> np.uint64(31))
+
+def bit_length(values):
+    """The bit length of every uint64 of values, from the exponents of its exactly representable 32-bit halves."""
+    high = np.frexp((values >> np.uint64(32)).astype(np.float64))[1]
+    low = np.frexp((values & np.uint64(0xFFFFFFFF)).astype(np.float64))[1]
+    return np.where(high > 0, high + 32, low)
+
+def hll_ranks(ids, precision):
+    """(register, rank) of every id: the register is the first precision bits of its hash, the rank the position of the first 1 bit after them."""
+    hashes = mix64(ids)
+    registers = (hashes >> np.uint64(64 - precision)).astype(np.int64)
+    rest = hashes & np.uint64((1 << (64 - precision)) - 1)
+    return registers, (64 - precision + 1 - bit_length(rest)).astype(np.uint8)
+
+def hll_estimate(registers):
+    """Estimated number of distinct ids of the merged registers."""
+    m = len(registers)
+    alpha = 0.7213 / (1 + 1.079 / m)
+    estimate = alpha * m * m / np.exp2(-registers.astype(np.float64)).sum()
+    zeros = np.count_nonzero(registers == 0)
+    if estimate <= 2.5 * m and zeros:
+        # Linear counting is more accurate for small cardinalities
+        return m * math.log(m / zeros)
+    return estimate
+
+def sampled(sale_ids, sample_rate):
+    """Mask of the sale_ids in the Bernoulli sample, the same sales whenever they are sketched."""
+    return (mix64(sale_ids, seed=1) >> np.uint64(11)).astype(np.float64) < sample_rate * 2.0 ** 53
+
+def scan_sales(conn, after_sale_id, fetch_size=FETCH_SIZE):
+    """Chunks of the sale_id, date_id, customer_id, product_id, purchase value, unit price and unit margin of the sales after after_sale_id."""
+    cursor = conn.execute(f"""
+    SELECT Sales.sale_id, Sales.date_id, Sales.customer_id, Sales.product_id,
+           Sales.quantity * Sales.unit_price, Sales.unit_price, Sales.unit_price - Products.purchase_price
+    FROM {sales_source(conn)}
+    JOIN Products ON Sales.product_id = Products.product_id
+    WHERE Sales.sale_id > ?
+    """, (after_sale_id,))
+    while True:
+        rows = cursor.fetchmany(fetch_size)
+        if not rows:
+            break
+        columns = list(zip(*rows))
+        yield ([np.asarray(column, dtype=np.int64) for column in columns[:4]]
+               + [np.asarray(column, dtype=np.float64) for column in columns[4:]])
+
+def append_file(path, committed_bytes, array):
+    """
+    Append array to the file at path after its first committed_bytes, dropping anything an interrupted refresh left.
+    Without committed bytes the file is written to a temporary file and renamed into place, so readers still mapping
+    the old file keep their sketches.
+    """
+    if not committed_bytes:
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        array.tofile(tmp_path)
+        os.replace(tmp_path, path)
+        return
+    with open(path, 'r+b') as f:
+        f.truncate(committed_bytes)
+        f.seek(0, os.SEEK_END)
+        array.tofile(f)
+
+def refresh_sketches(conn, settings, sketch_dir=SKETCH_DIR):
+    """
+    Add the days of the sales after the last sketched sale_id to the sketches, or rebuild them if those sales can't
+    just be appended or the settings changed. Returns the number of sketched sales added.
+    """
+    check_settings(settings)
+    os.makedirs(sketch_dir, exist_ok=True)
+    with open(os.path.join(sketch_dir, LOCK_NAME), 'w') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        manifest = read_manifest(sketch_dir)
+        if (not export_is_current(conn, manifest) or manifest['error'] != settings.error
+                or manifest['sample_rate'] != settings.sample_rate):
+            manifest = None
+        if manifest is not None:
+            min_date_id, = conn.execute(
+                f"SELECT MIN(date_id) FROM {sales_source(conn)} WHERE sale_id > ?", (manifest['max_sale_id'],)
+            ).fetchone()
+            if min_date_id is None:
+                return 0
+            # Only whole new days can be appended to the sketches
+            if min_date_id < manifest['days']:
+                manifest = None
+        if manifest is None:
+            gamma, first_key, last_key = bucket_keys(settings.error)
+            manifest = {
+                'rows': 0,
+                'max_sale_id': 0,
+                'days': 0,
+                'samples': 0,
+                'error': settings.error,
+                'sample_rate': settings.sample_rate,
+                'precision': hll_precision(settings.error),
+                'first_key': first_key,
+                'buckets': last_key - first_key + 1,
+            }
+        max_date_id, = conn.execute(
+            f"SELECT MAX(date_id) FROM {sales_source(conn)} WHERE sale_id > ?", (manifest['max_sale_id'],)
+        ).fetchone()
+        days = manifest['days']
+        new_days = 0 if max_date_id is None else max_date_id + 1 - days
+        num_registers = 1 << manifest['precision']
+        log_gamma = math.log(bucket_keys(settings.error)[0])
+
+        registers = np.zeros((new_days, num_registers), dtype=np.uint8)
+        buckets = np.zeros((new_days, manifest['buckets']), dtype=np.uint32)
+        sample, sample_products, sample_days = [], [], []
+        added, max_sale_id = 0, manifest['max_sale_id']
+        for sale_ids, date_ids, customer_ids, product_ids, values, prices, margins in scan_sales(conn, max_sale_id):
+            day = date_ids - days
+            customer_registers, ranks = hll_ranks(customer_ids, manifest['precision'])
+            np.maximum.at(registers, (day, customer_registers), ranks)
+            keys = np.ceil(np.log(np.clip(values, MIN_VALUE, MAX_VALUE)) / log_gamma).astype(np.int64)
+            np.add.at(buckets, (day, np.clip(keys - manifest['first_key'], 0, manifest['buckets'] - 1)), 1)
+            mask = sampled(sale_ids, settings.sample_rate)
+            sample.append(np.stack([values[mask], prices[mask], margins[mask]], axis=1))
+            sample_products.append(product_ids[mask])
+            sample_days.append(day[mask])
+            added += len(sale_ids)
+            max_sale_id = max(max_sale_id, int(sale_ids.max()))
+
+        # Sampled sales are stored in date order, so a range is a contiguous slice of them
+        sample_days = np.concatenate(sample_days) if sample_days else np.empty(0, dtype=np.int64)
+        order = np.argsort(sample_days, kind='stable')
+        sample = np.concatenate(sample)[order] if sample else np.empty((0, 3))
+        sample_products = np.concatenate(sample_products)[order].astype(np.int32) if sample_products else np.empty(0, dtype=np.int32)
+
+        append_file(os.path.join(sketch_dir, REGISTERS_FILE), days * num_registers, registers)
+        append_file(os.path.join(sketch_dir, BUCKETS_FILE), days * manifest['buckets'] * 4, buckets)
+        append_file(os.path.join(sketch_dir, SAMPLE_DAYS_FILE), days * 8, np.bincount(sample_days, minlength=new_days))
+        append_file(os.path.join(sketch_dir, SAMPLE_FILE), manifest['samples'] * 3 * 8, sample)
+        append_file(os.path.join(sketch_dir, SAMPLE_PRODUCTS_FILE), manifest['samples'] * 4, sample_products)
+
+        write_manifest(sketch_dir, dict(manifest, rows=manifest['rows'] + added, max_sale_id=max_sale_id,
+                                        days=days + new_days, samples=manifest['samples'] + len(sample),
+                                        fingerprint=sales_fingerprint(conn, max_sale_id)))
+    return added
+
+def open_sketches(sketch_dir=SKETCH_DIR):
+    """Map the sketches read-only, returns None if they were never built."""
+    manifest = read_manifest(sketch_dir)
+    if manifest is None:
+        return None
+    def mapped(name, dtype, shape):
+        if not np.prod(shape):
+            return np.zeros(shape, dtype=dtype)
+        return np.memmap(os.path.join(sketch_dir, name), dtype=dtype, mode='r', shape=shape)
+    days, samples = manifest['days'], manifest['samples']
+    return SketchIndex(
+        manifest,
+        mapped(REGISTERS_FILE, np.uint8, (days, 1 << manifest['precision'])),
+        mapped(BUCKETS_FILE, np.uint32, (days, manifest['buckets'])),
+        mapped(SAMPLE_DAYS_FILE, np.int64, (days,)),
+        mapped(SAMPLE_FILE, np.float64, (samples, 3)),
+        mapped(SAMPLE_PRODUCTS_FILE, np.int32, (samples,)),
+    )
+
+def load_sketches(settings, db_path=None, sketch_dir=SKETCH_DIR):
+    """Refresh the sketches of the settings from the SQLite database and open them."""
+    conn = connect(db_path, read_only=True)
+    try:
+        refresh_sketches(conn, settings, sketch_dir)
+    finally:
+        conn.close()
+    return open_sketches(sketch_dir)
+
+def mean_interval(mean, standard_error):
+    return mean - Z_95 * standard_error, mean + Z_95 * standard_error
+
+class SketchIndex:
+    def __init__(self, manifest, registers, buckets, sample_days, sample, sample_products):
+        self.manifest = manifest
+        self.settings = SketchSettings(manifest['error'], manifest['sample_rate'])
+        self.registers = registers
+        self.buckets = buckets
+        self.sample = sample
+        self.sample_products = sample_products
+        # Sampled sales before every day, day d's sales are sample[sample_offsets[d]:sample_offsets[d + 1]]
+        self.sample_offsets = np.concatenate([[0], np.cumsum(sample_days)])
+        gamma = (1 + self.settings.error) / (1 - self.settings.error)
+        keys = manifest['first_key'] + np.arange(manifest['buckets'])
+        # Bucket edges and the value with the least relative error to any value in between
+        self.upper_edges = gamma ** keys.astype(np.float64)
+        self.lower_edges = self.upper_edges / gamma
+        self.lower_edges[0], self.upper_edges[-1] = 0.0, np.inf
+        self.centers = 2 * gamma ** keys.astype(np.float64) / (gamma + 1)
+        # The finite population correction of a Bernoulli sample
+        self.correction = math.sqrt(1 - self.settings.sample_rate)
+
+    def fast_path(self, function):
+        """The method approximating function from the sketches, or function itself if it has none."""
+        return getattr(self, function.__name__) if function.__name__ in APPROXIMATE_METRICS else function
+
+    def clamp(self, date_ids):
+        """The (start, end) date_id range clamped to the sketched days."""
+        return max(date_ids[0], 0), min(date_ids[1], len(self.buckets) - 1)
+
+    def range_counts(self, date_ids):
+        """The purchase value bucket counts of the date_id range."""
+        start, end = self.clamp(date_ids)
+        if start > end:
+            return np.zeros(self.manifest['buckets'], dtype=np.int64)
+        return self.buckets[start:end + 1].sum(axis=0, dtype=np.int64)
+
+    def range_customers(self, date_ids):
+        """Estimated distinct customers of the date_id range and the relative error of its 95% interval."""
+        start, end = self.clamp(date_ids)
+        if start > end:
+            return 0.0, 0.0
+        registers = self.registers[start:end + 1].max(axis=0)
+        return hll_estimate(registers), Z_95 * 1.04 / math.sqrt(len(registers))
+
+    def range_sample(self, date_ids):
+        """The sampled sales and their product ids of the date_id range."""
+        start, end = self.clamp(date_ids)
+        if start > end:
+            return self.sample[:0], self.sample_products[:0]
+        rows = slice(self.sample_offsets[start], self.sample_offsets[end + 1])
+        return np.asarray(self.sample[rows]), np.asarray(self.sample_products[rows])
+
+    # Intermediate analytics
+
+    def avg_purchase_frequency(self, conn, start_date=None, end_date=None, date_ids=None):
+        transactions = self.range_counts(date_ids).sum()
+        customers, error = self.range_customers(date_ids)
+        if not transactions:
+            return pd.DataFrame({column: [np.nan] for column in (
+                'average_purchase_frequency', 'average_purchase_frequency_low', 'average_purchase_frequency_high')})
+        frequency = transactions / customers
+        return pd.DataFrame({
+            'average_purchase_frequency': [frequency],
+            'average_purchase_frequency_low': [frequency / (1 + error)],
+            'average_purchase_frequency_high': [frequency / (1 - error) if error < 1 else np.inf],
+        })
+
+    def avg_purchase(self, conn, start_date=None, end_date=None, date_ids=None):
+        values = self.range_sample(date_ids)[0][:, SAMPLE_VALUE]
+        # AVG over no rows is NULL in SQL, and a single sampled sale has no interval
+        mean, low, high = None, None, None
+        if len(values):
+            mean = values.mean()
+        if len(values) > 1:
+            low, high = mean_interval(mean, values.std(ddof=1) / math.sqrt(len(values)) * self.correction)
+        return pd.DataFrame({'avg_purchase_value': [mean], 'avg_purchase_value_low': [low], 'avg_purchase_value_high': [high]})
+
+    def purchase_value_quantiles(self, conn, start_date=None, end_date=None, date_ids=None):
+        counts = self.range_counts(date_ids)
+        n = counts.sum()
+        columns = ['quantile', 'purchase_value', 'purchase_value_low', 'purchase_value_high']
+        if n == 0:
+            return pd.DataFrame(columns=columns)
+        # Interpolated between the neighbouring ranks like np.quantile, each rank taken from its bucket
+        virtual = np.array(PURCHASE_QUANTILES) * (n - 1)
+        lower = np.floor(virtual).astype(np.int64)
+        cumulative = np.cumsum(counts)
+        lower_buckets = np.searchsorted(cumulative, lower, side='right')
+        upper_buckets = np.searchsorted(cumulative, np.minimum(lower + 1, n - 1), side='right')
+        lower_values, upper_values = self.centers[lower_buckets], self.centers[upper_buckets]
+        return pd.DataFrame({
+            'quantile': PURCHASE_QUANTILES,
+            'purchase_value': lower_values + (upper_values - lower_values) * (virtual - lower),
+            'purchase_value_low': self.lower_edges[lower_buckets],
+            'purchase_value_high': self.upper_edges[upper_buckets],
+        })[columns]
+
+    # Advanced analytics
+
+    def calculate_product_profit_margin(self, conn, start_date=None, end_date=None, date_ids=None):
+        sample, products = self.range_sample(date_ids)
+        columns = ['name', 'profit_margin', 'profit_margin_low', 'profit_margin_high']
+        if len(sample) == 0:
+            return pd.DataFrame(columns=columns)
+        # The ratio of the average unit margin to the average unit price, with the variance of the ratio estimator
+        counts = np.bincount(products)
+        present = np.nonzero(counts)[0]
+        counts = counts[present]
+        prices = np.bincount(products, sample[:, SAMPLE_PRICE])[present] / counts
+        margins = np.bincount(products, sample[:, SAMPLE_MARGIN])[present] / counts
+        ratios = margins / prices
+        product_ratios = np.zeros(products.max() + 1)
+        product_ratios[present] = ratios
+        residuals = sample[:, SAMPLE_MARGIN] - product_ratios[products] * sample[:, SAMPLE_PRICE]
+        squares = np.bincount(products, residuals * residuals)[present]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            standard_errors = np.sqrt(squares / (counts - 1) / counts) / prices * self.correction
+        low, high = mean_interval(ratios, standard_errors)
+        names = dict(conn.execute("SELECT product_id, name FROM Products").fetchall())
+        df = pd.DataFrame({'name': [names[product_id] for product_id in present], 'profit_margin': ratios,
+                           'profit_margin_low': low, 'profit_margin_high': high})
+        return df.sort_values('profit_margin', ascending=False, kind='stable').reset_index(drop=True)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Refresh the sketches of the sales.")
+    parser.add_argument('--error', type=float, default=DEFAULT_ERROR, help="Relative error of the distinct counts and quantiles")
+    parser.add_argument('--sample-rate', type=float, default=DEFAULT_SAMPLE_RATE, help="Fraction of the sales sampled for averages")
+    args = parser.parse_args()
+    conn = connect(read_only=True)
+    try:
+        added = refresh_sketches(conn, SketchSettings(args.error, args.sample_rate))
+    finally:
+        conn.close()
+    manifest = read_manifest(SKETCH_DIR)
+    print(f"Sketched {added:,} new sales, {manifest['rows']:,} sales over {manifest['days']:,} days "
+          f"({manifest['samples']:,} sampled) in {SKETCH_DIR}")
@@ -38,12 +38,12 @@ def register_advanced_callbacks(app):
     def update_advanced_graphs_live(n_intervals, tab):
         if tab != 'tab-advanced':
             return [no_update] * 6
-        daily_profits_bollinger_bands = create_multi_line_chart(read_data_advanced('daily_profits_bollinger_bands.csv', sort_by='date', ascending=True), 'Bollinger Band on Daily Profits')
-        profit_forecasts = create_line_prediction_chart(read_data_advanced('profit_forecast.csv', sort_by='date', ascending=True), 'Profit Forecast')
-        product_profit_margins = create_bar_chart(read_data_advanced('product_profit_margins.csv', sort_by='profit_margin', ascending=False), 'Profit Margins per Product')
-        store_profit_margins = create_bar_chart(read_data_advanced('store_profit_margins.csv', sort_by='profit_margin', ascending=False), 'Profit Margins per Store')
-        rfm_score_distribution = create_rfm_score_distribution_chart(read_data_advanced('rfm_scores.csv'), 'RFM Score Distribution')
-        rfm_score_scatter_plot_matrix = create_scatter_matrix(read_data_advanced('rfm_scores.csv'), 'R-F-M Scatter Plot Matrix')
+        daily_profits_bollinger_bands = create_multi_line_chart(read_data_advanced('daily_profits_bollinger_bands', sort_by='date', ascending=True), 'Bollinger Band on Daily Profits')
+        profit_forecasts = create_line_prediction_chart(read_data_advanced('profit_forecast', sort_by='date', ascending=True), 'Profit Forecast')
+        product_profit_margins = create_bar_chart(read_data_advanced('product_profit_margins', sort_by='profit_margin', ascending=False), 'Profit Margins per Product')
+        store_profit_margins = create_bar_chart(read_data_advanced('store_profit_margins', sort_by='profit_margin', ascending=False), 'Profit Margins per Store')
+        rfm_score_distribution = create_rfm_score_distribution_chart(read_data_advanced('rfm_scores'), 'RFM Score Distribution')
+        rfm_score_scatter_plot_matrix = create_scatter_matrix(read_data_advanced('rfm_scores'), 'R-F-M Scatter Plot Matrix')
         return [
             daily_profits_bollinger_bands,
             profit_forecasts,
@@ -13,6 +13,7 @@ Functions:
     Generates a scatter plot matrix to visualize relationships between different RFM score components.
 5. create_bar_chart: 
     Creates a bar chart, adaptable for various types of data, with an option to handle datasets with more than two columns.
+    Error bounds of approximate results are drawn as error bars.
 6. render_advanced_view: 
     Organizes the above visualization components into a cohesive layout for the advanced analytics tab in the dashboard.
 
@@ -126,22 +127,23 @@ def create_scatter_matrix(data, title):
 # Function to create a bar chart
 def create_bar_chart(data, title):
     if data is not None:
-        if len(data.columns) > 2:
-            return {
-                'data': [go.Bar(x=data[data.columns[1]], y=data[data.columns[2]], name=title)],
-                'layout': {
-                    'title': title,
-                    'height': 500
-                }
-            }
+        # Approximate results carry the <column>_low and <column>_high bounds of their values, drawn as error bars
+        bounds = [column for column in data.columns if column.endswith(('_low', '_high'))]
+        values = data.drop(columns=bounds)
+        if len(values.columns) > 2:
+            x, y = values.columns[1], values.columns[2]
         else:
-            return {
-                'data': [go.Bar(x=data[data.columns[0]], y=data[data.columns[1]], name=title)],
-                'layout': {
-                    'title': title,
-                    'height': 500
-                }
+            x, y = values.columns[0], values.columns[1]
+        error_y = None
+        if f'{y}_low' in bounds and f'{y}_high' in bounds:
+            error_y = dict(type='data', symmetric=False, array=data[f'{y}_high'] - data[y], arrayminus=data[y] - data[f'{y}_low'])
+        return {
+            'data': [go.Bar(x=data[x], y=data[y], error_y=error_y, name=title)],
+            'layout': {
+                'title': title,
+                'height': 500
             }
+        }
     else:
         return {
             'data': [],
@@ -156,19 +158,19 @@ def render_advanced_view():
                 html.Div([
                     dcc.Graph(
                         id='daily-profits-bollinger-bands',
-                        figure=create_multi_line_chart(read_data_advanced('daily_profits_bollinger_bands.csv', sort_by='date', ascending=True), 'Bollinger Band, Daily Profits')
+                        figure=create_multi_line_chart(read_data_advanced('daily_profits_bollinger_bands', sort_by='date', ascending=True), 'Bollinger Band, Daily Profits')
                     )
                 ], className='grid-item'),
                 html.Div([
                     dcc.Graph(
                         id='profit-forecasts',
-                        figure=create_line_prediction_chart(read_data_advanced('profit_forecast.csv', sort_by='date', ascending=True), 'Profit Forecast')
+                        figure=create_line_prediction_chart(read_data_advanced('profit_forecast', sort_by='date', ascending=True), 'Profit Forecast')
                     )
                 ], className='grid-item'),
                 html.Div([
                     dcc.Graph(
                         id='product-profit-margins',
-                        figure=create_bar_chart(read_data_advanced('product_profit_margins.csv', sort_by='profit_margin', ascending=False), 'Profit Margins per Product')
+                        figure=create_bar_chart(read_data_advanced('product_profit_margins', sort_by='profit_margin', ascending=False), 'Profit Margins per Product')
                     )
                 ], className='grid-item'),
             ], className='row'),
@@ -178,19 +180,19 @@ def render_advanced_view():
                 html.Div([
                     dcc.Graph(
                         id='store-profit-margins',
-                        figure=create_bar_chart(read_data_advanced('store_profit_margins.csv', sort_by='profit_margin', ascending=False), 'Profit Margins per Store')
+                        figure=create_bar_chart(read_data_advanced('store_profit_margins', sort_by='profit_margin', ascending=False), 'Profit Margins per Store')
                     )
                 ], className='grid-item'),
                 html.Div([
                     dcc.Graph(
                         id='rfm-score-distribution',
-                        figure=create_rfm_score_distribution_chart(read_data_advanced('rfm_scores.csv'), 'RFM Score Distribution')
+                        figure=create_rfm_score_distribution_chart(read_data_advanced('rfm_scores'), 'RFM Score Distribution')
                     )
                 ], className='grid-item'),
                 html.Div([
                     dcc.Graph(
                         id='rfm-score-scatter-plot-matrix',
-                        figure=create_scatter_matrix(read_data_advanced('rfm_scores.csv'), 'R-F-M Scatter Plot Matrix')
+                        figure=create_scatter_matrix(read_data_advanced('rfm_scores'), 'R-F-M Scatter Plot Matrix')
                     )
                 ], className='grid-item'),
             ], className='row'),
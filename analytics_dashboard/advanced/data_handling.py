@@ -1,13 +1,13 @@
 """
 This script, data_handling.py, handles data operations for the advanced analytics section of the OrestisCompany analytics dashboard. 
-Its primary role is to read and process CSV files that store advanced analytics data, providing vital information for visualization and analysis.
+Its primary role is to read and process the output files that store advanced analytics data, providing vital information for visualization and analysis.
 
 Functionality:
 1. read_data_advanced: 
-    Reads CSV files from the '/app/data/analytics/advanced' directory. It includes an option to sort the data based on specified columns, enhancing the flexibility and utility of the data retrieval process.
+    Reads output files from the '/app/data/analytics/advanced' directory, memory-mapping their typed Feather files and falling back to CSV files (see analytics/output_format.py), so dates are read as dates without re-inferring dtypes on every refresh. It includes an option to sort the data based on specified columns, enhancing the flexibility and utility of the data retrieval process.
 
 Key Parameters:
-- file_name: The name of the CSV file to be read.
+- file_name: The name of the output to be read, without extension.
 - sort_by: Optional. The column name based on which the data frame should be sorted.
 - ascending: Optional. A boolean that determines the sorting order (ascending by default).
 
@@ -15,16 +15,15 @@ The function attempts to read the specified file from the advanced analytics dat
 
 Usage:
     To read and optionally sort an advanced analytics data file, use:
-    df = read_data_advanced('file_name.csv', sort_by='column_name', ascending=True/False)
+    df = read_data_advanced('file_name', sort_by='column_name', ascending=True/False)
 """
 
-import pandas as pd
-import os
+from analytics.output_format import read_output
 
 def read_data_advanced(file_name, sort_by=None, ascending=True):
     DATA_DIR = '/app/data/analytics/advanced'
     try:
-        df = pd.read_csv(os.path.join(DATA_DIR, file_name))
+        df = read_output(DATA_DIR, file_name)
         if sort_by and sort_by in df.columns:
             df = df.sort_values(by=sort_by, ascending=ascending)
         return df
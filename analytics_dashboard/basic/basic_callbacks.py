@@ -43,15 +43,15 @@ def register_basic_callbacks(app):
     def update_basic_graphs_live(n_intervals, tab):
         if tab != 'tab-basic':  # If it's not the basic tab, return no update
             return [no_update] * 9
-        total_sales = create_indicator(read_data_basic('total_sales.csv'), 'Total Sales')
-        sales_by_region = create_bar_chart(read_data_basic('sales_by_region.csv', sort_by='sales_by_region', ascending=False), 'Sales by Region')
-        sales_by_product = create_bar_chart(read_data_basic('sales_by_product.csv', sort_by='sales_by_product', ascending=False), 'Sales by Product')
-        profit_total = create_indicator(read_data_basic('profit_total.csv'), 'Profit Total')
-        profit_by_region = create_bar_chart(read_data_basic('profit_by_region.csv', sort_by='profit_by_region', ascending=False), 'Profit by Region')
-        profit_by_product = create_bar_chart(read_data_basic('profit_by_product.csv', sort_by='profit_by_product', ascending=False), 'Profit by Product')
-        top_selling_products = create_bar_chart(read_data_basic('top_selling_products.csv', sort_by='total_sales', ascending=False), 'Top Selling Products')
-        top_customers = create_bar_chart(read_data_basic('top_customers.csv', sort_by='total_spent', ascending=False), 'Top Customers')
-        top_stores_by_sales = create_bar_chart(read_data_basic('top_stores_by_sales.csv', sort_by='total_sales', ascending=False), 'Top Stores by Sales')
+        total_sales = create_indicator(read_data_basic('total_sales'), 'Total Sales')
+        sales_by_region = create_bar_chart(read_data_basic('sales_by_region', sort_by='sales_by_region', ascending=False), 'Sales by Region')
+        sales_by_product = create_bar_chart(read_data_basic('sales_by_product', sort_by='sales_by_product', ascending=False), 'Sales by Product')
+        profit_total = create_indicator(read_data_basic('profit_total'), 'Profit Total')
+        profit_by_region = create_bar_chart(read_data_basic('profit_by_region', sort_by='profit_by_region', ascending=False), 'Profit by Region')
+        profit_by_product = create_bar_chart(read_data_basic('profit_by_product', sort_by='profit_by_product', ascending=False), 'Profit by Product')
+        top_selling_products = create_bar_chart(read_data_basic('top_selling_products', sort_by='total_sales', ascending=False), 'Top Selling Products')
+        top_customers = create_bar_chart(read_data_basic('top_customers', sort_by='total_spent', ascending=False), 'Top Customers')
+        top_stores_by_sales = create_bar_chart(read_data_basic('top_stores_by_sales', sort_by='total_sales', ascending=False), 'Top Stores by Sales')
 
         return [
             total_sales,
@@ -62,19 +62,19 @@ def render_basic_view():
                 html.Div([
                     dcc.Graph(
                         id='total-sales',
-                        figure=create_indicator(read_data_basic('total_sales.csv'), 'Total Sales')
+                        figure=create_indicator(read_data_basic('total_sales'), 'Total Sales')
                     )
                 ], className='grid-item'),
                 html.Div([
                     dcc.Graph(
                         id='sales-by-region',
-                        figure=create_bar_chart(read_data_basic('sales_by_region.csv', sort_by='sales_by_region', ascending=False), 'Sales by Region')
+                        figure=create_bar_chart(read_data_basic('sales_by_region', sort_by='sales_by_region', ascending=False), 'Sales by Region')
                     )
                 ], className='grid-item'),
                 html.Div([
                     dcc.Graph(
                         id='sales-by-product',
-                        figure=create_bar_chart(read_data_basic('sales_by_product.csv', sort_by='sales_by_product', ascending=False), 'Sales by Product')
+                        figure=create_bar_chart(read_data_basic('sales_by_product', sort_by='sales_by_product', ascending=False), 'Sales by Product')
                     )
                 ], className='grid-item'),
             ], className='row'),
@@ -84,19 +84,19 @@ def render_basic_view():
                 html.Div([
                     dcc.Graph(
                         id='profit-total',
-                        figure=create_indicator(read_data_basic('profit_total.csv'), 'Profit Total')
+                        figure=create_indicator(read_data_basic('profit_total'), 'Profit Total')
                     )
                 ], className='grid-item'),
                 html.Div([
                     dcc.Graph(
                         id='profit-by-region',
-                        figure=create_bar_chart(read_data_basic('profit_by_region.csv', sort_by='profit_by_region', ascending=False), 'Profit by Region')
+                        figure=create_bar_chart(read_data_basic('profit_by_region', sort_by='profit_by_region', ascending=False), 'Profit by Region')
                     )
                 ], className='grid-item'),
                 html.Div([
                     dcc.Graph(
                         id='profit-by-product',
-                        figure=create_bar_chart(read_data_basic('profit_by_product.csv', sort_by='profit_by_product', ascending=False), 'Profit by Product')
+                        figure=create_bar_chart(read_data_basic('profit_by_product', sort_by='profit_by_product', ascending=False), 'Profit by Product')
                     )
                 ], className='grid-item'),
             ], className='row'),
@@ -106,19 +106,19 @@ def render_basic_view():
                 html.Div([
                     dcc.Graph(
                         id='top-selling-products',
-                        figure=create_bar_chart(read_data_basic('top_selling_products.csv', sort_by='total_sales', ascending=False), 'Top Selling Products')
+                        figure=create_bar_chart(read_data_basic('top_selling_products', sort_by='total_sales', ascending=False), 'Top Selling Products')
                     )
                 ], className='grid-item'),
                 html.Div([
                     dcc.Graph(
                         id='top-customers',
-                        figure=create_bar_chart(read_data_basic('top_customers.csv', sort_by='total_spent', ascending=False), 'Top Customers')
+                        figure=create_bar_chart(read_data_basic('top_customers', sort_by='total_spent', ascending=False), 'Top Customers')
                     )
                 ], className='grid-item'),
                 html.Div([
                     dcc.Graph(
                         id='top-stores-by-sales',
-                        figure=create_bar_chart(read_data_basic('top_stores_by_sales.csv', sort_by='total_sales', ascending=False), 'Top Stores by Sales')
+                        figure=create_bar_chart(read_data_basic('top_stores_by_sales', sort_by='total_sales', ascending=False), 'Top Stores by Sales')
                     )
                 ], className='grid-item'),
             ], className='row'),
@@ -1,14 +1,15 @@
 """
 This script, data_handling.py, is dedicated to handling data operations for the basic analytics part of the OrestisCompany analytics dashboard. 
-It primarily focuses on reading and processing CSV files that contain basic analytics data.
+It primarily focuses on reading and processing the output files that contain basic analytics data.
 
 Functionality:
 1. read_data_basic: 
-    Reads CSV files from the '/app/data/analytics/basic' directory. 
+    Reads output files from the '/app/data/analytics/basic' directory, memory-mapping their typed Feather files
+    and falling back to CSV files (see analytics/output_format.py), without re-inferring dtypes on every refresh. 
     It offers optional sorting functionality based on specified columns. 
 
 Key Parameters:
-- file_name: The name of the CSV file to be read.
+- file_name: The name of the output to be read, without extension.
 - sort_by: Optional. The column name on which the data frame should be sorted.
 - ascending: Optional. A boolean that defines the sorting order (ascending or descending).
 
@@ -16,16 +17,15 @@ The function tries to read the specified file and, if sorting parameters are pro
 
 Usage:
     To read and optionally sort a basic analytics data file, call:
-    df = read_data_basic('file_name.csv', sort_by='column_name', ascending=True/False)
+    df = read_data_basic('file_name', sort_by='column_name', ascending=True/False)
 """
 
-import pandas as pd
-import os
+from analytics.output_format import read_output
 
 def read_data_basic(file_name, sort_by=None, ascending=False):
     DATA_DIR = '/app/data/analytics/basic'
     try:
-        df = pd.read_csv(os.path.join(DATA_DIR, file_name))
+        df = read_output(DATA_DIR, file_name)
         if sort_by and sort_by in df.columns:
             df = df.sort_values(by=sort_by, ascending=ascending)
         return df
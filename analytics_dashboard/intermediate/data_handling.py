@@ -1,14 +1,15 @@
 """
 This script, data_handling.py, is focused on data operations for the intermediate analytics part of the OrestisCompany analytics dashboard. 
-It handles the reading and optional sorting of CSV files containing intermediate analytics data.
+It handles the reading and optional sorting of the output files containing intermediate analytics data.
 
 Functionality:
 1. read_data_intermediate: 
-    Reads CSV files from the '/app/data/analytics/intermediate' directory. 
+    Reads output files from the '/app/data/analytics/intermediate' directory, memory-mapping their typed Feather files
+    and falling back to CSV files (see analytics/output_format.py), without re-inferring dtypes on every refresh. 
     It provides the capability to sort the data based on specified columns, including a special sorting feature for the 'weekday' column.
 
 Key Parameters:
-- file_name: The name of the CSV file to be read.
+- file_name: The name of the output to be read, without extension.
 - sort_by: Optional. The column name on which the data frame should be sorted. Special handling is included for sorting by the 'weekday' column.
 - ascending: Optional. A boolean that defines the sorting order (ascending or descending).
 
@@ -19,16 +20,17 @@ This functionality is key in preparing intermediate analytics data for visualiza
 
 Usage:
     To read and optionally sort an intermediate analytics data file, use:
-    df = read_data_intermediate('file_name.csv', sort_by='column_name', ascending=True/False)
+    df = read_data_intermediate('file_name', sort_by='column_name', ascending=True/False)
 """
 
 import pandas as pd
-import os
+
+from analytics.output_format import read_output
 
 def read_data_intermediate(file_name, sort_by=None, ascending=False):
     DATA_DIR = '/app/data/analytics/intermediate'
     try:
-        df = pd.read_csv(os.path.join(DATA_DIR, file_name))
+        df = read_output(DATA_DIR, file_name)
 
         # Check if we need to sort by weekday and if 'weekday' is a column
         if sort_by == 'weekday' and 'weekday' in df.columns:
@@ -39,11 +39,11 @@ def register_intermediate_callbacks(app):
         if tab != 'tab-intermediate':
             return [no_update] * 5
         print("Updating intermediate graphs")
-        avg_purchase = create_indicator(read_data_intermediate('avg_purchase.csv'),'Avg Purchase Value')
-        avg_sales_by_weekday = create_line_chart(read_data_intermediate('avg_sales_by_weekday.csv', sort_by='weekday', ascending=True), 'Avg Sales by Weekday')
-        avg_purchase_frequency = create_indicator(read_data_intermediate('avg_purchase_frequency.csv'), 'Avg Purchase Frequency')
-        monthly_sales_trend = create_line_chart(read_data_intermediate('monthly_sales_trend.csv', sort_by='YearMonth', ascending=True), 'Monthly Sales Trend')
-        sales_by_day_of_month = create_line_chart(read_data_intermediate('sales_by_day_of_month.csv', sort_by='day', ascending=True), 'Sales by Day of Month')
+        avg_purchase = create_indicator(read_data_intermediate('avg_purchase'),'Avg Purchase Value')
+        avg_sales_by_weekday = create_line_chart(read_data_intermediate('avg_sales_by_weekday', sort_by='weekday', ascending=True), 'Avg Sales by Weekday')
+        avg_purchase_frequency = create_indicator(read_data_intermediate('avg_purchase_frequency'), 'Avg Purchase Frequency')
+        monthly_sales_trend = create_line_chart(read_data_intermediate('monthly_sales_trend', sort_by='YearMonth', ascending=True), 'Monthly Sales Trend')
+        sales_by_day_of_month = create_line_chart(read_data_intermediate('sales_by_day_of_month', sort_by='day', ascending=True), 'Sales by Day of Month')
         
         return [
             avg_purchase,
@@ -63,19 +63,19 @@ def render_intermediate_view():
                 html.Div([
                     dcc.Graph(
                         id='avg-purchase',
-                        figure=create_indicator(read_data_intermediate('avg_purchase.csv'), 'Avg Purchase Value')
+                        figure=create_indicator(read_data_intermediate('avg_purchase'), 'Avg Purchase Value')
                     )
                 ], className='grid-item'),
                 html.Div([
                     dcc.Graph(
                         id='avg-sales-by-weekday',
-                        figure=create_line_chart(read_data_intermediate('avg_sales_by_weekday.csv', sort_by='weekday', ascending=True), 'Avg Sales by Weekday')
+                        figure=create_line_chart(read_data_intermediate('avg_sales_by_weekday', sort_by='weekday', ascending=True), 'Avg Sales by Weekday')
                     )
                 ], className='grid-item'),
                 html.Div([
                     dcc.Graph(
                         id='customer-frequency',
-                        figure=create_indicator(read_data_intermediate('avg_purchase_frequency.csv'), 'Avg Purchase Frequency')
+                        figure=create_indicator(read_data_intermediate('avg_purchase_frequency'), 'Avg Purchase Frequency')
                     )
                 ], className='grid-item'),
             ], className='row'),
@@ -85,13 +85,13 @@ def render_intermediate_view():
                 html.Div([
                     dcc.Graph(
                         id='monthly-sales-trend',
-                        figure=create_line_chart(read_data_intermediate('monthly_sales_trend.csv', sort_by='YearMonth', ascending=True), 'Monthly Sales Trend')
+                        figure=create_line_chart(read_data_intermediate('monthly_sales_trend', sort_by='YearMonth', ascending=True), 'Monthly Sales Trend')
                     )
                 ], className='grid-item'),
                 html.Div([
                     dcc.Graph(
                         id='sales-by-day-of-month',
-                        figure=create_line_chart(read_data_intermediate('sales_by_day_of_month.csv', sort_by='day', ascending=True), 'Sales by Day of Month')
+                        figure=create_line_chart(read_data_intermediate('sales_by_day_of_month', sort_by='day', ascending=True), 'Sales by Day of Month')
                     )
                 ], className='grid-item'),
             ], className='row'),
@@ -0,0 +1,116 @@
+"""
+This module, connection.py, is the single place where the OrestisCompany SQLite database is opened.
+The CLI, the loaders and the analytics all get their connections from here instead of calling sqlite3.connect themselves.
+
+Key Features:
+1. WAL Mode:
+    Writer connections switch the database to write-ahead logging (a persistent setting of the file),
+    so analytics readers never block a loading writer and vice versa.
+2. Read-Only Analytics Connections:
+    Readers open the database as a read-only `file:` URI with a large mmap_size, a larger page cache and
+    temp_store=MEMORY for the sorts and temp B-trees of the GROUP BY queries.
+3. Connection Reuse:
+    get_connection caches one connection per thread and mode, so a process reuses it across commands
+    instead of reconnecting. A cached connection is reopened if the database file was replaced (e.g. by reset_db).
+4. Diagnostics:
+    connection_settings reports the effective settings of a connection.
+
+The database path defaults to /app/data/orestiscompanydb.sqlite and can be overridden with ORESTIS_DB_PATH.
+
+Usage:
+    conn = get_connection(read_only=True)
+    print(connection_settings(conn))
+"""
+
+import os
+import sqlite3
+import threading
+
+DB_PATH = os.environ.get('ORESTIS_DB_PATH', '/app/data/orestiscompanydb.sqlite')
+
+# Wait this long (ms) for a lock instead of failing immediately
+BUSY_TIMEOUT_MS = 5000
+WRITER_PRAGMAS = {
+    'journal_mode': 'WAL',
+    # NORMAL is durable enough in WAL mode and avoids an fsync per transaction
+    'synchronous': 'NORMAL',
+    'busy_timeout': BUSY_TIMEOUT_MS,
+}
+READER_PRAGMAS = {
+    'mmap_size': 256 * 1024 * 1024,
+    # Negative cache_size is in KiB, i.e. 64MB
+    'cache_size': -64 * 1024,
+    'temp_store': 'MEMORY',
+    'busy_timeout': BUSY_TIMEOUT_MS,
+}
+DIAGNOSTIC_PRAGMAS = ['journal_mode', 'synchronous', 'mmap_size', 'cache_size', 'temp_store', 'busy_timeout', 'page_size', 'query_only']
+
+_local = threading.local()
+
+def connect(db_path=None, read_only=False, check_same_thread=True):
+    """
+    Open a new connection with the writer or reader settings applied.
+    check_same_thread=False lets another thread close a connection that one worker thread uses.
+    """
+    db_path = db_path or DB_PATH
+    if read_only:
+        conn = sqlite3.connect(f'file:{db_path}?mode=ro', uri=True, check_same_thread=check_same_thread)
+        pragmas = READER_PRAGMAS
+    else:
+        conn = sqlite3.connect(db_path, check_same_thread=check_same_thread)
+        pragmas = WRITER_PRAGMAS
+    for name, value in pragmas.items():
+        conn.execute(f'PRAGMA {name} = {value}')
+    return conn
+
+def _file_id(db_path):
+    stat = os.stat(db_path)
+    return stat.st_dev, stat.st_ino
+
+def get_connection(read_only=False, db_path=None):
+    """
+    Return this thread's cached connection for db_path and mode, opening it on first use.
+    The connection is reopened if the database file was deleted or replaced since it was opened.
+    """
+    db_path = db_path or DB_PATH
+    cache = getattr(_local, 'connections', None)
+    if cache is None:
+        cache = _local.connections = {}
+    key = (db_path, read_only)
+    cached = cache.get(key)
+    try:
+        file_id = _file_id(db_path)
+    except FileNotFoundError:
+        file_id = None
+    if cached is not None:
+        conn, cached_file_id = cached
+        if file_id is not None and file_id == cached_file_id:
+            return conn
+        conn.close()
+        del cache[key]
+    conn = connect(db_path, read_only)
+    cache[key] = (conn, file_id if file_id is not None else _file_id(db_path))
+    return conn
+
+def close_connections():
+    """Close every connection cached by the current thread."""
+    cache = getattr(_local, 'connections', {})
+    for conn, _ in cache.values():
+        conn.close()
+    cache.clear()
+
+def connection_settings(conn):
+    """Return the effective settings of a connection for diagnostics."""
+    settings = {}
+    for name in DIAGNOSTIC_PRAGMAS:
+        row = conn.execute(f'PRAGMA {name}').fetchone()
+        settings[name] = row[0] if row else None
+    settings['database'] = conn.execute('PRAGMA database_list').fetchone()[2]
+    settings['sqlite_version'] = sqlite3.sqlite_version
+    return settings
+
+if __name__ == "__main__":
+    for read_only in (False, True):
+        print('reader' if read_only else 'writer')
+        for name, value in connection_settings(connect(read_only=read_only)).items():
+            print(f"    {name:<15} {value}")
@@ -0,0 +1,160 @@
+"""
+This module, partitions.py, splits the Sales fact table into per-month partitions.
+
+Layout:
+    Every closed month (any month before the month of the latest date in DateInfo) is moved out of Sales into its
+    own table Sales_YYYY_MM with the same columns and a covering index. Sales itself stays the "hot" table that
+    populate_db, load_sales and append_sales keep inserting into, so the loaders are unchanged. The SalesPartitions
+    catalog records the date_id range of every partition, and the SalesAll view is the UNION ALL of Sales and all
+    partitions for ad-hoc queries over the full history.
+
+Closed partitions are read-only: triggers reject any INSERT, UPDATE or DELETE on them. Sales of a closed month that
+arrive late simply land in Sales, which is always read, so results never depend on when a row was partitioned.
+
+Partition Pruning:
+    sales_source returns the FROM clause source for a date_id range: plain `Sales` when the database is not
+    partitioned, otherwise a UNION ALL of only the tables overlapping the range, aliased as Sales so the analytics
+    queries stay the same. A one-month query reads its partition directly instead of the full history.
+
+Usage:
+    conn = connect()
+    partition_closed_months(conn)
+    query = f"SELECT COUNT(*) FROM {sales_source(conn, date_ids)} WHERE Sales.date_id BETWEEN ? AND ?"
+"""
+
+SALES_COLUMNS = "sale_id, date_id, store_id, product_id, customer_id, quantity, unit_price"
+
+CATALOG_TABLE = "SalesPartitions"
+SALES_VIEW = "SalesAll"
+
+def partition_name(month):
+    """Table name of the partition of month 'YYYY-MM'."""
+    return f"Sales_{month.replace('-', '_')}"
+
+def ensure_catalog(conn):
+    """Create the SalesPartitions catalog of migration 002 if it has not been applied yet."""
+    conn.execute(f'''
+        CREATE TABLE IF NOT EXISTS {CATALOG_TABLE} (
+            partition_name TEXT PRIMARY KEY,
+            month TEXT NOT NULL UNIQUE,
+            first_date_id INTEGER NOT NULL,
+            last_date_id INTEGER NOT NULL,
+            row_count INTEGER NOT NULL,
+            created_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+def list_partitions(conn):
+    """Return the (partition_name, first_date_id, last_date_id) of every partition in month order."""
+    exists = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (CATALOG_TABLE,)
+    ).fetchone()
+    if not exists:
+        return []
+    return conn.execute(
+        f"SELECT partition_name, first_date_id, last_date_id FROM {CATALOG_TABLE} ORDER BY month"
+    ).fetchall()
+
+def sales_source(conn, date_ids=None):
+    """
+    Return the FROM clause source of Sales for the (min_date_id, max_date_id) range, reading only
+    the partitions overlapping it. date_ids=None reads every partition.
+    """
+    partitions = list_partitions(conn)
+    if not partitions:
+        return "Sales"
+    tables = ["Sales"] + [name for name, _, _ in partitions]
+    if date_ids is not None:
+        min_date_id, max_date_id = date_ids
+        tables = [name for name, first_date_id, last_date_id in partitions
+                  if first_date_id <= max_date_id and last_date_id >= min_date_id]
+        # Sales only holds the open month and late arrivals, skip it if none fall in the range
+        if conn.execute(
+            "SELECT 1 FROM Sales WHERE date_id BETWEEN ? AND ? LIMIT 1", (min_date_id, max_date_id)
+        ).fetchone() or not tables:
+            tables.insert(0, "Sales")
+    if len(tables) == 1:
+        # A single table is read directly, a UNION ALL subquery has to be materialized or run as a co-routine
+        return tables[0] if tables[0] == "Sales" else f"{tables[0]} AS Sales"
+    union = "\n        UNION ALL ".join(f"SELECT {SALES_COLUMNS} FROM {table}" for table in tables)
+    return f"(\n        {union}\n    ) AS Sales"
+
+def rebuild_sales_view(conn):
+    """Re-create the SalesAll view over Sales and every partition."""
+    conn.execute(f"DROP VIEW IF EXISTS {SALES_VIEW}")
+    tables = ["Sales"] + [name for name, _, _ in list_partitions(conn)]
+    union = "\nUNION ALL ".join(f"SELECT {SALES_COLUMNS} FROM {table}" for table in tables)
+    conn.execute(f"CREATE VIEW {SALES_VIEW} AS\n{union}")
+
+def closed_months(conn):
+    """Return the months before the month of the latest date in DateInfo that still have sales in Sales."""
+    return [r[0] for r in conn.execute('''
+        SELECT DISTINCT substr(DateInfo.date, 1, 7) AS month
+        FROM DateInfo
+        WHERE substr(DateInfo.date, 1, 7) < (SELECT substr(MAX(date), 1, 7) FROM DateInfo)
+          AND EXISTS (SELECT 1 FROM Sales WHERE Sales.date_id = DateInfo.date_id)
+        ORDER BY month
+    ''')]
+
+def partition_month(conn, month):
+    """
+    Move the sales of month 'YYYY-MM' from Sales into its partition and make it read-only.
+    A month that was already partitioned is left alone. Returns the number of moved sales.
+    """
+    ensure_catalog(conn)
+    name = partition_name(month)
+    if conn.execute(f"SELECT 1 FROM {CATALOG_TABLE} WHERE month = ?", (month,)).fetchone():
+        return 0
+    first_date_id, last_date_id = conn.execute(
+        "SELECT MIN(date_id), MAX(date_id) FROM DateInfo WHERE date LIKE ?", (f"{month}-%",)
+    ).fetchone()
+    if first_date_id is None:
+        return 0
+    # Select by the month's dates rather than the date_id range, which may not be contiguous
+    month_filter = "date_id IN (SELECT date_id FROM DateInfo WHERE date LIKE ?)"
+    with conn:
+        # Python's sqlite3 doesn't open a transaction for DDL, so begin explicitly to make the move atomic
+        conn.execute("BEGIN")
+        conn.execute(f'''
+            CREATE TABLE {name} (
+                sale_id INTEGER PRIMARY KEY,
+                date_id INTEGER,
+                store_id INTEGER,
+                product_id INTEGER,
+                customer_id INTEGER,
+                quantity INTEGER NOT NULL CHECK (quantity > 0),
+                unit_price REAL NOT NULL CHECK (unit_price >= 0),
+                FOREIGN KEY (date_id) REFERENCES DateInfo(date_id),
+                FOREIGN KEY (store_id) REFERENCES Stores(store_id),
+                FOREIGN KEY (product_id) REFERENCES Products(product_id),
+                FOREIGN KEY (customer_id) REFERENCES Customers(customer_id)
+            )
+        ''')
+        moved = conn.execute(
+            f"INSERT INTO {name} SELECT {SALES_COLUMNS} FROM Sales WHERE {month_filter} ORDER BY sale_id",
+            (f"{month}-%",)
+        ).rowcount
+        conn.execute(f"DELETE FROM Sales WHERE {month_filter}", (f"{month}-%",))
+        # Same layout as idx_sales_covering, built once on the final data
+        conn.execute(
+            f"CREATE INDEX idx_partition_{name[len('Sales_'):]}_covering "
+            f"ON {name}(date_id, store_id, product_id, customer_id, quantity, unit_price)"
+        )
+        for operation in ('INSERT', 'UPDATE', 'DELETE'):
+            conn.execute(f'''
+                CREATE TRIGGER {name}_read_only_{operation.lower()} BEFORE {operation} ON {name}
+                BEGIN
+                    SELECT RAISE(ABORT, 'Sales partition {month} is closed and read-only');
+                END
+            ''')
+        conn.execute(
+            f"INSERT INTO {CATALOG_TABLE}(partition_name, month, first_date_id, last_date_id, row_count) "
+            "VALUES (?, ?, ?, ?, ?)",
+            (name, month, first_date_id, last_date_id, moved)
+        )
+        rebuild_sales_view(conn)
+    return moved
+
+def partition_closed_months(conn):
+    """Partition every closed month and return the {month: moved sales} of the new partitions."""
+    return {month: partition_month(conn, month) for month in closed_months(conn)}
@@ -2,4 +2,4 @@
 set -e
 
 # Run the python script that pre-computes and stores basic analytics 
-python3 /app/analytics/advanced_analytics.py $1 $2
+python3 /app/analytics/advanced_analytics.py "$@"
@@ -0,0 +1,5 @@
+#!/bin/bash
+set -e
+
+# Call the Python script that appends new sales to the database
+python /app/src/append_sales.py "$@"
@@ -0,0 +1,5 @@
+#!/bin/bash
+set -e
+
+# Call the Python script that refreshes the memory-mapped columnar copy of the Sales fact
+python3 /app/analytics/columnar.py
@@ -3,3 +3,6 @@ set -e
 
 # Run the SQL script that sets up the database schema
 sqlite3 /app/data/orestiscompanydb.sqlite < /app/sql/init.sql
+
+# Apply the versioned schema migrations on top of it
+python /app/src/migrations.py
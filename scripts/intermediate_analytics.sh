@@ -2,4 +2,4 @@
 set -e
 
 # Run the python script that pre-computes and stores intermediate analytics 
-python3 /app/analytics/intermediate_analytics.py $1 $2
\ No newline at end of file
+python3 /app/analytics/intermediate_analytics.py "$@"
\ No newline at end of file
@@ -0,0 +1,5 @@
+#!/bin/bash
+set -e
+
+# Call the Python script that bulk loads a sales CSV export into the database
+python /app/src/load_sales.py "$@"
@@ -0,0 +1,5 @@
+#!/bin/bash
+set -e
+
+# Call the Python script that moves the closed months of Sales into read-only partitions
+python /app/src/partition_sales.py "$@"
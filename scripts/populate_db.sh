@@ -2,4 +2,4 @@
 set -e
 
 # Call the Python script that populates the database
-python /app/src/populate_db.py
+python /app/src/populate_db.py "$@"
@@ -1,14 +1,41 @@
 #!/bin/bash
 
+# Split the snapshot flags from the populate_db.py args (--rows, --seed, --workers, --batch-size)
+POPULATE_ARGS=()
+COMPRESS=""
+USE_SNAPSHOT=1
+for arg in "$@"; do
+    case "$arg" in
+        --compress) COMPRESS="--compress" ;;
+        --no-snapshot) USE_SNAPSHOT=0 ;;
+        *) POPULATE_ARGS+=("$arg") ;;
+    esac
+done
+
 # Adjust permissions for the data directory
 mkdir -p /app/data
 chmod 777 /app/data
 
-# Remove the existing database file
-rm -f /app/data/orestiscompanydb.sqlite
+DB=/app/data/orestiscompanydb.sqlite
+
+# Remove the existing database file, with the WAL and shared memory files a reader may have left next to it
+rm -f "$DB" "$DB"-wal "$DB"-shm
+
+# Fast path: restore the snapshot saved for the same seed, rows and schema if there is one
+if [ "$USE_SNAPSHOT" -eq 1 ] && python /app/src/snapshot.py restore "${POPULATE_ARGS[@]}"; then
+    exit 0
+fi
+
+set -e
 
 # Initialize the database using init.sql
-sqlite3 /app/data/orestiscompanydb.sqlite < /app/sql/init.sql
+sqlite3 "$DB" < /app/sql/init.sql
+python /app/src/migrations.py
 
 # Run the database population script
-python /app/src/populate_db.py
+python /app/src/populate_db.py "${POPULATE_ARGS[@]}"
+
+# Save a snapshot so the next reset with the same parameters is a restore (skipped without --seed and --rows)
+if [ "$USE_SNAPSHOT" -eq 1 ]; then
+    python /app/src/snapshot.py save "${POPULATE_ARGS[@]}" $COMPRESS || true
+fi
@@ -10,6 +10,8 @@
     - `customers`: Dimension table containing customer information.
     - `date_info`: Dimension table designed to support date-based analytics. Contains various date attributes to facilitate time-based querying.
     - `sales`: Fact table that logs each sale, capturing the sale price, the product, customer, store, and the date of the transaction.
+    - `load_watermarks`: Bookkeeping table recording the max sale_id and date_id after every incremental append,
+      so downstream analytics can process only the appended delta.
 
     The schema is designed to be extensible. As business needs evolve, additional dimensions or measures can be easily integrated.
 
@@ -72,6 +74,16 @@ CREATE TABLE IF NOT EXISTS Sales (
     FOREIGN KEY (customer_id) REFERENCES Customers(customer_id)
 );
 
+-- High-water marks recorded by incremental appends (append_sales)
+CREATE TABLE IF NOT EXISTS LoadWatermarks (
+    watermark_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    loaded_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    source TEXT NOT NULL,                   -- 'generated' or the path of the appended sales export
+    rows_appended INTEGER NOT NULL,
+    max_sale_id INTEGER NOT NULL,
+    max_date_id INTEGER NOT NULL
+);
+
 -- Indexing foreign keys in the fact table
 CREATE INDEX IF NOT EXISTS idx_sales_date ON Sales(date_id);
 CREATE INDEX IF NOT EXISTS idx_sales_store ON Sales(store_id);
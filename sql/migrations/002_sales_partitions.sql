@@ -0,0 +1,20 @@
+/*
+    Migration 002: catalog and full-history view of the per-month Sales partitions.
+
+    src/partition_sales.py moves every closed month of Sales into a read-only Sales_YYYY_MM partition
+    (see database/partitions.py). SalesPartitions records the date_id range of every partition, which the
+    analytics use to read only the partitions overlapping the requested dates. SalesAll is the UNION ALL of
+    Sales and every partition; it starts out as Sales alone and is re-created whenever a month is partitioned.
+*/
+
+CREATE TABLE IF NOT EXISTS SalesPartitions (
+    partition_name TEXT PRIMARY KEY,        -- Sales_YYYY_MM
+    month TEXT NOT NULL UNIQUE,             -- YYYY-MM
+    first_date_id INTEGER NOT NULL,
+    last_date_id INTEGER NOT NULL,
+    row_count INTEGER NOT NULL,
+    created_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE VIEW IF NOT EXISTS SalesAll AS
+SELECT sale_id, date_id, store_id, product_id, customer_id, quantity, unit_price FROM Sales;
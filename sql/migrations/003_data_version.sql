@@ -0,0 +1,40 @@
+/*
+    Migration 003: write counter of the data the analytics read.
+
+    The data fingerprint of analytics/engines.py (row counts, max ids and edge rows of every table) catches every
+    load, append and reset, but not an in-place UPDATE or DELETE of a row in the middle of a table, so the result
+    cache and the DuckDB mirror would keep serving the old data. DataVersion holds a single counter that the
+    triggers below bump on every UPDATE or DELETE of Sales and of the dimension tables, and that is part of the
+    fingerprint. Inserts already change the row counts and max ids, so they don't pay for a trigger.
+*/
+
+CREATE TABLE IF NOT EXISTS DataVersion (
+    version INTEGER NOT NULL
+);
+
+INSERT INTO DataVersion (version) SELECT 0 WHERE NOT EXISTS (SELECT 1 FROM DataVersion);
+
+CREATE TRIGGER IF NOT EXISTS sales_update_data_version AFTER UPDATE ON Sales
+BEGIN UPDATE DataVersion SET version = version + 1; END;
+CREATE TRIGGER IF NOT EXISTS sales_delete_data_version AFTER DELETE ON Sales
+BEGIN UPDATE DataVersion SET version = version + 1; END;
+
+CREATE TRIGGER IF NOT EXISTS stores_update_data_version AFTER UPDATE ON Stores
+BEGIN UPDATE DataVersion SET version = version + 1; END;
+CREATE TRIGGER IF NOT EXISTS stores_delete_data_version AFTER DELETE ON Stores
+BEGIN UPDATE DataVersion SET version = version + 1; END;
+
+CREATE TRIGGER IF NOT EXISTS products_update_data_version AFTER UPDATE ON Products
+BEGIN UPDATE DataVersion SET version = version + 1; END;
+CREATE TRIGGER IF NOT EXISTS products_delete_data_version AFTER DELETE ON Products
+BEGIN UPDATE DataVersion SET version = version + 1; END;
+
+CREATE TRIGGER IF NOT EXISTS customers_update_data_version AFTER UPDATE ON Customers
+BEGIN UPDATE DataVersion SET version = version + 1; END;
+CREATE TRIGGER IF NOT EXISTS customers_delete_data_version AFTER DELETE ON Customers
+BEGIN UPDATE DataVersion SET version = version + 1; END;
+
+CREATE TRIGGER IF NOT EXISTS date_info_update_data_version AFTER UPDATE ON DateInfo
+BEGIN UPDATE DataVersion SET version = version + 1; END;
+CREATE TRIGGER IF NOT EXISTS date_info_delete_data_version AFTER DELETE ON DateInfo
+BEGIN UPDATE DataVersion SET version = version + 1; END;
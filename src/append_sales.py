@@ -0,0 +1,162 @@
+"""
+This script, append_sales.py, incrementally appends sales to an existing OrestisCompany database,
+instead of deleting and re-creating everything with reset_db. Existing rows and indexes are left in place.
+It performs the following tasks:
+
+1. Extend DateInfo:
+    Adds the dates following the last date in DateInfo (in ascending date_id order) up to the requested day.
+
+2. Append Sales:
+    Either generates synthetic sales for the new dates with the batched generator of populate_db.py,
+    keeping the existing high revenue stores and high margin products, or appends a sales CSV export
+    with load_sales.py while keeping the Sales indexes in place.
+
+3. High-Water Mark:
+    Records the max sale_id and max date_id after every append in the LoadWatermarks table.
+    Downstream analytics can compare the latest two marks to process only the appended delta.
+
+Usage:
+    python append_sales.py [--days N] [--rows-per-day R] [--seed S]
+    python append_sales.py --file <csv_path> [--chunk-size N]
+"""
+
+import argparse
+import sys
+import time
+from datetime import date, timedelta
+
+import numpy as np
+
+from populate_db import load_dimension_arrays, generate_sales_batch, insert_sales_batch, BATCH_SIZE
+from load_sales import load_sales, CHUNK_SIZE
+
+sys.path.append('/app')
+
+from database.connection import connect, DB_PATH
+from database.partitions import SALES_VIEW
+
+def ensure_watermark_table(conn):
+    """Create the LoadWatermarks table for databases initialized before it was part of init.sql."""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS LoadWatermarks (
+            watermark_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            loaded_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            source TEXT NOT NULL,
+            rows_appended INTEGER NOT NULL,
+            max_sale_id INTEGER NOT NULL,
+            max_date_id INTEGER NOT NULL
+        )
+    ''')
+
+def record_high_water_mark(conn, source, rows_appended):
+    """Record the current max sale_id and date_id as the newest high-water mark."""
+    ensure_watermark_table(conn)
+    max_sale_id = conn.execute(f'SELECT COALESCE(MAX(sale_id), 0) FROM {SALES_VIEW}').fetchone()[0]
+    max_date_id = conn.execute('SELECT COALESCE(MAX(date_id), 0) FROM DateInfo').fetchone()[0]
+    conn.execute(
+        'INSERT INTO LoadWatermarks(source, rows_appended, max_sale_id, max_date_id) VALUES (?, ?, ?, ?)',
+        (source, rows_appended, max_sale_id, max_date_id)
+    )
+    conn.commit()
+    return max_sale_id, max_date_id
+
+def get_high_water_marks(conn, limit=2):
+    """
+    Return the newest `limit` high-water marks as (max_sale_id, max_date_id) tuples, newest first.
+    Sales with sale_id greater than the second mark's max_sale_id are the delta of the latest append.
+    """
+    ensure_watermark_table(conn)
+    return conn.execute(
+        'SELECT max_sale_id, max_date_id FROM LoadWatermarks ORDER BY watermark_id DESC LIMIT ?', (limit,)
+    ).fetchall()
+
+def extend_date_info(conn, days):
+    """
+    Add the `days` dates following the last date in DateInfo, never going past today.
+    Returns the date_ids of the new dates in ascending order.
+    """
+    last_date = date.fromisoformat(conn.execute('SELECT MAX(date) FROM DateInfo').fetchone()[0])
+    dates_data = []
+    for i in range(1, days + 1):
+        current_date = last_date + timedelta(days=i)
+        # DateInfo only accepts dates up to today
+        if current_date > date.today():
+            break
+        dates_data.append(
+            (current_date.isoformat(),
+            current_date.year,
+            current_date.month,
+            current_date.day,
+            current_date.strftime('%A'))
+        )
+    conn.executemany('INSERT INTO DateInfo(date, year, month, day, weekday) VALUES (?, ?, ?, ?, ?)', dates_data)
+    return np.array([r[0] for r in conn.execute(
+        'SELECT date_id FROM DateInfo WHERE date > ? ORDER BY date', (last_date.isoformat(),)
+    )], dtype=np.int64)
+
+def infer_high_value_keys(conn, dims):
+    """
+    Recover the high revenue stores and high margin products of the existing data as the
+    most frequently sold ones, so appended sales keep the same skew.
+    """
+    num_stores = max(1, len(dims['store_ids']) // 5)
+    num_products = max(1, len(dims['product_ids']) * 3 // 10)
+    high_revenue_stores = np.sort(np.array([r[0] for r in conn.execute(
+        f'SELECT store_id FROM {SALES_VIEW} GROUP BY store_id ORDER BY COUNT(*) DESC LIMIT ?', (num_stores,)
+    )], dtype=np.int64))
+    high_margin_products = np.sort(np.array([r[0] for r in conn.execute(
+        f'SELECT product_id FROM {SALES_VIEW} GROUP BY product_id ORDER BY COUNT(*) DESC LIMIT ?', (num_products,)
+    )], dtype=np.int64))
+    return high_revenue_stores, high_margin_products
+
+def append_generated_sales(conn, days=1, rows_per_day=None, seed=None, batch_size=BATCH_SIZE):
+    """
+    Extend DateInfo by `days` and generate sales for the new dates only.
+    rows_per_day defaults to the historical average number of sales per day.
+    Returns the number of appended sales.
+    """
+    if rows_per_day is None:
+        rows_per_day = round(conn.execute(
+            f'SELECT CAST(COUNT(*) AS REAL) / (SELECT COUNT(*) FROM DateInfo) FROM {SALES_VIEW}'
+        ).fetchone()[0] or 0)
+    dims = load_dimension_arrays(conn)
+    high_revenue_stores, high_margin_products = infer_high_value_keys(conn, dims)
+    new_date_ids = extend_date_info(conn, days)
+    # Restrict the generator to the new dates
+    dims['date_ids'] = new_date_ids
+
+    rng = np.random.default_rng(seed)
+    rows = len(new_date_ids) * rows_per_day
+    appended = 0
+    while appended < rows:
+        size = min(batch_size, rows - appended)
+        insert_sales_batch(conn, generate_sales_batch(rng, size, dims, high_revenue_stores, high_margin_products))
+        appended += size
+    conn.commit()
+    return appended
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Append new sales to the OrestisCompany database.")
+    parser.add_argument('--days', type=int, default=1, help="Number of new days to generate sales for")
+    parser.add_argument('--rows-per-day', type=int, default=None,
+                        help="Sales generated per new day (default: the historical average)")
+    parser.add_argument('--seed', type=int, default=None, help="Seed for the generated sales")
+    parser.add_argument('--file', default=None, help="Append this sales CSV export instead of generating sales")
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE, help="Rows read and inserted per chunk with --file")
+    args = parser.parse_args()
+
+    conn = connect(DB_PATH)
+    try:
+        start_time = time.perf_counter()
+        if args.file:
+            # Small incremental loads are cheaper with the indexes kept in place
+            appended = load_sales(conn, args.file, args.chunk_size, defer_indexes=False)['loaded']
+            source = args.file
+        else:
+            appended = append_generated_sales(conn, args.days, args.rows_per_day, args.seed)
+            source = 'generated'
+        max_sale_id, max_date_id = record_high_water_mark(conn, source, appended)
+    finally:
+        conn.close()
+    print(f"Appended {appended:,} sales in {time.perf_counter() - start_time:.2f}s "
+          f"(high-water mark: sale_id {max_sale_id}, date_id {max_date_id})")
@@ -8,6 +8,9 @@ Key features include:
 
 2. Data Preprocessing and Analytics: 
     Support for pre-processing analytics data (pre_process_analytics) with options for basic, intermediate, and advanced analysis. Users can specify date ranges and types of analytics to process.
+    The selected levels run concurrently in a pool of worker processes (see analytics/runner.py), each reporting its wall time and the latency of its metrics, or its error.
+    Outputs computed before for the same date range, options and data are copied from a result cache (see analytics/result_cache.py).
+    With --every or --ranges, every calendar period or listed range is pre-processed in one run (see analytics/batch.py).
 
 3. Analytics Visualization: 
     The visualize_analytics function launches a web-based visualization service, enabling graphical viewing of analytics results.
@@ -27,14 +30,29 @@ The script uses the 'click' library to create an intuitive CLI, acting as the ce
 import subprocess
 import os
 import time
-import re
 import shutil
 import sqlite3
 import click
 from datetime import date, datetime
 import socket
+import sys
 from contextlib import closing
 
+sys.path.append('/app')
+
+from analytics.basic_analytics import DEFAULT_TOP_K
+from analytics.batch import calendar_ranges, parse_ranges
+from analytics.metric_pool import format_timings
+from analytics.output_format import has_outputs, output_paths, with_csv, DEFAULT_FORMATS
+from analytics.runner import run_analytics
+from analytics.series_forecast import forecast_series as forecast_profit_series, format_report, GROUPINGS
+from analytics.series_forecast import DATA_DIR as ADVANCED_DATA_DIR, OUTPUT_NAME as SERIES_OUTPUT_NAME
+from analytics.sketches import SketchSettings, DEFAULT_ERROR, DEFAULT_SAMPLE_RATE
+from database.connection import get_connection, connection_settings
+
+# Query engines of the analytics scripts (see analytics/engines.py)
+ANALYTICS_ENGINES = ('sqlite', 'duckdb')
+
 def analytics_files_exist(analytics_type):
     """
     Check if the pre-processed analytics files exist.
@@ -46,8 +64,8 @@ def analytics_files_exist(analytics_type):
     # Check if the directory exists
     if not os.path.exists(directory):
         return False
-    # Check if there are any CSV files in the directory
-    return any(fname.endswith('.csv') for fname in os.listdir(directory))
+    # Check if there are any output files (Feather or CSV) in the directory
+    return has_outputs(directory)
 
 def cleanup_analytics_data(directory):
     """
@@ -64,7 +82,7 @@ def cleanup_analytics_data(directory):
 def db_initialized():
     """Check if the database has been initialized."""
     try:
-        with sqlite3.connect('/app/data/orestiscompanydb.sqlite') as conn:
+        with get_connection(read_only=True) as conn:
             cursor = conn.cursor()
             tables = cursor.execute("SELECT name FROM sqlite_master WHERE type='table';").fetchall()
             # Assuming a critical table that should exist after initialization is 'Sales'
@@ -75,7 +93,7 @@ def db_initialized():
 def db_populated():
     """Check if the database has been populated."""
     try:
-        with sqlite3.connect('/app/data/orestiscompanydb.sqlite') as conn:
+        with get_connection(read_only=True) as conn:
             cursor = conn.cursor()
             # Ensure the 'Customers' table exists before querying
             tables = cursor.execute("SELECT name FROM sqlite_master WHERE type='table';").fetchall()
@@ -104,15 +122,29 @@ def is_date_arg(arg):
     except:
         return False
 
+def date_bounds():
+    """
+    Return the first and last date available in DateInfo, which grows with append_sales.
+    Falls back to the originally populated range [2021, 2022] if the database cannot be read.
+    """
+    try:
+        with get_connection(read_only=True) as conn:
+            min_date, max_date = conn.execute("SELECT MIN(date), MAX(date) FROM DateInfo;").fetchone()
+            if min_date and max_date:
+                return date.fromisoformat(min_date), date.fromisoformat(max_date)
+    except sqlite3.OperationalError:
+        pass
+    return date(2021, 1, 1), date(2022, 12, 31)
+
 def is_valid_date_range(start_date_str, end_date_str):
     """
-    Check if the given start date and end date are within the year range [2021, 2022] and
+    Check if the given start date and end date are within the dates available in the database and
     start date < end date.
     Return a tuple with the first element being a boolean indicating the date range validity,
     and the second being an error message if applicable.
     """
-    min_date = date(2021, 1, 1)
-    max_date = date(2022, 12, 31)
+    min_date, max_date = date_bounds()
+    valid_range = f"[{min_date:%Y%m%d}, {max_date:%Y%m%d}]"
 
     # Convert strings to dates
     start_date = string_to_date(start_date_str)
@@ -120,111 +152,28 @@ def is_valid_date_range(start_date_str, end_date_str):
 
     # Check if the dates are within the valid range and start date is before the end date
     if not (min_date <= start_date <= max_date):
-        return False, f"Error: Start date {start_date_str} is out of the valid range [2021, 2022]"
+        return False, f"Error: Start date {start_date_str} is out of the valid range {valid_range}"
     
     if not (min_date <= end_date <= max_date):
-        return False, f"Error: End date {end_date_str} is out of the valid range [2021, 2022]"
+        return False, f"Error: End date {end_date_str} is out of the valid range {valid_range}"
     
     if not (start_date < end_date):
         return False, f"Error: Start date {start_date_str} must be before the end date {end_date_str}"
     
     return True, None  # No errors, dates are valid
 
-def is_flags_arg(arg):
-    """"Flag to be used to check if arg represents a flag arg"""
-    flag_pattern = re.compile(r'^-(?!.*(.).*\1)[bia]{1,3}$')
-    try:
-        match = flag_pattern.match(arg)
-        if match: 
-            return True
-        else: 
-            return False
-    except:
-        return False
-    
-def eval_analytics_flags(flag_arg):
-    """
-    An evaluation function which will return the different analytics flags extracted from the flag arg.
-    Default all flags to true in case flag_arg is None and if the flag arg doesnt match the pattern, return None
-    """
-    if flag_arg is None:
-        # If no flag is provided, set all to True
-        return {
-            'process_basic': True,
-            'process_intermediate': True,
-            'process_advanced': True
-        }
-
-    # Regular expression to match valid flags with unique characters
-    flag_pattern = re.compile(r'^-(?!.*(.).*\1)[bia]{1,3}$')
-    match = flag_pattern.match(flag_arg)
-    if match:
-        # Extract matched groups
-        flags = match.group()
-        return {
-            'process_basic': 'b' in flags,
-            'process_intermediate': 'i' in flags,
-            'process_advanced': 'a' in flags
-        }
-    else:
-        # If the flag argument doesn't match the pattern, return an error
-        return None
-
-def eval_pre_process_analytics_command(args):
+def invoke_with_args(ctx, command, args):
     """
-    Logic encapsulation regarding all args input by the user 
-    to the CLI using pre_process_analytics command
+    Parse REPL args with the click command's own options and invoke it,
+    reporting usage errors instead of leaving the REPL.
     """
-    # Defaults
-    default_start_date = '20210101'
-    default_end_date = '20221231'
-    default_error_message = None
-    default_analytics_flags = eval_analytics_flags(None)
-
-     # If no args provided, use default settings (all dates all flags set to True)
-    if len(args) == 0:
-        return (default_start_date, default_end_date, default_analytics_flags), default_error_message
-    # If 1 arg provided, it has to be analytics flag arg (all dates specified flags)
-    elif len(args) == 1:
-        if not is_flags_arg(args[0]):
-            error_message = f"Error: Unknown arg: {args[0]}. If you are to provide only 1 arg, it has to be a valid flag arg e.g. -bi."
-            return None, error_message
-        else:
-            analytics_flags = eval_analytics_flags(args[0])
-            return (default_start_date, default_end_date, analytics_flags), default_error_message
-    # If 2 args provided, they have to be valid start and end dates(all flags set to True)
-    elif len(args) == 2:
-        if not is_date_arg(args[0]):
-            error_message = f"Error: The provided start_date {args[0]} is not in the correct YYYYMMDD format or the date does not exist."
-            return None, error_message
-        if not is_date_arg(args[1]):
-            error_message = f"Error: The provided end_date {args[1]} is not in the correct YYYYMMDD format or the date does not exist."
-            return None, error_message
-        valid_date_range, error_message = is_valid_date_range(args[0], args[1])
-        if not valid_date_range:
-            return None, error_message
-        return (args[0], args[1], default_analytics_flags), default_error_message
-    # If 3 args provided, they have to be start_date end_date flag arg
-    elif len(args) == 3:
-        if not is_date_arg(args[0]):
-            error_message = f"Error: The provided start_date {args[0]} is not in the correct YYYYMMDD format or the date does not exist."
-            return None, error_message
-        if not is_date_arg(args[1]):
-            error_message = f"Error: The provided end_date {args[1]} is not in the correct YYYYMMDD format or the date does not exist."
-            return None, error_message
-        valid_date_range, error_message = is_valid_date_range(args[0], args[1])
-        if not valid_date_range:
-            return None, error_message
-        if not is_flags_arg(args[2]):
-            error_message = f"Error: The flag arg {args[2]} has to be valid e.g. -bi."
-            return None, error_message
-        analytics_flags = eval_analytics_flags(args[2])
-        return (args[0], args[1], analytics_flags), default_error_message
-    # If more than 3 args, error
-    else:
-        error_message = f"Error: Too many args provided ({len(args)})."
-        return None, error_message
-
+    try:
+        with command.make_context(command.name, list(args), parent=ctx) as sub_ctx:
+            ctx.invoke(command, **sub_ctx.params)
+    except click.exceptions.Exit:
+        return
+    except click.UsageError as e:
+        click.echo(f"Error: {e.format_message()}")
 
 def check_port(port):
     with closing(socket.socket(socket.AF_INET, socket.SOCK_STREAM)) as sock:
@@ -248,18 +197,44 @@ def repl(ctx):
         click.echo("=========================================")
         click.echo("-----Setup Commands-----:")
         click.echo("  initialize_db                                                 - Initialize the database.")
-        click.echo("  populate_db                                                   - Populate the database with data.")
-        click.echo("  reset_db                                                      - Reset and repopulate the database.")
+        click.echo("  populate_db [--rows N] [--seed S] [--workers W]               - Populate the database with data.")
+        click.echo("  reset_db [--rows N] [--seed S] [--compress] [--no-snapshot]   - Reset and repopulate the database.")
+        click.echo("  load_sales csv_path [--chunk-size N]                          - Bulk load a sales CSV export.")
+        click.echo("  append_sales [--days N] [--rows-per-day R] [--file csv_path]  - Append new days of sales without a reset.")
+        click.echo("  partition_sales [--vacuum]                                    - Move closed months of sales into read-only partitions.")
+        click.echo("  db_settings                                                   - Show the effective database connection settings.")
         click.echo("  exit or quit                                                  - Exit the CLI.")
         click.echo("")
         click.echo("=========================================")
         click.echo("-----Pre-process Analytics Command-----")
-        click.echo("  pre_process_analytics start_date end_date -arg                - Pre-process analytics for visualizations.")
+        click.echo("  pre_process_analytics [start_date end_date] [-b] [-i] [-a] [--columnar | --shared-scan | --prefix-index]")
+        click.echo("                        [--engine sqlite|duckdb] [--workers N] [--no-cache]")
+        click.echo("                        [--every month|quarter|year|rollingN | --ranges YYYYMMDD-YYYYMMDD,...]")
+        click.echo("                        [--approximate [--error E] [--sample-rate R]] [--top-k K] [--csv]")
+        click.echo("                                                                - Pre-process analytics for visualizations.")
+        click.echo("  export_columns                                                - Refresh the columnar copy of the sales.")
+        click.echo("  forecast_series start_date end_date [--by store,product,store_product] [--steps N]")
+        click.echo("                  [--workers N] [--chunk-size N] [--timeout SECONDS] [--csv]")
+        click.echo("                                                                - Forecast the profits of every store, product and pair.")
         click.echo("")
         click.echo("  Notes:")
-        click.echo("    - dates must be between 20210101 and 20211231, default all dates that data exist [2021, 2022]")
-        click.echo("    - arg can be b('basic'), i('intermediate') or a('advanced') analytics, default all")
-        click.echo("    - arg can also be bi, ib, ba, ab, ai, ia, as per their combinations")
+        click.echo("    - dates are in YYYYMMDD format within the dates of the database (grown by append_sales), default [20210101, 20221231]")
+        click.echo("    - -b (--basic), -i (--intermediate) and -a (--advanced) select the analytics levels, default all")
+        click.echo("    - the level flags can be combined, e.g. -bi, as per their combinations")
+        click.echo("    - --columnar computes the basic analytics on the memory-mapped columnar copy of the sales")
+        click.echo("    - --shared-scan computes all basic analytics from a single scan of the sales")
+        click.echo("    - --prefix-index answers the date range sums from prefix sums of the daily aggregates, without scanning the sales")
+        click.echo("    - --engine duckdb runs the analytics on an embedded DuckDB copy of the database (default sqlite)")
+        click.echo("    - --workers N runs the metrics of each level on N threads (default one per core)")
+        click.echo("    - results computed before for the same range and data are reused, --no-cache recomputes them")
+        click.echo("      (in-place edits of existing rows are only detected with the migrations applied, otherwise use --no-cache)")
+        click.echo("    - --every and --ranges pre-process every calendar period (or listed range) between the dates in one run,")
+        click.echo("      into /app/data/analytics/<level>/<range>/ (rollingN: N-day windows ending on every day)")
+        click.echo("    - --approximate estimates distinct customers, purchase value quantiles and averages from per-day sketches")
+        click.echo("      of the sales with error bounds, --error sets their relative error and --sample-rate the sampled sales (default 0.01),")
+        click.echo("      and merges the top customers, products and stores from per-day top-k summaries, with bounds on their totals")
+        click.echo("    - --top-k K lists the K top customers, products and stores in the basic analytics (default 3)")
+        click.echo("    - outputs are written as typed Feather files for the dashboard, --csv exports them as CSV files too")
         click.echo("")
         click.echo("=========================================")
         click.echo("-----Visualization Command-----")
@@ -291,29 +266,36 @@ def repl(ctx):
         # Case when user wants to exit 
         elif base_command == 'exit' or base_command == 'quit':
             break
+        # Case when user wants to see the database connection settings
+        elif base_command == 'db_settings':
+            ctx.invoke(db_settings)
         # Case when user wants to initialize the database
         elif base_command == 'initialize_db':
             ctx.invoke(initialize_db)
         # Case when the user wants to populate the database
         elif base_command == 'populate_db':
-            ctx.invoke(populate_db)
+            invoke_with_args(ctx, populate_db, args)
         # Case when the user wants to reset the database
         elif base_command == 'reset_db':
-            ctx.invoke(reset_db)
+            invoke_with_args(ctx, reset_db, args)
+        # Case when the user wants to bulk load a sales export
+        elif base_command == 'load_sales':
+            invoke_with_args(ctx, load_sales, args)
+        # Case when the user wants to append new sales
+        elif base_command == 'append_sales':
+            invoke_with_args(ctx, append_sales, args)
+        # Case when the user wants to partition the sales by month
+        elif base_command == 'partition_sales':
+            invoke_with_args(ctx, partition_sales, args)
         # Case when the user wants to pre process the analytics
         elif base_command == 'pre_process_analytics':
-            evaluated_command, error = eval_pre_process_analytics_command(args)
-            if error:
-                # Report the error and skip the rest of the loop and prompt the user for a new command
-                click.echo(error)
-                continue  
-            else:
-                new_start_date, new_end_date, analytics_flags = evaluated_command
-                if analytics_flags is not None:
-                    ctx.invoke(pre_process_analytics, 
-                               start_date=new_start_date, 
-                               end_date=new_end_date, 
-                               **analytics_flags)
+            invoke_with_args(ctx, pre_process_analytics, args)
+        # Case when the user wants to forecast the profits per store and product
+        elif base_command == 'forecast_series':
+            invoke_with_args(ctx, forecast_series, args)
+        # Case when the user wants to refresh the columnar copy of the sales
+        elif base_command == 'export_columns':
+            ctx.invoke(export_columns)
         # Case when the user wants to visualize the analytics
         elif base_command == 'visualize_analytics':
             ctx.invoke(visualize_analytics)
@@ -324,6 +306,17 @@ def repl(ctx):
                 display_initial_commands()
 
 
+@cli.command()
+def db_settings():
+    """Show the effective settings of the writer and read-only analytics connections."""
+    if not db_initialized():
+        click.echo("Error: The database has not been initialized. Please run 'initialize_db' first.")
+        return
+    for mode, read_only in (('writer', False), ('reader', True)):
+        click.echo(f"{mode}:")
+        for name, value in connection_settings(get_connection(read_only=read_only)).items():
+            click.echo(f"  {name:<15} {value}")
+
 @cli.command()
 def initialize_db():
     """Initialize the database."""
@@ -335,7 +328,10 @@ def initialize_db():
         click.echo("An error occurred while initializing the database.")
 
 @cli.command()
-def populate_db():
+@click.option('--rows', type=int, default=None, help='Generate this many sales with the batched generator')
+@click.option('--seed', type=int, default=None, help='Seed for the batched generator')
+@click.option('--workers', type=int, default=1, help='Generate the sales in this many parallel shards')
+def populate_db(rows, seed, workers):
     """Populate the database with data."""
     if not db_initialized():
         click.echo("Error: The database has not been initialized. Please run 'initialize_db' first.")
@@ -348,13 +344,25 @@ def populate_db():
         else:
             try:
                 # Execute the populate_db.sh script
-                subprocess.run(["/app/scripts/populate_db.sh"], check=True)
+                command = ["/app/scripts/populate_db.sh"]
+                if rows is not None:
+                    command += ["--rows", str(rows)]
+                if seed is not None:
+                    command += ["--seed", str(seed)]
+                if workers > 1:
+                    command += ["--workers", str(workers)]
+                subprocess.run(command, check=True)
                 click.echo("Database populated successfully!")
             except subprocess.CalledProcessError:
                 click.echo("An error occurred while populating the database.")
 
 @cli.command()
-def reset_db():
+@click.option('--rows', type=int, default=None, help='Generate this many sales with the batched generator')
+@click.option('--seed', type=int, default=None, help='Seed for the generator, snapshots need it together with --rows')
+@click.option('--workers', type=int, default=1, help='Generate the sales in this many parallel shards')
+@click.option('--compress', is_flag=True, default=False, help='gzip the snapshot saved after repopulating')
+@click.option('--no-snapshot', is_flag=True, default=False, help='Always regenerate instead of restoring a snapshot')
+def reset_db(rows, seed, workers, compress, no_snapshot):
     """Reset and repopulate the database."""
     if not db_populated():
         click.echo("Error: The database has not been populated. Please run 'populate_db' first.")
@@ -363,19 +371,142 @@ def reset_db():
     if confirmation:
         try:
             # Execute the reset_db.sh script
-            subprocess.run(["/app/scripts/reset_db.sh"], check=True)
+            command = ["/app/scripts/reset_db.sh"]
+            if rows is not None:
+                command += ["--rows", str(rows)]
+            if seed is not None:
+                command += ["--seed", str(seed)]
+            if workers > 1:
+                command += ["--workers", str(workers)]
+            if compress:
+                command.append("--compress")
+            if no_snapshot:
+                command.append("--no-snapshot")
+            subprocess.run(command, check=True)
             click.echo("Database reset and repopulated successfully!")
         except subprocess.CalledProcessError:
             click.echo("An error occurred while resetting the database.")
 
+@cli.command()
+@click.argument('csv_path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--chunk-size', type=int, default=50000, help='Rows read and inserted per chunk')
+def load_sales(csv_path, chunk_size):
+    """Bulk load a sales CSV export into the database."""
+    if not db_populated():
+        click.echo("Error: The database has not been populated. Please run 'populate_db' first.")
+        return
+    try:
+        # Execute the load_sales.sh script
+        subprocess.run(["/app/scripts/load_sales.sh", csv_path, "--chunk-size", str(chunk_size)], check=True)
+        click.echo("Sales loaded successfully!")
+    except subprocess.CalledProcessError:
+        click.echo("An error occurred while loading the sales.")
+
+@cli.command()
+@click.option('--days', type=int, default=1, help='Number of new days to generate sales for')
+@click.option('--rows-per-day', type=int, default=None, help='Sales generated per new day (default: the historical average)')
+@click.option('--seed', type=int, default=None, help='Seed for the generated sales')
+@click.option('--file', 'csv_path', type=click.Path(exists=True, dir_okay=False), default=None,
+              help='Append this sales CSV export instead of generating sales')
+def append_sales(days, rows_per_day, seed, csv_path):
+    """Append new sales without resetting the database."""
+    if not db_populated():
+        click.echo("Error: The database has not been populated. Please run 'populate_db' first.")
+        return
+    command = ["/app/scripts/append_sales.sh"]
+    if csv_path is not None:
+        command += ["--file", csv_path]
+    else:
+        command += ["--days", str(days)]
+        if rows_per_day is not None:
+            command += ["--rows-per-day", str(rows_per_day)]
+        if seed is not None:
+            command += ["--seed", str(seed)]
+    try:
+        # Execute the append_sales.sh script
+        subprocess.run(command, check=True)
+        click.echo("Sales appended successfully!")
+    except subprocess.CalledProcessError:
+        click.echo("An error occurred while appending the sales.")
+
+@cli.command()
+@click.option('--vacuum', is_flag=True, default=False, help='Compact the database after partitioning')
+def partition_sales(vacuum):
+    """Move the closed months of Sales into read-only monthly partitions."""
+    if not db_populated():
+        click.echo("Error: The database has not been populated. Please run 'populate_db' first.")
+        return
+    command = ["/app/scripts/partition_sales.sh"]
+    if vacuum:
+        command.append("--vacuum")
+    try:
+        # Execute the partition_sales.sh script
+        subprocess.run(command, check=True)
+        click.echo("Sales partitioned successfully!")
+    except subprocess.CalledProcessError:
+        click.echo("An error occurred while partitioning the sales.")
+
+@cli.command()
+def export_columns():
+    """Refresh the memory-mapped columnar copy of the Sales fact."""
+    if not db_populated():
+        click.echo("Error: The database has not been populated. Please run 'populate_db' first.")
+        return
+    try:
+        # Execute the export_columns.sh script
+        subprocess.run(["/app/scripts/export_columns.sh"], check=True)
+        click.echo("Sales columns exported successfully!")
+    except subprocess.CalledProcessError:
+        click.echo("An error occurred while exporting the sales columns.")
+
 
 @cli.command()
 @click.argument('start_date', required=False, default='20210101')
 @click.argument('end_date', required=False, default='20221231')
-@click.option('--basic', 'process_basic', is_flag=True, default=False, help='Compute basic analytics')
-@click.option('--intermediate', 'process_intermediate', is_flag=True, default=False, help='Compute intermediate analytics')
-@click.option('--advanced', 'process_advanced', is_flag=True, default=False, help='Compute advanced analytics')
-def pre_process_analytics(start_date, end_date, process_basic, process_intermediate, process_advanced):
+@click.option('-b', '--basic', 'process_basic', is_flag=True, default=False, help='Compute basic analytics (default all levels)')
+@click.option('-i', '--intermediate', 'process_intermediate', is_flag=True, default=False, help='Compute intermediate analytics (default all levels)')
+@click.option('-a', '--advanced', 'process_advanced', is_flag=True, default=False, help='Compute advanced analytics (default all levels)')
+@click.option('--columnar', is_flag=True, default=False, help='Compute basic analytics on the memory-mapped Sales columns')
+@click.option('--shared-scan', is_flag=True, default=False, help='Compute every basic analytic from one scan of the sales')
+@click.option('--engine', type=click.Choice(ANALYTICS_ENGINES), default='sqlite', help='Query engine to run the analytics on')
+@click.option('--workers', type=click.IntRange(min=1), default=None, help='Run the metrics of each level on this many threads')
+@click.option('--no-cache', is_flag=True, default=False,
+              help='Recompute every metric instead of using the result cache, needed after in-place edits of existing rows '
+                   'unless the migrations (python migrations.py) are applied')
+@click.option('--prefix-index', is_flag=True, default=False, help='Answer the derivable metrics from the prefix sums of the daily aggregates')
+@click.option('--every', default=None, help='Pre-process every month, quarter, year or rollingN window between the dates')
+@click.option('--ranges', default=None, help='Pre-process every comma separated YYYYMMDD-YYYYMMDD range')
+@click.option('--approximate', is_flag=True, default=False, help='Estimate distinct counts, quantiles, averages and top-k lists from the sketches of the sales')
+@click.option('--error', type=click.FloatRange(min=0, max=1, min_open=True, max_open=True), default=DEFAULT_ERROR,
+              help='Relative error of the sketched distinct counts and quantiles')
+@click.option('--sample-rate', type=click.FloatRange(min=0, max=1, min_open=True), default=DEFAULT_SAMPLE_RATE,
+              help='Fraction of the sales sampled for averages')
+@click.option('--top-k', type=click.IntRange(min=1), default=DEFAULT_TOP_K, help='Number of top customers, products and stores listed')
+@click.option('--csv', is_flag=True, default=False, help='Export the outputs as CSV files too')
+def pre_process_analytics(start_date, end_date, process_basic, process_intermediate, process_advanced, columnar, shared_scan, engine, workers, no_cache, prefix_index,
+                          every, ranges, approximate, error, sample_rate, top_k, csv):
+    if every and ranges:
+        click.echo("Error: --every and --ranges can't be combined.")
+        return
+    # Validate the dates before the existing outputs are cleaned up
+    if not (is_date_arg(start_date) and is_date_arg(end_date)):
+        click.echo("Error: Dates must be in YYYYMMDD format.")
+        return
+    valid, range_error = is_valid_date_range(start_date, end_date)
+    if not valid:
+        click.echo(range_error)
+        return
+    # The analytics modules take the dates in YYYY-MM-DD format
+    start_date, end_date = string_to_date(start_date).isoformat(), string_to_date(end_date).isoformat()
+    try:
+        if every:
+            ranges = calendar_ranges(every, start_date, end_date)
+        elif ranges:
+            ranges = parse_ranges(ranges)
+    except ValueError as e:
+        click.echo(f"Error: {e}.")
+        return
+
     # Clean up existing analytics data
     cleanup_analytics_data("/app/data/analytics")
 
@@ -387,27 +518,91 @@ def pre_process_analytics(start_date, end_date, process_basic, process_intermedi
         click.echo("It seems the database hasn't been populated yet. Please populate_db first.")
         return
 
-    if process_basic:
-        try:
-            subprocess.call(['/app/scripts/basic_analytics.sh', start_date, end_date])
-            click.echo("Basic analytics pre-processed successfully!")
-        except subprocess.CalledProcessError:
-            click.echo("An error occurred while processing basic analytics.")
+    levels = [level for level, selected in
+              (('basic', process_basic), ('intermediate', process_intermediate), ('advanced', process_advanced)) if selected]
+    if not levels:
+        # No level selected processes them all
+        levels = ['basic', 'intermediate', 'advanced']
+    options = {'engine': engine}
+    if columnar:
+        options['columnar'] = True
+    if shared_scan:
+        options['shared_scan'] = True
+    if workers is not None:
+        options['workers'] = workers
+    if no_cache:
+        options['use_cache'] = False
+    if prefix_index:
+        options['prefix_index'] = True
+    if approximate:
+        options['approximate'] = SketchSettings(error, sample_rate)
+    if top_k != DEFAULT_TOP_K:
+        options['top_k'] = top_k
+    if csv:
+        options['formats'] = with_csv(DEFAULT_FORMATS)
+    start_time = time.perf_counter()
+    results = run_analytics(levels, start_date, end_date, ranges=ranges or None, **options)
+    for result in results:
+        if result.error is None:
+            click.echo(f"{result.level.capitalize()} analytics pre-processed successfully in {result.seconds:.2f}s!")
+            timings = result.metrics
+            if ranges:
+                # Total latency of every metric over all ranges, the timings are keyed <range>/<metric>
+                timings = {}
+                for name, seconds in result.metrics.items():
+                    metric = name.rsplit('/', 1)[1]
+                    timings[metric] = timings.get(metric, 0) + seconds
+            for line in format_timings(timings):
+                click.echo(f"    {line}")
+        else:
+            click.echo(f"An error occurred while processing {result.level} analytics: {result.error}")
+    if results:
+        batch = f" for {len(ranges)} date range(s)" if ranges else ""
+        click.echo(f"Pre-processed {len(results)} analytics level(s){batch} in {time.perf_counter() - start_time:.2f}s.")
 
-    if process_intermediate:
-        try:
-            subprocess.call(['/app/scripts/intermediate_analytics.sh', start_date, end_date])
-            click.echo("Intermediate analytics pre-processed successfully!")
-        except subprocess.CalledProcessError:
-            click.echo("An error occurred while processing intermediate analytics.")
+@cli.command()
+@click.argument('start_date', required=False, default='20210101')
+@click.argument('end_date', required=False, default='20221231')
+@click.option('--by', default=','.join(GROUPINGS), help='Comma separated groupings to forecast: store, product, store_product')
+@click.option('--steps', type=click.IntRange(min=1), default=5, help='Days to forecast')
+@click.option('--engine', type=click.Choice(ANALYTICS_ENGINES), default='sqlite', help='Query engine to read the profits from')
+@click.option('--workers', type=click.IntRange(min=1), default=None, help='Fit the series on this many processes')
+@click.option('--chunk-size', type=click.IntRange(min=1), default=16, help='Series fitted per task')
+@click.option('--timeout', type=click.FloatRange(min=0, min_open=True), default=30, help='Seconds a single fit may take')
+@click.option('--csv', is_flag=True, default=False, help='Export the forecasts as CSV too')
+def forecast_series(start_date, end_date, by, steps, engine, workers, chunk_size, timeout, csv):
+    """Forecast the daily profits of every store, product and store×product."""
+    groupings = [grouping.strip() for grouping in by.split(',')]
+    unknown = [grouping for grouping in groupings if grouping not in GROUPINGS]
+    if unknown:
+        click.echo(f"Error: unknown grouping(s) {', '.join(unknown)}, expected {', '.join(GROUPINGS)}.")
+        return
+    if not db_populated():
+        click.echo("Error: The database has not been populated. Please run 'populate_db' first.")
+        return
+    if not (is_date_arg(start_date) and is_date_arg(end_date)):
+        click.echo("Error: Dates must be in YYYYMMDD format.")
+        return
+    valid, error = is_valid_date_range(start_date, end_date)
+    if not valid:
+        click.echo(error)
+        return
+    # The analytics modules take the dates in YYYY-MM-DD format
+    start_date, end_date = string_to_date(start_date).isoformat(), string_to_date(end_date).isoformat()
+    formats = with_csv(DEFAULT_FORMATS) if csv else DEFAULT_FORMATS
+    options = {'engine': engine, 'chunk_size': chunk_size, 'timeout': timeout, 'formats': formats}
+    if workers is not None:
+        options['workers'] = workers
+    try:
+        _, report = forecast_profit_series(start_date, end_date, groupings, steps, **options)
+    except Exception as e:
+        click.echo(f"An error occurred while forecasting the series: {e}")
+        return
+    for line in format_report(report):
+        click.echo(line)
+    paths = output_paths(ADVANCED_DATA_DIR, SERIES_OUTPUT_NAME, formats).values()
+    click.echo(f"Forecasts saved to {', '.join(paths)}")
 
-    if process_advanced:
-        try:
-            subprocess.call(['/app/scripts/advanced_analytics.sh', start_date, end_date])
-            click.echo("Advanced analytics pre-processed successfully!")
-        except subprocess.CalledProcessError:
-            click.echo("An error occurred while processing advanced analytics.")
-    
 @cli.command()
 @click.pass_context
 def visualize_analytics(ctx):
@@ -0,0 +1,116 @@
+"""
+This script, engine_benchmark.py, compares the query engines of the analytics (see analytics/engines.py).
+It performs the following tasks:
+
+1. Test Databases:
+    Builds a database per requested size with init.sql, the migrations and the batched generator of populate_db.py.
+
+2. Timings:
+    Runs every analytics query function on the sqlite and the duckdb engine and reports the best-of-3 wall time
+    per function and level, plus the one-off import of the DuckDB mirror.
+
+3. Result Check:
+    Compares the results of both engines (up to floating point summation order) and flags any mismatch.
+
+Usage:
+    python engine_benchmark.py [start_date end_date] [--sizes 100000,1000000] [--seed S]
+
+Where <start_date> and <end_date> are in YYYYMMDD format (default 20210101 20221231).
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import pandas as pd
+
+from index_advisor import ANALYTICS_QUERIES, SCHEMA_PATH, reformat_date
+from migrations import apply_migrations
+from populate_db import populate_database
+
+sys.path.append('/app')
+
+from analytics.engines import analytics_connection, refresh_duckdb_mirror, ENGINES
+from database.connection import connect
+
+def build_database(db_path, rows, seed):
+    conn = connect(db_path)
+    with open(SCHEMA_PATH) as f:
+        conn.executescript(f.read())
+    apply_migrations(conn)
+    conn.close()
+    populate_database(db_path, rows=rows, seed=seed)
+
+def run_function(function, conn, start_date, end_date, repeat=3):
+    """Best-of-`repeat` wall time in seconds and the result of a query function, or the exception it raised."""
+    best = float('inf')
+    for _ in range(repeat):
+        start_time = time.perf_counter()
+        try:
+            result = function(conn, start_date, end_date)
+        except Exception as e:
+            return None, e
+        best = min(best, time.perf_counter() - start_time)
+    return best, result
+
+def same_result(a, b):
+    if isinstance(a, Exception) or isinstance(b, Exception):
+        return type(a) is type(b)
+    if a is None or b is None:
+        return a is None and b is None
+    try:
+        if isinstance(a, pd.Series):
+            pd.testing.assert_series_equal(a, b, check_dtype=False)
+        else:
+            pd.testing.assert_frame_equal(a.reset_index(drop=True), b.reset_index(drop=True), check_dtype=False)
+    except AssertionError:
+        return False
+    return True
+
+def benchmark(sizes, start_date, end_date, seed=0):
+    """Time every analytics query function on each engine at each database size."""
+    for rows in sizes:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            db_path = os.path.join(tmp_dir, 'benchmark.sqlite')
+            build_database(db_path, rows, seed)
+            start_time = time.perf_counter()
+            refresh_duckdb_mirror(db_path)
+            import_seconds = time.perf_counter() - start_time
+
+            timings, results = {}, {}
+            for engine in ENGINES:
+                with analytics_connection(engine, db_path) as conn:
+                    for level, functions in ANALYTICS_QUERIES.items():
+                        for function in functions:
+                            name = f'{level}.{function.__name__}'
+                            timings[engine, name], results[engine, name] = run_function(function, conn, start_date, end_date)
+
+        print(f"\n{rows:,} sales (DuckDB mirror import {import_seconds * 1000:.1f} ms)")
+        print(f"    {'query':<45} {'sqlite (ms)':>12} {'duckdb (ms)':>12} {'speedup':>8}")
+        totals = dict.fromkeys(ENGINES, 0.0)
+        for level, functions in ANALYTICS_QUERIES.items():
+            for function in functions:
+                name = f'{level}.{function.__name__}'
+                sqlite_time, duckdb_time = timings['sqlite', name], timings['duckdb', name]
+                check = '' if same_result(results['sqlite', name], results['duckdb', name]) else '  results differ!'
+                if sqlite_time is None or duckdb_time is None:
+                    print(f"    {name:<45} {'failed':>12} {'':>12} {'':>8}{check}")
+                    continue
+                totals['sqlite'] += sqlite_time
+                totals['duckdb'] += duckdb_time
+                print(f"    {name:<45} {sqlite_time * 1000:>12.1f} {duckdb_time * 1000:>12.1f} "
+                      f"{sqlite_time / max(duckdb_time, 1e-9):>7.1f}x{check}")
+        print(f"    {'total':<45} {totals['sqlite'] * 1000:>12.1f} {totals['duckdb'] * 1000:>12.1f} "
+              f"{totals['sqlite'] / max(totals['duckdb'], 1e-9):>7.1f}x")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare the sqlite and duckdb engines of the analytics.")
+    parser.add_argument('start_date', nargs='?', default='20210101')
+    parser.add_argument('end_date', nargs='?', default='20221231')
+    parser.add_argument('--sizes', default='100000,1000000', help="Comma separated database sizes (sales rows)")
+    parser.add_argument('--seed', type=int, default=0, help="Seed of the generated databases")
+    args = parser.parse_args()
+    benchmark([int(size) for size in args.sizes.split(',')], reformat_date(args.start_date),
+              reformat_date(args.end_date), args.seed)
@@ -0,0 +1,259 @@
+"""
+This script, index_advisor.py, is a query-plan-aware index advisor for the OrestisCompany analytics queries.
+It performs the following tasks:
+
+1. Query Capture:
+    Runs every query function of basic_analytics.py, intermediate_analytics.py and advanced_analytics.py
+    on a traced connection and records the SQL they execute, with the date range bound in. The query a temp table
+    is created from (e.g. the RFM customers) is recorded in place of the SELECTs reading the temp table.
+
+2. Plan Analysis:
+    Runs EXPLAIN QUERY PLAN on every captured query and reports full scans, temp B-trees and
+    index lookups that still have to read the table row.
+
+3. Index Proposals:
+    Proposes composite covering indexes for Sales and DateInfo from the columns the queries reference,
+    leading with the date range / join column. Proposals can be written as the next versioned migration
+    in sql/migrations and applied with --apply (see migrations.py).
+
+4. Benchmark:
+    Builds databases at several sizes with the batched generator and reports the query timings
+    before and after the pending migrations are applied.
+
+Usage:
+    python index_advisor.py [start_date end_date] [--write-migration] [--apply] [--benchmark 100000,1000000]
+
+Where <start_date> and <end_date> are in YYYYMMDD format (default 20210101 20221231).
+"""
+
+import argparse
+import os
+import re
+import sys
+import tempfile
+import time
+
+sys.path.append('/app')
+
+from analytics import basic_analytics, intermediate_analytics, advanced_analytics
+from database.connection import connect
+from migrations import apply_migrations, list_migrations, DB_PATH, MIGRATIONS_DIR
+from populate_db import populate_database
+
+SCHEMA_PATH = "/app/sql/init.sql"
+
+# Query functions of each analytics level, all taking (conn, start_date, end_date)
+ANALYTICS_QUERIES = {
+    'basic': [
+        basic_analytics.total_sales,
+        basic_analytics.sales_by_product,
+        basic_analytics.sales_by_region,
+        basic_analytics.profit_total,
+        basic_analytics.profit_by_product,
+        basic_analytics.profit_by_region,
+        basic_analytics.top_selling_products,
+        basic_analytics.top_customers,
+        basic_analytics.top_stores_by_sales,
+    ],
+    'intermediate': [
+        intermediate_analytics.avg_purchase_frequency,
+        intermediate_analytics.avg_purchase,
+        intermediate_analytics.sales_by_day_of_month,
+        intermediate_analytics.monthly_sales_trend,
+        intermediate_analytics.avg_sales_by_weekday,
+        intermediate_analytics.purchase_value_quantiles,
+    ],
+    'advanced': [
+        advanced_analytics.calculate_daily_profits,
+        advanced_analytics.calculate_product_profit_margin,
+        advanced_analytics.calculate_store_profit_margin,
+        advanced_analytics.calculate_rfm_scores,
+    ],
+}
+
+# A temp table created from a query, e.g. the aggregated customers of the RFM scores
+TEMP_TABLE_PATTERN = re.compile(r'^\s*CREATE\s+TEMP(?:ORARY)?\s+TABLE\s+(?:IF\s+NOT\s+EXISTS\s+)?(\w+)\s+AS\s+(SELECT\b.*)', re.I | re.S)
+
+# Column each table is reached by in the analytics queries, which has to lead a covering index
+LEADING_COLUMNS = {'Sales': 'date_id', 'DateInfo': 'date'}
+INDEX_NAMES = {'Sales': 'idx_sales_covering', 'DateInfo': 'idx_date_info_covering'}
+
+def capture_queries(conn, start_date, end_date):
+    """
+    Run every analytics query function and return the executed SELECT statements by metric name, including the
+    SELECTs temp tables are created from but not the ones reading a temp table.
+    """
+    queries = {}
+    for level, functions in ANALYTICS_QUERIES.items():
+        for function in functions:
+            statements = []
+            conn.set_trace_callback(statements.append)
+            try:
+                function(conn, start_date, end_date)
+            except Exception as e:
+                # Only the executed SQL is needed, post-processing failures on unusual data don't matter here
+                print(f"Warning: {level}.{function.__name__} failed after its query ran: {e}")
+            finally:
+                conn.set_trace_callback(None)
+            selects, temp_tables = [], []
+            for statement in statements:
+                match = TEMP_TABLE_PATTERN.match(statement)
+                if match:
+                    # The query a temp table is created from reads the tables, so it is analyzed like a SELECT
+                    temp_tables.append(match.group(1))
+                    selects.append(match.group(2))
+                elif statement.lstrip().upper().startswith('SELECT') and not any(
+                        re.search(rf'\b{table}\b', statement) for table in temp_tables):
+                    # SELECTs of a temp table only read the table, which is dropped by the time the plans are explained
+                    selects.append(statement)
+            for i, statement in enumerate(selects):
+                name = f'{level}.{function.__name__}' + (f'[{i}]' if len(selects) > 1 else '')
+                queries[name] = statement
+    return queries
+
+def analyze_plan(conn, query):
+    """
+    Return the findings of one query plan as (kind, table, detail) tuples, where kind is
+    'full scan', 'temp b-tree' or 'table lookup' (an index search that still reads the table row).
+    """
+    findings = []
+    aliases = {alias: table for table, alias in
+               re.findall(r'\b(?:FROM|JOIN)\s+(\w+)(?:\s+(?:AS\s+)?(?!(?:ON|WHERE|JOIN|LEFT|INNER|CROSS|GROUP|ORDER|LIMIT)\b)(\w+))?', query, re.I)
+               if alias}
+    for _, _, _, detail in conn.execute(f'EXPLAIN QUERY PLAN {query}'):
+        match = re.match(r'(SCAN|SEARCH) (\w+)', detail)
+        if match:
+            table = aliases.get(match.group(2), match.group(2))
+            if match.group(1) == 'SCAN' and 'COVERING INDEX' not in detail:
+                findings.append(('full scan', table, detail))
+            elif match.group(1) == 'SEARCH' and 'USING INDEX' in detail and 'COVERING' not in detail:
+                findings.append(('table lookup', table, detail))
+        elif detail.startswith('USE TEMP B-TREE'):
+            findings.append(('temp b-tree', None, detail))
+    return findings
+
+def referenced_columns(conn, query, table):
+    """Columns of `table` referenced as Table.column in the query, in schema order, without the rowid alias."""
+    referenced = set(re.findall(rf'\b{table}\.(\w+)', query))
+    columns = []
+    for _, name, _, _, _, pk in conn.execute(f'PRAGMA table_info({table})'):
+        # The INTEGER PRIMARY KEY is the rowid and is part of every index already
+        if name in referenced and not pk:
+            columns.append(name)
+    return columns
+
+def propose_indexes(conn, queries):
+    """
+    Propose one covering index per table with findings, holding every column the queries read from it,
+    led by the table's LEADING_COLUMNS entry. Returns {table: [columns]}.
+    """
+    proposals = {}
+    for query in queries.values():
+        for kind, table, _ in analyze_plan(conn, query):
+            if kind == 'temp b-tree' or table not in LEADING_COLUMNS:
+                continue
+            columns = proposals.setdefault(table, [LEADING_COLUMNS[table]])
+            for column in referenced_columns(conn, query, table):
+                if column not in columns:
+                    columns.append(column)
+    # Keep schema order after the leading column so the proposal is deterministic
+    for table, columns in proposals.items():
+        order = [row[1] for row in conn.execute(f'PRAGMA table_info({table})')]
+        proposals[table] = [columns[0]] + sorted(columns[1:], key=order.index)
+    return proposals
+
+def index_ddl(proposals):
+    return [f'CREATE INDEX IF NOT EXISTS {INDEX_NAMES[table]} ON {table}({", ".join(columns)});'
+            for table, columns in proposals.items()]
+
+def write_migration(proposals, migrations_dir=MIGRATIONS_DIR):
+    """Write the proposed indexes as the next numbered migration and return its path."""
+    migrations = list_migrations(migrations_dir)
+    version = migrations[-1][0] + 1 if migrations else 1
+    path = os.path.join(migrations_dir, f'{version:03d}_covering_indexes.sql')
+    with open(path, 'w') as f:
+        f.write('-- Covering indexes proposed by index_advisor.py\n\n')
+        f.write('\n'.join(index_ddl(proposals)) + '\n')
+    return path
+
+def time_queries(conn, queries, repeat=3):
+    """Best-of-`repeat` wall time in seconds of every query."""
+    timings = {}
+    for name, query in queries.items():
+        best = float('inf')
+        for _ in range(repeat):
+            start_time = time.perf_counter()
+            conn.execute(query).fetchall()
+            best = min(best, time.perf_counter() - start_time)
+        timings[name] = best
+    return timings
+
+def print_report(conn, queries):
+    for name, query in queries.items():
+        findings = analyze_plan(conn, query)
+        print(f"{name}: {'ok' if not findings else ''}")
+        for kind, table, detail in findings:
+            print(f"    {kind:<12} {table or '':<10} {detail}")
+
+def benchmark(sizes, start_date, end_date, seed=0):
+    """Time every analytics query before and after the pending migrations at each database size."""
+    for rows in sizes:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            db_path = os.path.join(tmp_dir, 'benchmark.sqlite')
+            conn = connect(db_path)
+            with open(SCHEMA_PATH) as f:
+                conn.executescript(f.read())
+            conn.close()
+            populate_database(db_path, rows=rows, seed=seed)
+
+            conn = connect(db_path)
+            queries = capture_queries(conn, start_date, end_date)
+            before = time_queries(conn, queries)
+            apply_migrations(conn)
+            after = time_queries(conn, queries)
+            conn.close()
+
+        print(f"\n{rows:,} sales")
+        print(f"    {'query':<45} {'before (ms)':>12} {'after (ms)':>12} {'speedup':>8}")
+        for name in queries:
+            print(f"    {name:<45} {before[name] * 1000:>12.1f} {after[name] * 1000:>12.1f} "
+                  f"{before[name] / max(after[name], 1e-9):>7.1f}x")
+        print(f"    {'total':<45} {sum(before.values()) * 1000:>12.1f} {sum(after.values()) * 1000:>12.1f} "
+              f"{sum(before.values()) / max(sum(after.values()), 1e-9):>7.1f}x")
+
+def reformat_date(date_str):
+    return "{}-{}-{}".format(date_str[:4], date_str[4:6], date_str[6:])
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Report the query plans of the analytics queries and propose covering indexes.")
+    parser.add_argument('start_date', nargs='?', default='20210101')
+    parser.add_argument('end_date', nargs='?', default='20221231')
+    parser.add_argument('--write-migration', action='store_true', help="Write the proposals as the next migration")
+    parser.add_argument('--apply', action='store_true', help="Apply the pending migrations to the database")
+    parser.add_argument('--benchmark', default=None,
+                        help="Comma separated database sizes (sales rows) to time before and after the migrations")
+    args = parser.parse_args()
+    start_date, end_date = reformat_date(args.start_date), reformat_date(args.end_date)
+
+    # Only --apply writes, the report itself reads through the reader settings
+    conn = connect(DB_PATH, read_only=not args.apply)
+    try:
+        queries = capture_queries(conn, start_date, end_date)
+        print_report(conn, queries)
+        proposals = propose_indexes(conn, queries)
+        if proposals:
+            print("\nProposed covering indexes:")
+            for ddl in index_ddl(proposals):
+                print(f"    {ddl}")
+            if args.write_migration:
+                print(f"Wrote {write_migration(proposals)}")
+        else:
+            print("\nNo index proposals, every table access is covered.")
+        if args.apply:
+            applied = apply_migrations(conn)
+            print(f"Applied migrations: {', '.join(f'{v:03d}' for v in applied) or 'none pending'}")
+    finally:
+        conn.close()
+
+    if args.benchmark:
+        benchmark([int(size) for size in args.benchmark.split(',')], start_date, end_date)
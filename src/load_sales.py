@@ -0,0 +1,212 @@
+"""
+This script, load_sales.py, bulk loads external sales exports (CSV) into the OrestisCompany SQLite database.
+It is meant for real sales data that is far larger than what populate_db.py generates.
+It performs the following tasks:
+
+1. Streaming Read:
+    Reads the CSV file in chunks of --chunk-size rows, so memory stays bounded regardless of the file size.
+
+2. Natural Key Mapping:
+    Maps the natural keys of every row (date string, store address and city, product name, customer email) to the
+    surrogate ids of the dimension tables through cached lookups. Unknown dates are added to DateInfo and unknown
+    customers are added to Customers, while rows referencing unknown stores or products are rejected.
+
+3. Deferred Index Build:
+    Drops the idx_sales_* indexes before the load and recreates them afterwards, which is much cheaper than
+    maintaining them row by row.
+
+4. Bulk Load PRAGMAs:
+    Applies synchronous=OFF, journal_mode=MEMORY and a large cache_size for the duration of the load.
+    A database in WAL mode stays in WAL mode, so analytics readers are not blocked by the load.
+
+5. Throughput Statistics:
+    Prints the loaded and rejected row counts, the load and index rebuild times and the rows/second achieved.
+
+Expected CSV header:
+    date,store_address,store_city,product,customer_email,quantity,unit_price[,customer_name]
+
+Usage:
+    python load_sales.py <csv_path> [--chunk-size N]
+"""
+
+import argparse
+import csv
+import sys
+import time
+from collections import OrderedDict
+from datetime import date
+from itertools import islice
+
+sys.path.append('/app')
+
+from database.connection import connect, DB_PATH
+
+# Rows read from the file and inserted per executemany call
+CHUNK_SIZE = 50_000
+# Maximum number of customer emails kept in the lookup cache
+CUSTOMER_CACHE_SIZE = 100_000
+# PRAGMAs applied for the duration of a bulk load (cache_size is in KiB when negative, i.e. 256MB)
+BULK_LOAD_PRAGMAS = {
+    'synchronous': 'OFF',
+    'journal_mode': 'MEMORY',
+    'cache_size': '-262144',
+}
+
+def apply_bulk_load_pragmas(conn):
+    """Apply the bulk load PRAGMAs and return the previous values so they can be restored."""
+    pragmas = dict(BULK_LOAD_PRAGMAS)
+    # WAL already avoids the rollback journal, and leaving it would block concurrent readers
+    if conn.execute('PRAGMA journal_mode').fetchone()[0] == 'wal':
+        del pragmas['journal_mode']
+    previous = {name: conn.execute(f'PRAGMA {name}').fetchone()[0] for name in pragmas}
+    for name, value in pragmas.items():
+        conn.execute(f'PRAGMA {name} = {value}')
+    return previous
+
+def restore_pragmas(conn, previous):
+    for name, value in previous.items():
+        conn.execute(f'PRAGMA {name} = {value}')
+
+def drop_sales_indexes(conn):
+    """Drop the idx_sales_* indexes and return their definitions so they can be recreated after the load."""
+    indexes = conn.execute(
+        "SELECT name, sql FROM sqlite_master WHERE type = 'index' AND tbl_name = 'Sales' AND name LIKE 'idx_sales_%'"
+    ).fetchall()
+    for name, _ in indexes:
+        conn.execute(f'DROP INDEX IF EXISTS {name}')
+    return indexes
+
+def recreate_indexes(conn, indexes):
+    for _, sql in indexes:
+        conn.execute(sql)
+    conn.commit()
+
+class DimensionLookup:
+    """
+    Cached natural key -> surrogate id lookups for the dimension tables.
+    Stores, products and dates are small and fully cached; customers are kept in a bounded LRU cache
+    backed by the UNIQUE index on Customers.email.
+    """
+
+    def __init__(self, conn, customer_cache_size=CUSTOMER_CACHE_SIZE):
+        self.conn = conn
+        self.stores = {(address, city): store_id for store_id, address, city in
+                       conn.execute('SELECT store_id, address, city FROM Stores')}
+        self.products = {name: product_id for product_id, name in conn.execute('SELECT product_id, name FROM Products')}
+        self.dates = {str(d): date_id for date_id, d in conn.execute('SELECT date_id, date FROM DateInfo')}
+        self.customers = OrderedDict()
+        self.customer_cache_size = customer_cache_size
+        self.today = date.today()
+
+    def date_id(self, date_str):
+        date_id = self.dates.get(date_str)
+        if date_id is None:
+            try:
+                current_date = date.fromisoformat(date_str)
+            except ValueError:
+                return None
+            # DateInfo only accepts dates up to today
+            if current_date > self.today:
+                return None
+            date_id = self.dates.get(current_date.isoformat())
+            if date_id is None:
+                date_id = self.conn.execute(
+                    'INSERT INTO DateInfo(date, year, month, day, weekday) VALUES (?, ?, ?, ?, ?)',
+                    (current_date.isoformat(), current_date.year, current_date.month, current_date.day, current_date.strftime('%A'))
+                ).lastrowid
+                self.dates[current_date.isoformat()] = date_id
+            # Also cache the original spelling so the date is parsed only once
+            self.dates[date_str] = date_id
+        return date_id
+
+    def customer_id(self, email, name=None):
+        customer_id = self.customers.get(email)
+        if customer_id is not None:
+            self.customers.move_to_end(email)
+            return customer_id
+        row = self.conn.execute('SELECT customer_id FROM Customers WHERE email = ?', (email,)).fetchone()
+        if row is not None:
+            customer_id = row[0]
+        else:
+            customer_id = self.conn.execute('INSERT INTO Customers(name, email) VALUES (?, ?)', (name or email, email)).lastrowid
+        self.customers[email] = customer_id
+        if len(self.customers) > self.customer_cache_size:
+            self.customers.popitem(last=False)
+        return customer_id
+
+def map_row(lookup, row):
+    """Map one CSV row to a Sales tuple, or return None if it cannot be loaded."""
+    try:
+        store_id = lookup.stores.get((row['store_address'], row['store_city']))
+        product_id = lookup.products.get(row['product'])
+        quantity = int(row['quantity'])
+        unit_price = float(row['unit_price'])
+    except (KeyError, TypeError, ValueError):
+        return None
+    if store_id is None or product_id is None or quantity <= 0 or unit_price < 0 or not row.get('customer_email'):
+        return None
+    date_id = lookup.date_id(row['date'])
+    if date_id is None:
+        return None
+    customer_id = lookup.customer_id(row['customer_email'], row.get('customer_name'))
+    return date_id, store_id, product_id, customer_id, quantity, unit_price
+
+def read_chunks(csv_path, chunk_size=CHUNK_SIZE):
+    """Stream the CSV file as lists of at most chunk_size rows."""
+    with open(csv_path, newline='') as f:
+        reader = csv.DictReader(f)
+        while True:
+            chunk = list(islice(reader, chunk_size))
+            if not chunk:
+                return
+            yield chunk
+
+def load_sales(conn, csv_path, chunk_size=CHUNK_SIZE, defer_indexes=True):
+    """
+    Stream csv_path into the Sales table with deferred index build and bulk load PRAGMAs.
+    With defer_indexes=False the indexes are left in place, which is cheaper for small incremental loads.
+    Returns the load statistics.
+    """
+    previous_pragmas = apply_bulk_load_pragmas(conn)
+    indexes = drop_sales_indexes(conn) if defer_indexes else []
+    loaded = rejected = 0
+    start_time = time.perf_counter()
+    try:
+        lookup = DimensionLookup(conn)
+        for chunk in read_chunks(csv_path, chunk_size):
+            sales = [mapped for mapped in (map_row(lookup, row) for row in chunk) if mapped is not None]
+            rejected += len(chunk) - len(sales)
+            conn.executemany(
+                'INSERT INTO Sales(date_id, store_id, product_id, customer_id, quantity, unit_price) VALUES (?, ?, ?, ?, ?, ?)',
+                sales
+            )
+            # Commit every chunk so the in-memory rollback journal stays bounded
+            conn.commit()
+            loaded += len(sales)
+    finally:
+        conn.commit()
+        load_time = time.perf_counter() - start_time
+        recreate_indexes(conn, indexes)
+        index_time = time.perf_counter() - start_time - load_time
+        restore_pragmas(conn, previous_pragmas)
+    return {
+        'loaded': loaded,
+        'rejected': rejected,
+        'load_seconds': load_time,
+        'index_seconds': index_time,
+        'rows_per_second': loaded / max(load_time + index_time, 1e-9),
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Bulk load a sales CSV export into the OrestisCompany database.")
+    parser.add_argument('csv_path', help="Path of the sales CSV file")
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE, help="Rows read and inserted per chunk")
+    args = parser.parse_args()
+
+    conn = connect(DB_PATH)
+    try:
+        stats = load_sales(conn, args.csv_path, args.chunk_size)
+    finally:
+        conn.close()
+    print(f"Loaded {stats['loaded']:,} sales ({stats['rejected']:,} rejected) in {stats['load_seconds']:.2f}s, "
+          f"rebuilt indexes in {stats['index_seconds']:.2f}s ({stats['rows_per_second']:,.0f} rows/s)")
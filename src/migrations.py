@@ -0,0 +1,58 @@
+"""
+This script, migrations.py, applies the versioned schema migrations in sql/migrations on top of sql/init.sql.
+
+Every migration is a file named NNN_description.sql. The number of the last applied migration is stored in
+PRAGMA user_version, so each migration runs exactly once per database, inside its own transaction.
+
+Usage:
+    python migrations.py
+"""
+
+import os
+import re
+import sys
+
+sys.path.append('/app')
+
+from database.connection import connect, DB_PATH
+
+MIGRATIONS_DIR = "/app/sql/migrations"
+
+MIGRATION_PATTERN = re.compile(r'^(\d+)_\w+\.sql$')
+
+def list_migrations(migrations_dir=MIGRATIONS_DIR):
+    """Return all (version, path) migrations in ascending version order."""
+    migrations = []
+    for fname in os.listdir(migrations_dir):
+        match = MIGRATION_PATTERN.match(fname)
+        if match:
+            migrations.append((int(match.group(1)), os.path.join(migrations_dir, fname)))
+    return sorted(migrations)
+
+def schema_version(conn):
+    return conn.execute('PRAGMA user_version').fetchone()[0]
+
+def apply_migrations(conn, migrations_dir=MIGRATIONS_DIR):
+    """Apply the migrations newer than the database's user_version and return their versions."""
+    current_version = schema_version(conn)
+    applied = []
+    for version, path in list_migrations(migrations_dir):
+        if version <= current_version:
+            continue
+        with open(path) as f:
+            sql = f.read()
+        # user_version is transactional, so a failing migration leaves the version untouched
+        conn.executescript(f"BEGIN;\n{sql}\nPRAGMA user_version = {version};\nCOMMIT;")
+        applied.append(version)
+    return applied
+
+if __name__ == "__main__":
+    conn = connect(DB_PATH)
+    try:
+        applied = apply_migrations(conn)
+    finally:
+        conn.close()
+    if applied:
+        print(f"Applied migrations: {', '.join(f'{v:03d}' for v in applied)}")
+    else:
+        print("Database schema is up to date.")
@@ -0,0 +1,57 @@
+"""
+This script, partition_sales.py, moves the closed months of the Sales fact table into read-only per-month partitions
+(see database/partitions.py). It is safe to run repeatedly, e.g. after every append_sales: months that are already
+partitioned are skipped and only newly closed months are moved.
+It performs the following tasks:
+
+1. Partition:
+    Moves every month before the month of the latest date in DateInfo from Sales into its Sales_YYYY_MM partition,
+    one transaction per month, and re-creates the SalesAll view.
+
+2. Compaction:
+    With --vacuum, runs VACUUM afterwards so the pages freed in Sales are returned and every partition is stored
+    contiguously. VACUUM rewrites the whole file, so it is opt-in rather than part of every run.
+
+3. Report:
+    Prints every partition with its date_id range and number of sales.
+
+Usage:
+    python partition_sales.py [--vacuum]
+"""
+
+import argparse
+import sys
+import time
+
+sys.path.append('/app')
+
+from database.connection import connect, DB_PATH
+from database.partitions import partition_closed_months, rebuild_sales_view, CATALOG_TABLE, ensure_catalog
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Partition the closed months of the Sales table.")
+    parser.add_argument('--vacuum', action='store_true', help="Compact the database after partitioning")
+    args = parser.parse_args()
+
+    conn = connect(DB_PATH)
+    try:
+        start_time = time.perf_counter()
+        # Also creates the catalog and view on databases that predate migration 002
+        ensure_catalog(conn)
+        rebuild_sales_view(conn)
+        conn.commit()
+        moved = partition_closed_months(conn)
+        print(f"Partitioned {len(moved)} month(s), {sum(moved.values()):,} sales in {time.perf_counter() - start_time:.2f}s")
+        if args.vacuum:
+            start_time = time.perf_counter()
+            conn.execute('VACUUM')
+            print(f"Compacted the database in {time.perf_counter() - start_time:.2f}s")
+        for name, first_date_id, last_date_id, row_count in conn.execute(
+            f"SELECT partition_name, first_date_id, last_date_id, row_count FROM {CATALOG_TABLE} ORDER BY month"
+        ):
+            date_ids = f"{first_date_id}-{last_date_id}"
+            print(f"    {name:<15} date_id {date_ids:<12} {row_count:>12,} sales")
+        hot_rows = conn.execute('SELECT COUNT(*) FROM Sales').fetchone()[0]
+        print(f"    {'Sales':<15} {'(open)':<20} {hot_rows:>12,} sales")
+    finally:
+        conn.close()
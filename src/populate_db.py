@@ -19,18 +19,45 @@ It performs the following tasks:
    - Generating sales records for a 2-year period (2021-2022) with random dates, customers, stores, and products.
    - Applying different distribution strategies for sales quantity and pricing, considering high-margin products and high-revenue stores.
 
-The script uses the sqlite3 module to interact with the SQLite database and employs the random and datetime modules to generate varied and realistic data. 
+6. Batched Sales Generation (--rows N):
+   Generates any number of sales with the same distributions, drawing whole columns at once with NumPy,
+   resolving date_id and purchase_price from in-memory dimension arrays and inserting in large executemany batches
+   inside one transaction. Intended for building large test databases; the throughput is reported in rows/second.
+   With --workers N the sales are generated as N disjoint shards in parallel processes, each from its own seed,
+   and merged by a single writer, so the same --seed and --workers always reproduce a byte-identical database.
+
+The script uses the sqlite3 module to interact with the SQLite database and employs the random, numpy and datetime modules to generate varied and realistic data. 
 It's a crucial part of the setup process for the OrestisCompany analytics application, ensuring that the database is rich with diverse and representative data for analysis.
 """
 
 import sqlite3
 import random
+import argparse
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
 from datetime import date, timedelta
 import math
+import numpy as np
+
+sys.path.append('/app')
+
+from database.connection import connect, DB_PATH
+
+# Number of sales generated and inserted per executemany call in the batched generator
+BATCH_SIZE = 100_000
 
-def populate_database(db_path):
+def populate_database(db_path, rows=None, seed=None, batch_size=BATCH_SIZE, workers=1):
+    """
+    Populate all dimensions and the Sales fact.
+    If rows is None the original 2,000 row generator is used, otherwise `rows` sales are
+    generated column-wise with NumPy and inserted in batches of `batch_size`.
+    With workers > 1 the sales are generated as disjoint shards in parallel processes and merged in shard order.
+    """
     # Connect to the SQLite database
-    conn = sqlite3.connect(db_path)
+    conn = connect(db_path)
     cursor = conn.cursor()
 
     # 1. Populate Stores
@@ -77,6 +104,16 @@ def populate_database(db_path):
     cursor.executemany('INSERT INTO DateInfo(date, year, month, day, weekday) VALUES (?, ?, ?, ?, ?)', dates_data)
 
     # 5. Populate Sales
+    if rows is not None:
+        if workers > 1:
+            staging_dir = os.path.dirname(os.path.abspath(db_path))
+            populate_sales_parallel(conn, rows, seed, workers, staging_dir, batch_size)
+        else:
+            populate_sales_batched(conn, rows, seed, batch_size)
+        conn.commit()
+        conn.close()
+        return
+
     # Randomly select 20% of stores as high margin/revenew stores
     high_revenue_stores = random.sample(range(1, 6), 5 // 5)
     # Randomly select 20% of products as high margin products
@@ -127,6 +164,169 @@ def populate_database(db_path):
     conn.close()
 
 
+def load_dimension_arrays(conn):
+    """
+    Read the dimension keys needed by the sales generator into in-memory arrays, so that
+    date_id and purchase_price are resolved by indexing instead of per-row queries.
+    """
+    date_ids = np.array([r[0] for r in conn.execute('SELECT date_id FROM DateInfo ORDER BY date')], dtype=np.int64)
+    store_ids = np.array([r[0] for r in conn.execute('SELECT store_id FROM Stores ORDER BY store_id')], dtype=np.int64)
+    products = conn.execute('SELECT product_id, purchase_price FROM Products ORDER BY product_id').fetchall()
+    product_ids = np.array([r[0] for r in products], dtype=np.int64)
+    # Purchase prices indexed directly by product_id
+    purchase_prices = np.zeros(product_ids.max() + 1, dtype=np.float64)
+    purchase_prices[product_ids] = [r[1] for r in products]
+    num_customers = conn.execute('SELECT COUNT(*) FROM Customers').fetchone()[0]
+    return {
+        'date_ids': date_ids,
+        'store_ids': store_ids,
+        'product_ids': product_ids,
+        'purchase_prices': purchase_prices,
+        'num_customers': num_customers,
+    }
+
+def pick_high_value_keys(rng, dims):
+    """Randomly select 20% of stores as high revenue stores and 30% of products as high margin products."""
+    high_revenue_stores = np.sort(rng.choice(dims['store_ids'], max(1, len(dims['store_ids']) // 5), replace=False))
+    high_margin_products = np.sort(rng.choice(dims['product_ids'], max(1, len(dims['product_ids']) * 3 // 10), replace=False))
+    return high_revenue_stores, high_margin_products
+
+def generate_sales_batch(rng, size, dims, high_revenue_stores, high_margin_products):
+    """
+    Draw `size` sales at once with the same distributions as the row-by-row generator.
+    Returns the (date_id, store_id, product_id, customer_id, quantity, unit_price) columns.
+    """
+    # Dates will follow uniform distribution
+    date_ids = dims['date_ids'][rng.integers(0, len(dims['date_ids']), size)]
+
+    # Gaussian distribution for customers, centred on the middle of the customer base
+    num_customers = dims['num_customers']
+    customer_ids = np.clip(np.ceil(rng.normal(num_customers / 2, num_customers * 0.15, size)), 1, num_customers).astype(np.int64)
+
+    # Skewed distribution for store (80% chance to pick a high revenue store)
+    store_ids = np.where(rng.random(size) < 0.8,
+                         rng.choice(high_revenue_stores, size),
+                         rng.choice(dims['store_ids'], size))
+
+    # Skewed distribution for product (80% chance to pick a high volume product)
+    product_ids = np.where(rng.random(size) < 0.8,
+                           rng.choice(high_margin_products, size),
+                           rng.choice(dims['product_ids'], size))
+
+    # Adjust sale_price_multiplier based on product
+    is_high_margin = np.isin(product_ids, high_margin_products)
+    sale_price_multiplier = np.where(is_high_margin,
+                                     np.clip(rng.normal(1.75, 0.15, size), 1.5, 2),
+                                     np.clip(rng.normal(1.25, 0.1, size), 1.1, 1.5))
+    unit_prices = dims['purchase_prices'][product_ids] * sale_price_multiplier
+
+    # Skewed distribution for quantity based on both high-margin products and high-revenue stores
+    is_boosted = is_high_margin | np.isin(store_ids, high_revenue_stores)
+    quantities = np.where(is_boosted,
+                          np.clip(np.ceil(rng.normal(7, 1.5, size)), 1, 10),
+                          np.clip(np.ceil(rng.normal(3, 1, size)), 1, 10)).astype(np.int64)
+
+    return date_ids, store_ids, product_ids, customer_ids, quantities, unit_prices
+
+def insert_sales_batch(conn, columns):
+    """Insert one generated batch with a single executemany call."""
+    # tolist() converts the NumPy scalars to the Python types sqlite3 can bind
+    conn.executemany(
+        'INSERT INTO Sales(date_id, store_id, product_id, customer_id, quantity, unit_price) VALUES (?, ?, ?, ?, ?, ?)',
+        zip(*(column.tolist() for column in columns))
+    )
+
+def populate_sales_batched(conn, rows, seed=None, batch_size=BATCH_SIZE):
+    """
+    Generate `rows` sales column-wise and insert them in large batches inside one transaction.
+    Prints the achieved throughput in rows/second.
+    """
+    rng = np.random.default_rng(seed)
+    dims = load_dimension_arrays(conn)
+    high_revenue_stores, high_margin_products = pick_high_value_keys(rng, dims)
+
+    start_time = time.perf_counter()
+    inserted = 0
+    while inserted < rows:
+        size = min(batch_size, rows - inserted)
+        insert_sales_batch(conn, generate_sales_batch(rng, size, dims, high_revenue_stores, high_margin_products))
+        inserted += size
+    elapsed = time.perf_counter() - start_time
+    print(f"Generated {inserted:,} sales in {elapsed:.2f}s ({inserted / max(elapsed, 1e-9):,.0f} rows/s)")
+
+def shard_sizes(rows, workers):
+    """Split `rows` into `workers` contiguous row ranges, the first shards taking the remainder."""
+    base, remainder = divmod(rows, workers)
+    return [base + (1 if i < remainder else 0) for i in range(workers)]
+
+def generate_shard(task):
+    """
+    Worker entry point: generate one shard of sales from its own seed into a staging SQLite file.
+    The staging table mirrors the Sales columns (without sale_id) so the writer can merge it with INSERT ... SELECT.
+    """
+    shard_path, rows, seed_sequence, dims, high_revenue_stores, high_margin_products, batch_size = task
+    rng = np.random.default_rng(seed_sequence)
+    conn = sqlite3.connect(shard_path)
+    # The staging file is disposable, so skip journaling and fsyncs entirely
+    conn.execute('PRAGMA journal_mode = OFF')
+    conn.execute('PRAGMA synchronous = OFF')
+    conn.execute('CREATE TABLE Sales(date_id INTEGER, store_id INTEGER, product_id INTEGER, customer_id INTEGER, quantity INTEGER, unit_price REAL)')
+    generated = 0
+    while generated < rows:
+        size = min(batch_size, rows - generated)
+        insert_sales_batch(conn, generate_sales_batch(rng, size, dims, high_revenue_stores, high_margin_products))
+        generated += size
+    conn.commit()
+    conn.close()
+    return shard_path
+
+def populate_sales_parallel(conn, rows, seed, workers, staging_dir, batch_size=BATCH_SIZE):
+    """
+    Generate `rows` sales in `workers` processes and merge the shards into the database with a single writer.
+    Every shard gets its own child seed spawned from `seed` and shards are merged in shard order,
+    so the same seed and worker count always produce a byte-identical database.
+    """
+    dims = load_dimension_arrays(conn)
+    # One child seed picks the high value stores/products shared by all shards, the rest seed the shards
+    key_seed, *shard_seeds = np.random.SeedSequence(seed).spawn(workers + 1)
+    high_revenue_stores, high_margin_products = pick_high_value_keys(np.random.default_rng(key_seed), dims)
+
+    start_time = time.perf_counter()
+    with tempfile.TemporaryDirectory(prefix='sales_shards_', dir=staging_dir) as shard_dir:
+        tasks = [
+            (os.path.join(shard_dir, f'shard_{i:04d}.sqlite'), size, shard_seed, dims,
+             high_revenue_stores, high_margin_products, batch_size)
+            for i, (size, shard_seed) in enumerate(zip(shard_sizes(rows, workers), shard_seeds))
+        ]
+        with multiprocessing.Pool(workers) as pool:
+            shard_paths = pool.map(generate_shard, tasks)
+        generation_time = time.perf_counter() - start_time
+
+        # Single writer: append the shards in shard order so sale_ids are assigned deterministically
+        conn.commit()
+        for shard_path in shard_paths:
+            conn.execute('ATTACH DATABASE ? AS shard', (shard_path,))
+            conn.execute(
+                'INSERT INTO Sales(date_id, store_id, product_id, customer_id, quantity, unit_price) '
+                'SELECT date_id, store_id, product_id, customer_id, quantity, unit_price FROM shard.Sales ORDER BY rowid'
+            )
+            # A database cannot be detached while a transaction is open
+            conn.commit()
+            conn.execute('DETACH DATABASE shard')
+    elapsed = time.perf_counter() - start_time
+    print(f"Generated {rows:,} sales in {workers} shards in {generation_time:.2f}s, "
+          f"merged in {elapsed - generation_time:.2f}s ({rows / max(elapsed, 1e-9):,.0f} rows/s)")
+
+
 if __name__ == "__main__":
-    db_path = "/app/data/orestiscompanydb.sqlite"
-    populate_database(db_path)
+    parser = argparse.ArgumentParser(description="Populate the OrestisCompany database.")
+    parser.add_argument('--rows', type=int, default=None,
+                        help="Number of sales to generate with the batched generator (default: the original 2,000 row generator)")
+    parser.add_argument('--seed', type=int, default=None, help="Seed for the batched generator")
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE, help="Sales inserted per executemany batch")
+    parser.add_argument('--workers', type=int, default=1,
+                        help="Generate the sales in this many parallel shards (requires --rows)")
+    args = parser.parse_args()
+    if args.workers > 1 and args.rows is None:
+        parser.error("--workers requires --rows")
+    populate_database(DB_PATH, rows=args.rows, seed=args.seed, batch_size=args.batch_size, workers=args.workers)
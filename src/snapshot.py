@@ -0,0 +1,142 @@
+"""
+This script, snapshot.py, provides the snapshot-and-restore fast path of reset_db.
+Instead of re-running init.sql and regenerating every sale, a populated database is saved once as a
+compacted template and restored on every later reset with the same generation parameters.
+It performs the following tasks:
+
+1. Snapshot Keys:
+    Snapshots are keyed by the generator seed, row count (and worker/batch settings, which also shape the data)
+    and a hash of sql/init.sql and sql/migrations, so a schema change never restores a stale template.
+    Unseeded populations are random by design and are never snapshotted, and neither are populations of the default
+    2,000 row generator (without --rows), which doesn't take the seed.
+
+2. Save:
+    Writes a compacted copy of the database with VACUUM INTO, optionally gzip-compressed.
+
+3. Restore:
+    Restores an uncompressed snapshot with the SQLite backup API, or streams a compressed one back with a file copy.
+    Exits with status 1 when no matching snapshot exists, so reset_db.sh falls back to a full regeneration.
+
+Usage:
+    python snapshot.py save [--rows N] [--seed S] [--workers W] [--batch-size B] [--compress]
+    python snapshot.py restore [--rows N] [--seed S] [--workers W] [--batch-size B]
+"""
+
+import argparse
+import gzip
+import hashlib
+import os
+import shutil
+import sqlite3
+import sys
+import time
+
+from migrations import list_migrations
+
+sys.path.append('/app')
+
+from database.connection import connect, DB_PATH
+SNAPSHOT_DIR = "/app/data/snapshots"
+SCHEMA_PATH = "/app/sql/init.sql"
+MIGRATIONS_DIR = "/app/sql/migrations"
+
+def schema_hash(schema_path=SCHEMA_PATH, migrations_dir=MIGRATIONS_DIR):
+    """Hash of init.sql and every migration applied on top of it."""
+    paths = [schema_path] + [path for _, path in list_migrations(migrations_dir)]
+    digest = hashlib.sha256()
+    for path in paths:
+        with open(path, 'rb') as f:
+            digest.update(f.read())
+    return digest.hexdigest()[:16]
+
+def snapshot_key(seed, rows=None, workers=1, batch_size=None, schema_path=SCHEMA_PATH):
+    """
+    Build the cache key of a populated database. Returns None for unseeded populations and for the default
+    2,000 row generator (no --rows), which ignores the seed.
+    """
+    if seed is None or rows is None:
+        return None
+    key = f"seed{seed}_rows{rows}"
+    if workers > 1:
+        key += f"_workers{workers}"
+    if batch_size is not None:
+        key += f"_batch{batch_size}"
+    return f"{key}_schema{schema_hash(schema_path)}"
+
+def find_snapshot(key, snapshot_dir=SNAPSHOT_DIR):
+    """Return the path of the snapshot stored for key, preferring the uncompressed one, or None."""
+    for suffix in ('.sqlite', '.sqlite.gz'):
+        path = os.path.join(snapshot_dir, key + suffix)
+        if os.path.exists(path):
+            return path
+    return None
+
+def save_snapshot(db_path, key, compress=False, snapshot_dir=SNAPSHOT_DIR):
+    """Save a compacted copy of db_path under key and return its path."""
+    os.makedirs(snapshot_dir, exist_ok=True)
+    path = os.path.join(snapshot_dir, key + '.sqlite')
+    tmp_path = path + '.tmp'
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+    conn = connect(db_path, read_only=True)
+    try:
+        conn.execute('VACUUM INTO ?', (tmp_path,))
+    finally:
+        conn.close()
+    if compress:
+        with open(tmp_path, 'rb') as src, gzip.open(path + '.gz.tmp', 'wb', compresslevel=6) as dst:
+            shutil.copyfileobj(src, dst, length=1024 * 1024)
+        os.remove(tmp_path)
+        tmp_path, path = path + '.gz.tmp', path + '.gz'
+    # Rename last so a partially written snapshot is never restored
+    os.replace(tmp_path, path)
+    return path
+
+def restore_snapshot(db_path, snapshot_path):
+    """Restore snapshot_path into db_path, replacing any existing database."""
+    if snapshot_path.endswith('.gz'):
+        tmp_path = db_path + '.restore'
+        with gzip.open(snapshot_path, 'rb') as src, open(tmp_path, 'wb') as dst:
+            shutil.copyfileobj(src, dst, length=1024 * 1024)
+        os.replace(tmp_path, db_path)
+        # A WAL left by the replaced database would be matched with the restored file
+        for suffix in ('-wal', '-shm'):
+            if os.path.exists(db_path + suffix):
+                os.remove(db_path + suffix)
+    else:
+        src = sqlite3.connect(f'file:{snapshot_path}?mode=ro', uri=True)
+        dst = sqlite3.connect(db_path)
+        try:
+            src.backup(dst)
+        finally:
+            dst.close()
+            src.close()
+    # VACUUM INTO writes a rollback journal database, opening a writer switches it back to WAL
+    connect(db_path).close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Save or restore populated database snapshots.")
+    parser.add_argument('action', choices=['save', 'restore'])
+    parser.add_argument('--rows', type=int, default=None)
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--workers', type=int, default=1)
+    parser.add_argument('--batch-size', type=int, default=None)
+    parser.add_argument('--compress', action='store_true', help="gzip the saved snapshot")
+    args = parser.parse_args()
+
+    key = snapshot_key(args.seed, args.rows, args.workers, args.batch_size)
+    if key is None:
+        print("No snapshot used for a population without --seed and --rows.")
+        sys.exit(1)
+
+    start_time = time.perf_counter()
+    if args.action == 'save':
+        path = save_snapshot(DB_PATH, key, args.compress)
+        print(f"Saved snapshot {path} in {time.perf_counter() - start_time:.2f}s")
+    else:
+        path = find_snapshot(key)
+        if path is None:
+            print(f"No snapshot found for {key}.")
+            sys.exit(1)
+        restore_snapshot(DB_PATH, path)
+        print(f"Restored snapshot {path} in {time.perf_counter() - start_time:.2f}s")
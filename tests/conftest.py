@@ -0,0 +1,52 @@
+"""
+Shared fixtures of the tests: a small seeded database built in a temporary directory with sql/init.sql,
+the migrations and the batched generator of populate_db.py, one of the same size from another seed, writable copies
+and read-only connections.
+"""
+
+import os
+import shutil
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [ROOT, os.path.join(ROOT, 'src')]
+
+from database.connection import connect
+from migrations import apply_migrations
+from populate_db import populate_database
+
+ROWS = 20_000
+SEED = 7
+
+def build_database(path, seed):
+    conn = connect(path)
+    with open(os.path.join(ROOT, 'sql', 'init.sql')) as f:
+        conn.executescript(f.read())
+    apply_migrations(conn, os.path.join(ROOT, 'sql', 'migrations'))
+    conn.close()
+    populate_database(path, rows=ROWS, seed=seed)
+    return path
+
+@pytest.fixture(scope='session')
+def db_path(tmp_path_factory):
+    return build_database(str(tmp_path_factory.mktemp('db') / 'orestiscompanydb.sqlite'), SEED)
+
+@pytest.fixture(scope='session')
+def reseeded_db_path(tmp_path_factory):
+    """A database of the same size as db_path from another seed, like after a plain reset_db."""
+    return build_database(str(tmp_path_factory.mktemp('reseeded_db') / 'orestiscompanydb.sqlite'), SEED + 1)
+
+@pytest.fixture
+def db_copy(db_path, tmp_path):
+    """A writable copy of db_path, for tests that edit or replace the database."""
+    path = str(tmp_path / 'orestiscompanydb.sqlite')
+    shutil.copy(db_path, path)
+    return path
+
+@pytest.fixture
+def conn(db_path):
+    conn = connect(db_path, read_only=True)
+    yield conn
+    conn.close()
@@ -0,0 +1,18 @@
+from click.testing import CliRunner
+
+import cli
+import database.connection
+from analytics.sketches import check_settings, SketchSettings
+
+def test_approximate_options_reach_the_analytics(db_path, monkeypatch):
+    monkeypatch.setattr(database.connection, 'DB_PATH', db_path)
+    # Neither wipe the outputs in /app/data nor start the worker processes, only record what they would get
+    monkeypatch.setattr(cli, 'cleanup_analytics_data', lambda directory: None)
+    runs = []
+    monkeypatch.setattr(cli, 'run_analytics', lambda levels, start_date, end_date, **options: runs.append(options) or [])
+    result = CliRunner().invoke(cli.pre_process_analytics, ['20210301', '20210930', '-i', '--approximate',
+                                                            '--error', '0.02', '--sample-rate', '0.5'])
+    assert result.exit_code == 0, result.output
+    settings = runs[0]['approximate']
+    assert settings == SketchSettings(0.02, 0.5)
+    check_settings(settings)
@@ -0,0 +1,73 @@
+import shutil
+
+import pytest
+
+from analytics.basic_analytics import compute_basic_analytics_columnar, compute_basic_analytics_shared_scan, BASIC_METRICS
+from analytics.columnar import open_columns, refresh_columns
+from analytics.date_filters import resolve_date_id_range
+from analytics.engines import analytics_connection
+from analytics.output_format import read_output
+from database.connection import connect
+
+START_DATE, END_DATE = '2021-03-01', '2021-09-30'
+
+def assert_outputs_match_sql(conn, data_dir):
+    """Every output in data_dir equals the result of its SQL query on the SQLite conn."""
+    for function in BASIC_METRICS:
+        expected = function(conn, START_DATE, END_DATE)
+        result = read_output(str(data_dir), function.__name__)
+        if not hasattr(expected, 'columns'):
+            expected = expected.to_frame()
+        assert list(result.columns) == list(expected.columns), function.__name__
+        for column in expected.columns:
+            if expected[column].dtype.kind == 'f':
+                assert result[column].to_numpy() == pytest.approx(expected[column].to_numpy(), rel=1e-9), function.__name__
+            else:
+                assert result[column].tolist() == expected[column].tolist(), function.__name__
+
+@pytest.mark.parametrize('engine', ['sqlite', 'duckdb'])
+def test_columnar_path_matches_sql(engine, db_path, conn, tmp_path):
+    if engine == 'duckdb':
+        pytest.importorskip('duckdb')
+    with analytics_connection(engine, db_path) as engine_conn:
+        date_ids = resolve_date_id_range(engine_conn, START_DATE, END_DATE)
+        compute_basic_analytics_columnar(engine_conn, date_ids, str(tmp_path), db_path=db_path,
+                                         columnar_dir=str(tmp_path / 'columnar'))
+    assert_outputs_match_sql(conn, tmp_path)
+
+@pytest.mark.parametrize('engine', ['sqlite', 'duckdb'])
+def test_shared_scan_matches_sql(engine, db_path, conn, tmp_path):
+    if engine == 'duckdb':
+        pytest.importorskip('duckdb')
+    with analytics_connection(engine, db_path) as engine_conn:
+        date_ids = resolve_date_id_range(engine_conn, START_DATE, END_DATE)
+        compute_basic_analytics_shared_scan(engine_conn, START_DATE, END_DATE, date_ids, str(tmp_path))
+    assert_outputs_match_sql(conn, tmp_path)
+
+def assert_columns_match_sql(conn, columnar_dir):
+    columns = open_columns(columnar_dir)
+    count, quantity, revenue = conn.execute("SELECT COUNT(*), SUM(quantity), SUM(quantity * unit_price) FROM Sales").fetchone()
+    assert len(columns['quantity']) == count
+    assert int(columns['quantity'].sum()) == quantity
+    assert float((columns['quantity'] * columns['unit_price']).sum()) == pytest.approx(revenue, rel=1e-9)
+
+def test_export_is_rebuilt_after_updates_and_resets(db_copy, reseeded_db_path, tmp_path):
+    columnar_dir = str(tmp_path / 'columnar')
+    conn = connect(db_copy)
+    try:
+        refresh_columns(conn, columnar_dir)
+        assert refresh_columns(conn, columnar_dir) == 0
+        conn.execute("UPDATE Sales SET quantity = quantity + 100 WHERE sale_id % 7 = 0")
+        conn.commit()
+        refresh_columns(conn, columnar_dir)
+        assert_columns_match_sql(conn, columnar_dir)
+    finally:
+        conn.close()
+    # A reset to the same number of sales from another seed
+    shutil.copy(reseeded_db_path, db_copy)
+    conn = connect(db_copy)
+    try:
+        refresh_columns(conn, columnar_dir)
+        assert_columns_match_sql(conn, columnar_dir)
+    finally:
+        conn.close()
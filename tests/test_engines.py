@@ -0,0 +1,17 @@
+from analytics.engines import sqlite_fingerprint
+from database.connection import connect
+
+def test_fingerprint_changes_on_in_place_updates(db_copy):
+    conn = connect(db_copy)
+    try:
+        fingerprints = [sqlite_fingerprint(conn)]
+        # Rows in the middle of the tables, which keep the row counts, max ids and edge rows
+        for statement in ("UPDATE Sales SET quantity = quantity + 1 WHERE sale_id = 100",
+                          "UPDATE Products SET purchase_price = purchase_price + 1 WHERE product_id = 2",
+                          "DELETE FROM Sales WHERE sale_id = 200"):
+            conn.execute(statement)
+            conn.commit()
+            fingerprints.append(sqlite_fingerprint(conn))
+    finally:
+        conn.close()
+    assert len(set(fingerprints)) == len(fingerprints)
@@ -0,0 +1,66 @@
+import shutil
+
+import pytest
+
+from analytics import basic_analytics
+from analytics.date_filters import resolve_date_id_range
+from analytics.heavy_hitters import load_heavy_hitters, refresh_heavy_hitters, DEFAULT_CAPACITY, HEAVY_HITTER_METRICS
+from database.connection import connect
+
+START_DATE, END_DATE = '2021-03-01', '2021-09-30'
+LIMIT = 10
+
+@pytest.mark.parametrize('name', sorted(HEAVY_HITTER_METRICS))
+def test_full_capacity_matches_sql(name, db_path, conn, tmp_path):
+    # The default capacity holds every customer, product and store of a day, so the summaries are exact
+    heavy_hitters = load_heavy_hitters(db_path, DEFAULT_CAPACITY, str(tmp_path / 'heavy_hitters'))
+    function = getattr(basic_analytics, name)
+    _, label_column, value_column = HEAVY_HITTER_METRICS[name]
+    date_ids = resolve_date_id_range(conn, START_DATE, END_DATE)
+    expected = function(conn, START_DATE, END_DATE, LIMIT, date_ids=date_ids)
+    result = heavy_hitters.fast_path(function)(conn, START_DATE, END_DATE, LIMIT, date_ids=date_ids)
+    assert result[label_column].tolist() == expected[label_column].tolist()
+    assert result[value_column].to_numpy() == pytest.approx(expected[value_column].to_numpy(), rel=1e-9)
+    assert result[f'{value_column}_high'].to_numpy() == pytest.approx(expected[value_column].to_numpy(), rel=1e-9)
+
+@pytest.mark.parametrize('name', sorted(HEAVY_HITTER_METRICS))
+def test_small_capacity_bounds_sql(name, db_path, conn, tmp_path):
+    heavy_hitters = load_heavy_hitters(db_path, 2, str(tmp_path / 'heavy_hitters'))
+    function = getattr(basic_analytics, name)
+    _, label_column, value_column = HEAVY_HITTER_METRICS[name]
+    date_ids = resolve_date_id_range(conn, START_DATE, END_DATE)
+    # The exact totals of every label
+    exact = function(conn, START_DATE, END_DATE, 1_000_000, date_ids=date_ids).set_index(label_column)[value_column]
+    result = heavy_hitters.fast_path(function)(conn, START_DATE, END_DATE, LIMIT, date_ids=date_ids)
+    # Only the ids in the summary of some day of the range are candidates
+    assert 0 < len(result) <= LIMIT
+    for label, low, high in zip(result[label_column], result[f'{value_column}_low'], result[f'{value_column}_high']):
+        assert low * (1 - 1e-9) <= exact[label] <= high * (1 + 1e-9), label
+
+def assert_top_customers_match_sql(db_path, heavy_hitters_dir):
+    heavy_hitters = load_heavy_hitters(db_path, DEFAULT_CAPACITY, heavy_hitters_dir)
+    conn = connect(db_path, read_only=True)
+    try:
+        date_ids = resolve_date_id_range(conn, START_DATE, END_DATE)
+        expected = basic_analytics.top_customers(conn, START_DATE, END_DATE, LIMIT, date_ids=date_ids)
+        result = heavy_hitters.top_customers(conn, START_DATE, END_DATE, LIMIT, date_ids=date_ids)
+        assert result['name'].tolist() == expected['name'].tolist()
+        assert result['total_spent'].to_numpy() == pytest.approx(expected['total_spent'].to_numpy(), rel=1e-9)
+    finally:
+        conn.close()
+
+def test_summaries_are_rebuilt_after_updates_and_resets(db_copy, reseeded_db_path, tmp_path):
+    heavy_hitters_dir = str(tmp_path / 'heavy_hitters')
+    assert_top_customers_match_sql(db_copy, heavy_hitters_dir)
+    conn = connect(db_copy)
+    try:
+        # An unchanged database is not summarized again
+        assert refresh_heavy_hitters(conn, DEFAULT_CAPACITY, heavy_hitters_dir) == 0
+        conn.execute("UPDATE Sales SET quantity = quantity + 100 WHERE sale_id % 7 = 0")
+        conn.commit()
+        assert_top_customers_match_sql(db_copy, heavy_hitters_dir)
+    finally:
+        conn.close()
+    # A reset to the same number of sales from another seed
+    shutil.copy(reseeded_db_path, db_copy)
+    assert_top_customers_match_sql(db_copy, heavy_hitters_dir)
@@ -0,0 +1,27 @@
+import numpy as np
+import pandas as pd
+
+from analytics.model_cache import REFIT_FRACTION
+from analytics.order_selection import load_order, order_key, store_order
+
+SETTINGS = ['aic', 3, 2, 3]
+
+def test_extended_series_reuse_the_searched_order(tmp_path):
+    order_dir = str(tmp_path / 'orders')
+    days = 200
+    series = pd.Series(np.random.default_rng(0).normal(size=2 * days),
+                       index=pd.date_range('2021-01-01', periods=2 * days, freq='D'))
+    searched = series.iloc[:days]
+    store_order(order_key(searched, *SETTINGS), (1, 1, 0), 1.0, searched, SETTINGS, days, order_dir=order_dir)
+
+    def lookup(extended):
+        return load_order(order_key(extended, *SETTINGS), extended, SETTINGS, order_dir=order_dir)[0]
+
+    assert lookup(searched) == (1, 1, 0)
+    assert lookup(series.iloc[:days + 1]) == (1, 1, 0)
+    assert lookup(series.iloc[:int(days * (1 + REFIT_FRACTION))]) == (1, 1, 0)
+    # Too many appended days, or a changed old day, search again
+    assert lookup(series.iloc[:int(days * (1 + REFIT_FRACTION)) + 1]) is None
+    changed = series.iloc[:days + 1].copy()
+    changed.iloc[5] += 1
+    assert lookup(changed) is None
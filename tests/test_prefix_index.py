@@ -0,0 +1,68 @@
+import shutil
+
+import numpy as np
+import pytest
+
+from analytics import advanced_analytics, basic_analytics, intermediate_analytics
+from analytics.date_filters import resolve_date_id_range
+from analytics.prefix_index import load_prefix_index, refresh_index, DERIVED_METRICS
+from database.connection import connect
+
+START_DATE, END_DATE = '2021-03-01', '2021-09-30'
+
+def analytics_function(name):
+    for module in (basic_analytics, intermediate_analytics, advanced_analytics):
+        if hasattr(module, name):
+            return getattr(module, name)
+    raise AttributeError(name)
+
+@pytest.mark.parametrize('name', sorted(DERIVED_METRICS))
+def test_fast_path_matches_sql(name, db_path, conn, tmp_path):
+    index = load_prefix_index(db_path, str(tmp_path / 'prefix_index'))
+    function = analytics_function(name)
+    date_ids = resolve_date_id_range(conn, START_DATE, END_DATE)
+    expected = function(conn, START_DATE, END_DATE, date_ids=date_ids)
+    result = index.fast_path(function)(conn, START_DATE, END_DATE, date_ids=date_ids)
+    if not hasattr(expected, 'columns'):
+        expected, result = expected.to_frame(), result.to_frame()
+    assert list(result.columns) == list(expected.columns)
+    assert len(result) == len(expected)
+    for column in expected.columns:
+        if expected[column].dtype.kind == 'f':
+            expected_values = expected[column].to_numpy(dtype=float)
+            # The sums are taken in another order, values near zero (e.g. rolling band widths) only match to the scale of the column
+            scale = np.nanmax(np.abs(expected_values), initial=0)
+            assert result[column].to_numpy(dtype=float) == pytest.approx(expected_values, rel=1e-9, abs=1e-9 * scale, nan_ok=True)
+        else:
+            assert result[column].astype(str).tolist() == expected[column].astype(str).tolist()
+
+def assert_totals_match_sql(db_path, index_dir):
+    index = load_prefix_index(db_path, index_dir)
+    conn = connect(db_path, read_only=True)
+    try:
+        date_ids = resolve_date_id_range(conn, START_DATE, END_DATE)
+        for function in (basic_analytics.total_sales, basic_analytics.profit_total):
+            expected = function(conn, START_DATE, END_DATE, date_ids=date_ids)
+            result = index.fast_path(function)(conn, START_DATE, END_DATE, date_ids=date_ids)
+            assert result.tolist() == pytest.approx(expected.tolist(), rel=1e-9), function.__name__
+    finally:
+        conn.close()
+
+def test_index_is_rebuilt_after_updates_and_resets(db_copy, reseeded_db_path, tmp_path):
+    index_dir = str(tmp_path / 'prefix_index')
+    assert_totals_match_sql(db_copy, index_dir)
+    conn = connect(db_copy)
+    try:
+        # An unchanged database is not indexed again
+        assert refresh_index(conn, index_dir) == 0
+        conn.execute("UPDATE Sales SET quantity = quantity + 100 WHERE sale_id % 7 = 0")
+        conn.commit()
+        assert_totals_match_sql(db_copy, index_dir)
+        conn.execute("UPDATE Products SET purchase_price = purchase_price * 0.9")
+        conn.commit()
+        assert_totals_match_sql(db_copy, index_dir)
+    finally:
+        conn.close()
+    # A reset to the same number of sales from another seed
+    shutil.copy(reseeded_db_path, db_copy)
+    assert_totals_match_sql(db_copy, index_dir)
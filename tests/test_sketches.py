@@ -0,0 +1,70 @@
+import shutil
+
+import pytest
+
+from analytics import advanced_analytics, intermediate_analytics
+from analytics.date_filters import resolve_date_id_range
+from analytics.sketches import load_sketches, refresh_sketches, SketchSettings
+from database.connection import connect
+
+START_DATE, END_DATE = '2021-03-01', '2021-09-30'
+# A sample large enough for the 95% intervals of the averages, and HyperLogLog registers coarse enough
+# that the bounds of the few customers of the test database cover the collisions of linear counting
+SETTINGS = SketchSettings(error=0.05, sample_rate=0.5)
+
+# (analytics function, key column of its rows or None for a single row, value column)
+APPROXIMATE_METRICS = [
+    (intermediate_analytics.avg_purchase_frequency, None, 'average_purchase_frequency'),
+    (intermediate_analytics.avg_purchase, None, 'avg_purchase_value'),
+    (intermediate_analytics.purchase_value_quantiles, 'quantile', 'purchase_value'),
+    (advanced_analytics.calculate_product_profit_margin, 'name', 'profit_margin'),
+]
+
+@pytest.mark.parametrize('function, key, value_column', APPROXIMATE_METRICS,
+                         ids=[function.__name__ for function, _, _ in APPROXIMATE_METRICS])
+def test_bounds_hold_the_exact_result(function, key, value_column, db_path, conn, tmp_path):
+    sketches = load_sketches(SETTINGS, db_path, str(tmp_path / 'sketches'))
+    date_ids = resolve_date_id_range(conn, START_DATE, END_DATE)
+    expected = function(conn, START_DATE, END_DATE, date_ids=date_ids)
+    result = sketches.fast_path(function)(conn, START_DATE, END_DATE, date_ids=date_ids)
+    if key is not None:
+        expected, result = expected.set_index(key), result.set_index(key)
+        assert sorted(result.index) == sorted(expected.index)
+    misses = [row for row, exact in expected[value_column].items()
+              if not result.loc[row, f'{value_column}_low'] <= exact <= result.loc[row, f'{value_column}_high']]
+    # The sampled averages have 95% intervals, so one in twenty products may miss, the other bounds always hold
+    allowed = len(expected) // 10 if function is advanced_analytics.calculate_product_profit_margin else 0
+    assert len(misses) <= allowed, misses
+
+def assert_quantiles_bound_sql(db_path, sketch_dir):
+    sketches = load_sketches(SETTINGS, db_path, sketch_dir)
+    conn = connect(db_path, read_only=True)
+    try:
+        date_ids = resolve_date_id_range(conn, START_DATE, END_DATE)
+        num_sales, = conn.execute("SELECT COUNT(*) FROM Sales WHERE date_id BETWEEN ? AND ?", date_ids).fetchone()
+        assert sketches.range_counts(date_ids).sum() == num_sales
+        expected = intermediate_analytics.purchase_value_quantiles(conn, START_DATE, END_DATE, date_ids=date_ids)
+        result = sketches.purchase_value_quantiles(conn, START_DATE, END_DATE, date_ids=date_ids)
+        assert (result['purchase_value_low'] <= expected['purchase_value']).all()
+        assert (expected['purchase_value'] <= result['purchase_value_high']).all()
+    finally:
+        conn.close()
+
+def test_sketches_are_rebuilt_after_updates_and_resets(db_copy, reseeded_db_path, tmp_path):
+    sketch_dir = str(tmp_path / 'sketches')
+    assert_quantiles_bound_sql(db_copy, sketch_dir)
+    conn = connect(db_copy)
+    try:
+        # An unchanged database is not sketched again
+        assert refresh_sketches(conn, SETTINGS, sketch_dir) == 0
+        conn.execute("UPDATE Sales SET quantity = quantity + 100 WHERE sale_id % 7 = 0")
+        conn.commit()
+        assert_quantiles_bound_sql(db_copy, sketch_dir)
+        conn.execute("DELETE FROM Sales WHERE sale_id % 11 = 0")
+        conn.commit()
+        assert_quantiles_bound_sql(db_copy, sketch_dir)
+    finally:
+        conn.close()
+    # A reset to the same number of sales from another seed
+    shutil.copy(reseeded_db_path, db_copy)
+    assert_quantiles_bound_sql(db_copy, sketch_dir)
@@ -0,0 +1,9 @@
+from snapshot import snapshot_key
+
+
+def test_only_seeded_batched_populations_have_keys():
+    # The default generator (no --rows) doesn't take the seed, so its populations differ between runs
+    assert snapshot_key(None, 1000) is None
+    assert snapshot_key(3) is None
+    assert snapshot_key(3, 1000).startswith("seed3_rows1000_")
+    assert snapshot_key(3, 1000) != snapshot_key(4, 1000)